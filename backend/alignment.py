@@ -0,0 +1,318 @@
+import numpy as np
+from dtw import dtw
+
+# "full" materializes the whole N x M cost matrix via dtw-python; the others
+# only visit (and store one step byte for) cells inside a band around the
+# diagonal, so memory grows with N x band width instead of N x M. "online"
+# consumes the user sequence frame by frame (see OnlineAligner), so it can
+# run while the attempt is still being extracted.
+ALIGNMENT_METHODS = ("auto", "full", "sakoe_chiba", "itakura", "multiscale", "online")
+
+# "auto" switches from full DTW to multiscale above this many cost-matrix cells
+# (~25M cells is ~200 MB of float64 in dtw-python)
+AUTO_FULL_MAX_CELLS = 25_000_000
+
+DEFAULT_SAKOE_CHIBA_WINDOW = 0.1  # fraction of the longer sequence
+DEFAULT_MULTISCALE_RADIUS = 10    # frames at every resolution level
+ITAKURA_MAX_SLOPE = 2.0
+
+_DIAG, _UP, _LEFT = 0, 1, 2
+
+
+def align_sequences(
+    ref_features: np.ndarray,
+    user_features: np.ndarray,
+    method: str = "auto",
+    window: float | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Align two feature sequences with DTW (cosine distance, symmetric2 steps).
+
+    `window` is the Sakoe-Chiba half-width (frames, or a fraction of the
+    longer sequence if < 1), an optional extra cap on the Itakura band, or
+    the multiscale search radius, or the online search radius (reference
+    frames, or a fraction of the reference if < 1). Returns (ref_idx,
+    user_idx) index arrays describing the warping path from (0, 0) to
+    (N-1, M-1).
+    """
+    if method not in ALIGNMENT_METHODS:
+        raise ValueError(f"Unknown alignment method {method!r}; expected one of {', '.join(ALIGNMENT_METHODS)}")
+    n, m = len(ref_features), len(user_features)
+    if n == 0 or m == 0:
+        raise ValueError("Cannot align an empty sequence")
+
+    if method == "auto":
+        method = "full" if n * m <= AUTO_FULL_MAX_CELLS else "multiscale"
+
+    if method == "full":
+        alignment = dtw(ref_features, user_features, dist_method="cosine")
+        return alignment.index1, alignment.index2
+
+    ref_unit = _unit_rows(ref_features)
+    user_unit = _unit_rows(user_features)
+    if method == "sakoe_chiba":
+        lo, hi = _sakoe_chiba_band(n, m, DEFAULT_SAKOE_CHIBA_WINDOW if window is None else window)
+    elif method == "itakura":
+        lo, hi = _itakura_band(n, m, window)
+    elif method == "online":
+        aligner = OnlineAligner(ref_unit, window)
+        aligner.extend(user_unit)
+        return aligner.path()
+    else:
+        return _multiscale_dtw(ref_unit, user_unit, int(window or DEFAULT_MULTISCALE_RADIUS))
+    return _banded_dtw(ref_unit, user_unit, lo, hi)
+
+
+def _unit_rows(features: np.ndarray) -> np.ndarray:
+    features = np.asarray(features, dtype=np.float64)
+    return features / (np.linalg.norm(features, axis=1, keepdims=True) + 1e-12)
+
+
+def _window_frames(window: float, n: int, m: int) -> float:
+    return window * max(n, m) if window < 1 else window
+
+
+def _connect_band(lo: np.ndarray, hi: np.ndarray, m: int) -> tuple[np.ndarray, np.ndarray]:
+    """Make a band monotone, anchored at both corners and free of gaps between rows."""
+    lo = np.maximum.accumulate(np.clip(lo, 0, m - 1))
+    hi = np.maximum.accumulate(np.clip(hi, 1, m))
+    lo[0] = 0
+    hi[-1] = m
+    # Row i must start no later than one column past row i-1's last cell
+    lo[1:] = np.minimum(lo[1:], hi[:-1])
+    hi = np.maximum(hi, lo + 1)
+    return lo.astype(np.int64), hi.astype(np.int64)
+
+
+def _sakoe_chiba_band(n: int, m: int, window: float) -> tuple[np.ndarray, np.ndarray]:
+    """Fixed half-width band around the (slope-adjusted) diagonal."""
+    radius = _window_frames(window, n, m)
+    center = np.arange(n) * ((m - 1) / max(n - 1, 1))
+    lo = np.ceil(center - radius)
+    hi = np.floor(center + radius) + 1
+    return _connect_band(lo, hi, m)
+
+
+def _itakura_band(n: int, m: int, window: float | None) -> tuple[np.ndarray, np.ndarray]:
+    """Itakura parallelogram (local slopes between 1/2 and 2), optionally capped by a Sakoe-Chiba window."""
+    s = ITAKURA_MAX_SLOPE
+    x = np.arange(n) / max(n - 1, 1)
+    y_lo = np.maximum(x / s, 1 - s * (1 - x))
+    y_hi = np.minimum(s * x, 1 - (1 - x) / s)
+    lo = np.ceil(y_lo * (m - 1) - 1e-9)
+    hi = np.floor(y_hi * (m - 1) + 1e-9) + 1
+    if window is not None:
+        cap_lo, cap_hi = _sakoe_chiba_band(n, m, window)
+        lo = np.maximum(lo, cap_lo)
+        hi = np.minimum(hi, cap_hi)
+    return _connect_band(lo, hi, m)
+
+
+def _banded_dtw(ref_unit: np.ndarray, user_unit: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """DTW restricted to columns [lo[i], hi[i]) of every row i.
+
+    Only two cost rows plus one step byte per band cell are kept. Within a
+    row, the horizontal recurrence D[j] = min(t[j], D[j-1] + c[j]) is
+    solved with a prefix-sum / running-minimum scan instead of a Python loop.
+    """
+    n = len(ref_unit)
+    widths = hi - lo
+    offsets = np.concatenate(([0], np.cumsum(widths)))
+    steps = np.empty(offsets[-1], dtype=np.int8)
+
+    prev = None
+    prev_lo = 0
+    for i in range(n):
+        cols = np.arange(lo[i], hi[i])
+        cost = 1.0 - user_unit[lo[i]:hi[i]] @ ref_unit[i]
+        if prev is None:
+            row = np.cumsum(cost)
+            step = np.full(len(cols), _LEFT, dtype=np.int8)
+            step[0] = _DIAG  # origin
+        else:
+            padded = np.concatenate(([np.inf], prev, [np.inf]))
+            last = len(padded) - 1
+            up = padded[np.minimum(cols - prev_lo + 1, last)] + cost
+            diag = padded[np.minimum(cols - prev_lo, last)] + 2 * cost
+            t = np.minimum(diag, up)
+            step = np.where(diag <= up, _DIAG, _UP).astype(np.int8)
+            # D[j] = S[j] + min_{k<=j}(t[k] - S[k]) with S the running sum of cost
+            prefix = np.cumsum(cost)
+            row = prefix + np.minimum.accumulate(t - prefix)
+            from_left = np.zeros(len(cols), dtype=bool)
+            from_left[1:] = row[:-1] + cost[1:] < t[1:]
+            step[from_left] = _LEFT
+        steps[offsets[i]:offsets[i + 1]] = step
+        prev = row
+        prev_lo = lo[i]
+
+    # Backtrack from the end corner
+    ref_path = []
+    user_path = []
+    i, j = n - 1, int(hi[-1]) - 1
+    while True:
+        ref_path.append(i)
+        user_path.append(j)
+        if i == 0 and j == 0:
+            break
+        step = steps[offsets[i] + j - lo[i]]
+        if step == _DIAG:
+            i, j = i - 1, j - 1
+        elif step == _UP:
+            i -= 1
+        else:
+            j -= 1
+    return np.array(ref_path[::-1]), np.array(user_path[::-1])
+
+
+def _coarsen(features: np.ndarray) -> np.ndarray:
+    """Halve the frame rate by averaging adjacent frames (last odd frame kept)."""
+    n = len(features)
+    paired = features[: n - n % 2].reshape(-1, 2, features.shape[1]).mean(axis=1)
+    if n % 2:
+        paired = np.vstack([paired, features[-1:]])
+    return _unit_rows(paired)
+
+
+def _multiscale_dtw(ref_unit: np.ndarray, user_unit: np.ndarray, radius: int) -> tuple[np.ndarray, np.ndarray]:
+    """Coarse-to-fine DTW: solve at half resolution, then refine around the projected path."""
+    n, m = len(ref_unit), len(user_unit)
+    min_size = radius + 2
+    if n <= min_size or m <= min_size:
+        return _banded_dtw(ref_unit, user_unit, np.zeros(n, dtype=np.int64), np.full(n, m, dtype=np.int64))
+
+    coarse_ref, coarse_user = _multiscale_dtw(_coarsen(ref_unit), _coarsen(user_unit), radius)
+
+    # Project each coarse cell onto its 2x2 block of fine cells
+    lo = np.full(n, m, dtype=np.int64)
+    hi = np.zeros(n, dtype=np.int64)
+    for di in (0, 1):
+        rows = np.minimum(2 * coarse_ref + di, n - 1)
+        np.minimum.at(lo, rows, 2 * coarse_user)
+        np.maximum.at(hi, rows, np.minimum(2 * coarse_user + 2, m))
+
+    # Widen by `radius` cells in every direction
+    wide_lo = lo.copy()
+    wide_hi = hi.copy()
+    for shift in range(1, radius + 1):
+        wide_lo[shift:] = np.minimum(wide_lo[shift:], lo[:-shift])
+        wide_lo[:-shift] = np.minimum(wide_lo[:-shift], lo[shift:])
+        wide_hi[shift:] = np.maximum(wide_hi[shift:], hi[:-shift])
+        wide_hi[:-shift] = np.maximum(wide_hi[:-shift], hi[shift:])
+    lo, hi = _connect_band(wide_lo - radius, wide_hi + radius, m)
+    return _banded_dtw(ref_unit, user_unit, lo, hi)
+
+
+class OnlineAligner:
+    """Open-end DTW of a growing user sequence against a whole reference.
+
+    Same cost and steps as align_sequences, computed one user frame (one
+    column of reference rows) at a time as frames arrive. `position` is the
+    open-end estimate of the reference frame the user has reached: the cell
+    of the newest column with the lowest path-length-normalized cost.
+
+    Each column only covers rows within `window` (reference frames, or a
+    fraction of the reference if < 1; default DEFAULT_SAKOE_CHIBA_WINDOW) of
+    the previous column's position, as in Dixon's online time warping. One
+    step byte is kept per visited cell, so memory grows with the attempt
+    length times the band width rather than N x M. A window at least as
+    long as the reference covers every row and gives exactly the full DTW.
+
+    For endless streams, `history` keeps only the step bytes of the newest
+    `history` user frames (extending needs only the newest column), so
+    memory stays bounded; path() can then only backtrack that far.
+    """
+
+    def __init__(self, ref_features: np.ndarray, window: float | None = None, history: int | None = None):
+        if len(ref_features) == 0:
+            raise ValueError("Cannot align an empty sequence")
+        self._ref_unit = _unit_rows(ref_features)
+        n = len(self._ref_unit)
+        if window is None:
+            window = DEFAULT_SAKOE_CHIBA_WINDOW
+        self._radius = max(1, int(round(_window_frames(window, n, n))))
+        if history is not None and history < 1:
+            raise ValueError("history must be at least one frame")
+        self._history = history
+        self._dropped = 0  # Oldest columns forgotten because of `history`
+        self._los: list[int] = []
+        self._steps: list[np.ndarray] = []
+        self._col: np.ndarray | None = None  # Accumulated cost of the newest column
+        self.position = 0
+
+    def __len__(self) -> int:
+        return self._dropped + len(self._steps)
+
+    def extend(self, user_features: np.ndarray) -> None:
+        """Append user frames ([frames, features]) to the alignment."""
+        n = len(self._ref_unit)
+        for u in _unit_rows(user_features) if len(user_features) else ():
+            j = len(self)
+            if self._col is None:
+                lo, hi = 0, min(n, self._radius + 1)
+            else:
+                prev_lo = self._los[-1]
+                prev_hi = prev_lo + len(self._col)
+                lo = max(prev_lo, self.position - self._radius)
+                hi = min(n, max(prev_hi, self.position + self._radius + 1))
+            cost = 1.0 - self._ref_unit[lo:hi] @ u
+            if self._col is None:
+                col = np.cumsum(cost)
+                step = np.full(hi - lo, _UP, dtype=np.int8)
+                step[0] = _DIAG  # origin
+            else:
+                rows = np.arange(lo, hi)
+                padded = np.concatenate(([np.inf], self._col, [np.inf]))
+                last = len(padded) - 1
+                left = padded[np.minimum(rows - prev_lo + 1, last)] + cost
+                diag = padded[np.minimum(rows - prev_lo, last)] + 2 * cost
+                t = np.minimum(diag, left)
+                step = np.where(diag <= left, _DIAG, _LEFT).astype(np.int8)
+                # Vertical steps within the column, solved as in _banded_dtw
+                prefix = np.cumsum(cost)
+                col = prefix + np.minimum.accumulate(t - prefix)
+                from_up = np.zeros(hi - lo, dtype=bool)
+                from_up[1:] = col[:-1] + cost[1:] < t[1:]
+                step[from_up] = _UP
+            self._los.append(lo)
+            self._steps.append(step)
+            if self._history is not None and len(self._steps) >= 2 * self._history:
+                # Forget in batches so trimming stays amortized O(1) per frame
+                forget = len(self._steps) - self._history
+                del self._los[:forget], self._steps[:forget]
+                self._dropped += forget
+            self._col = col
+            # Open end: normalize by the path weight (i + 1) + (j + 1) of symmetric2
+            self.position = lo + int(np.argmin(col / (np.arange(lo, hi) + j + 2)))
+
+    def path(self, open_end: bool = False, start: int = 0) -> tuple[np.ndarray, np.ndarray]:
+        """(ref_idx, user_idx) of the best path so far.
+
+        Ends at the last frame of both sequences, or with `open_end` at
+        (position, newest user frame). Reference frames beyond the newest
+        column's rows are matched to the last user frame. With `start` only
+        the cells of user frames from `start` on are backtracked; with
+        `history`, frames before the kept columns never are.
+        """
+        if not self._steps:
+            raise ValueError("Cannot align an empty sequence")
+        start = max(start, self._dropped)
+        ref_path = []
+        user_path = []
+        i, j = (self.position if open_end else len(self._ref_unit) - 1), len(self) - 1
+        while True:
+            ref_path.append(i)
+            user_path.append(j)
+            if i == 0 and j == 0:
+                break
+            column = j - self._dropped
+            k = i - self._los[column]
+            step = self._steps[column][k] if k < len(self._steps[column]) else _UP
+            if step == _DIAG:
+                i, j = i - 1, j - 1
+            elif step == _UP:
+                i -= 1
+            else:
+                j -= 1
+            if j < start:
+                break
+        return np.array(ref_path[::-1]), np.array(user_path[::-1])
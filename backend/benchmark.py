@@ -0,0 +1,249 @@
+"""Benchmarks for compare_dances and pose extraction on synthetic data.
+
+Comparisons run on generated pose sequences: a smooth random choreography
+as the reference, and a time-warped, noised copy of it as the attempt.
+Extraction runs on videos rendered from such sequences as stick figures.
+Every case runs in a fresh process and reports wall time, peak RSS and a
+per-stage breakdown:
+
+    python benchmark.py                          # compare at 1k/10k/50k frames + extraction
+    python benchmark.py --sizes 1000 --no-extraction
+    python benchmark.py --save                   # store the results as the baseline
+    python benchmark.py --check                  # exit 1 if a case or stage got slower, or bigger
+
+Baselines are machine-specific, so save one on the machine that checks.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Callable
+
+import cv2
+import numpy as np
+
+from pose_sequence import NUM_LANDMARKS, PoseSequence
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_SIZES = (1000, 10_000, 50_000)
+# Allowed growth over the baseline before --check fails
+DEFAULT_TOLERANCE = 0.25
+# Metrics compared against the baseline, plus every stage in "stages"
+CHECKED_METRICS = ("wall_s", "peak_rss_mb")
+# Stages shorter than this in the baseline are too noisy to check
+MIN_CHECKED_STAGE_SECONDS = 0.05
+
+# Rest pose in normalized image coordinates, one (x, y) per MediaPipe landmark
+_REST_POSE = np.array([
+    (0.50, 0.12), (0.51, 0.11), (0.52, 0.11), (0.53, 0.11), (0.49, 0.11), (0.48, 0.11), (0.47, 0.11),
+    (0.54, 0.12), (0.46, 0.12), (0.51, 0.14), (0.49, 0.14),
+    (0.58, 0.25), (0.42, 0.25), (0.62, 0.37), (0.38, 0.37), (0.64, 0.48), (0.36, 0.48),
+    (0.645, 0.51), (0.355, 0.51), (0.64, 0.52), (0.36, 0.52), (0.635, 0.50), (0.365, 0.50),
+    (0.55, 0.52), (0.45, 0.52), (0.56, 0.70), (0.44, 0.70), (0.56, 0.87), (0.44, 0.87),
+    (0.555, 0.89), (0.445, 0.89), (0.57, 0.91), (0.43, 0.91),
+])
+# Landmark whose motion each landmark follows (face -> nose, hands -> wrists, feet -> ankles)
+_DRIVER = np.array([0] * 11 + [11, 12, 13, 14, 15, 16] + [15, 16] * 3 + [23, 24, 25, 26, 27, 28] + [27, 28] * 2)
+# Motion amplitude of each driver: extremities move the most
+_AMPLITUDE = {0: 0.03, 11: 0.02, 12: 0.02, 13: 0.06, 14: 0.06, 15: 0.10, 16: 0.10,
+              23: 0.02, 24: 0.02, 25: 0.04, 26: 0.04, 27: 0.05, 28: 0.05}
+# Limbs drawn for rendered videos
+_BONES = [(11, 12), (11, 13), (13, 15), (12, 14), (14, 16), (11, 23), (12, 24), (23, 24),
+          (23, 25), (25, 27), (24, 26), (26, 28), (27, 31), (28, 32)]
+
+
+def choreography(seed: int = 0) -> Callable[[np.ndarray], np.ndarray]:
+    """A smooth random dance: returns f(times) -> [len(times), 33, 4] landmarks."""
+    rng = np.random.default_rng(seed)
+    drivers = sorted(_AMPLITUDE)
+    # A few sinusoids per driver and axis, 0.2-1.5 Hz
+    freqs = rng.uniform(0.2, 1.5, (len(drivers), 2, 4))
+    phases = rng.uniform(0, 2 * np.pi, (len(drivers), 2, 4))
+    weights = rng.uniform(0.5, 1.0, (len(drivers), 2, 4))
+    amplitudes = np.array([_AMPLITUDE[d] for d in drivers])
+    column = {d: k for k, d in enumerate(drivers)}
+
+    def pose_at(times: np.ndarray) -> np.ndarray:
+        t = np.asarray(times, dtype=np.float64)[:, None, None, None]
+        waves = (weights * np.sin(2 * np.pi * freqs * t + phases)).sum(axis=-1) / 4  # [T, drivers, 2]
+        offsets = waves * amplitudes[None, :, None]
+        landmarks = np.empty((len(times), NUM_LANDMARKS, 4))
+        landmarks[:, :, :2] = _REST_POSE + offsets[:, [column[d] for d in _DRIVER]]
+        landmarks[:, :, 2] = 0.1 * offsets[:, [column[d] for d in _DRIVER], 0]
+        landmarks[:, :, 3] = 0.99
+        return landmarks
+
+    return pose_at
+
+
+def synthetic_pair(frames: int, fps: float = 30.0, warp: float = 0.15, noise: float = 0.005, seed: int = 0):
+    """(reference, attempt) PoseSequences of about `frames` frames each.
+
+    The attempt replays the same choreography at a smoothly varying speed
+    (within +-`warp`) with Gaussian jitter of `noise` on every coordinate.
+    """
+    rng = np.random.default_rng(seed + 1)
+    dance = choreography(seed)
+    ref_times = np.arange(frames) / fps
+
+    # Speed wanders smoothly around 1 (one random knot per second)
+    knots = max(2, int(frames / fps) + 1)
+    speed = 1 + warp * np.interp(np.arange(frames), np.linspace(0, frames - 1, knots), rng.uniform(-1, 1, knots))
+    warped = np.concatenate(([0.0], np.cumsum(speed[:-1]))) / fps
+    warped = warped[warped <= ref_times[-1]]
+    attempt = dance(warped)
+    attempt[:, :, :3] += rng.normal(0, noise, attempt[:, :, :3].shape)
+
+    def sequence(landmarks):
+        nums = np.arange(len(landmarks))
+        return PoseSequence(landmarks, nums, nums / fps)
+
+    return sequence(dance(ref_times)), sequence(attempt)
+
+
+def render_video(poses: PoseSequence, path: str, fps: float = 30.0, size: tuple[int, int] = (640, 480)) -> None:
+    """Draw every frame of `poses` as a stick figure into an mp4 file."""
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    try:
+        for frame_landmarks in poses.landmarks:
+            image = np.full((height, width, 3), 235, dtype=np.uint8)
+            points = np.round(frame_landmarks[:, :2] * (width, height)).astype(int)
+            for a, b in _BONES:
+                cv2.line(image, tuple(points[a]), tuple(points[b]), (60, 60, 60), 14, cv2.LINE_AA)
+            cv2.circle(image, tuple(points[0]), int(0.06 * height), (60, 60, 60), -1, cv2.LINE_AA)
+            writer.write(image)
+    finally:
+        writer.release()
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def bench_compare(frames: int, method: str) -> dict:
+    """compare_dances on a synthetic pair, with the stage timings it records in debug['timings']."""
+    from comparator import compare_dances
+
+    ref, attempt = synthetic_pair(frames)
+    started = time.perf_counter()
+    summary, _ = compare_dances(ref, attempt, 30.0, 30.0, alignment_method=method)
+    wall = time.perf_counter() - started
+    return {
+        "wall_s": round(wall, 4),
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages": summary.debug["timings"],
+        "frames": [len(ref), len(attempt)],
+        "overall_score": summary.overall_score,
+    }
+
+
+def bench_extraction(seconds: float, size: tuple[int, int]) -> dict:
+    """extract_poses (no cache) on a rendered synthetic video, with its stage stats."""
+    from pose_extractor import extract_poses
+
+    ref, _ = synthetic_pair(int(seconds * 30))
+    with tempfile.TemporaryDirectory(prefix="dance_bench_") as tmp:
+        path = os.path.join(tmp, "synthetic.mp4")
+        render_video(ref, path, size=size)
+        started = time.perf_counter()
+        poses, _, stats = extract_poses(path, use_cache=False)
+        wall = time.perf_counter() - started
+    return {
+        "wall_s": round(wall, 4),
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages": {name: stats[name] for name in ("decode_s", "convert_s", "infer_s", "infer_wait_s")},
+        "frames": [stats["frames_analysed"], len(poses)],  # analysed, with a detected person
+        "fps": round(stats["frames_analysed"] / wall, 1) if wall > 0 else 0.0,
+    }
+
+
+def run_case(fn, *args) -> dict:
+    """Run one benchmark in a fresh process, so its peak RSS is its own."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def check(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of `results` against `baseline`, as messages."""
+    failures = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if base is None or "error" in metrics:
+            continue
+        for metric in CHECKED_METRICS:
+            if metric in base and metrics[metric] > base[metric] * (1 + tolerance):
+                failures.append(f"{name}: {metric} {metrics[metric]} > {base[metric]} (+{tolerance:.0%})")
+        stages = metrics.get("stages", {})
+        for stage, seconds in base.get("stages", {}).items():
+            if seconds < MIN_CHECKED_STAGE_SECONDS:
+                continue
+            if stage not in stages:
+                failures.append(f"{name}: stage {stage} missing")
+            elif stages[stage] > seconds * (1 + tolerance):
+                failures.append(f"{name}: stage {stage} {stages[stage]} > {seconds} (+{tolerance:.0%})")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comparison lengths in frames")
+    parser.add_argument("--methods", default="auto", help="comma-separated alignment methods")
+    parser.add_argument("--video-seconds", type=float, default=20.0, help="length of the extraction video")
+    parser.add_argument("--video-size", default="640x480", help="WIDTHxHEIGHT of the extraction video")
+    parser.add_argument("--no-extraction", action="store_true", help="skip the extraction benchmark")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="fail if a case regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    cases = [
+        (f"compare/{method}/{frames}", bench_compare, frames, method)
+        for method in args.methods.split(",")
+        for frames in map(int, args.sizes.split(","))
+    ]
+    if not args.no_extraction:
+        width, height = map(int, args.video_size.split("x"))
+        cases.append((f"extract/{args.video_seconds:g}s/{width}x{height}", bench_extraction, args.video_seconds, (width, height)))
+
+    results = {}
+    for name, fn, *case_args in cases:
+        try:
+            results[name] = run_case(fn, *case_args)
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+        metrics = results[name]
+        if "error" in metrics:
+            print(f"{name:32} ERROR {metrics['error']}")
+            continue
+        stages = " ".join(f"{stage}={seconds:.3f}" for stage, seconds in metrics["stages"].items())
+        print(f"{name:32} {metrics['wall_s']:9.3f} s {metrics['peak_rss_mb']:8.1f} MB  {stages}")
+
+    failed = any("error" in metrics for metrics in results.values())
+    if args.check:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            sys.exit(f"No baseline at {args.baseline}; run with --save first")
+        regressions = check(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        failed = failed or bool(regressions)
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({name: m for name, m in results.items() if "error" not in m}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
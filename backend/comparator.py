@@ -1,6 +1,10 @@
+from typing import Callable
+
 import numpy as np
-from dtw import dtw
-from models import FramePose, ComparisonResult, SegmentScore
+from alignment import OnlineAligner, align_sequences
+from metrics import StageTimer
+from models import ResultSummary, SegmentScore
+from pose_sequence import PoseSequence
 
 # Use only major body joints for position similarity
 POS_LANDMARKS = [
@@ -31,19 +35,6 @@ POS_WEIGHTS = np.array([
     1.5,  # RIGHT_ANKLE
 ])
 
-def _normalize_landmarks(landmarks):
-    # Normalize by subtracting hip center and dividing by shoulder-hip distance (torso size)
-    left_hip = np.array([landmarks[_NAME_TO_IDX["LEFT_HIP"]].x, landmarks[_NAME_TO_IDX["LEFT_HIP"]].y, landmarks[_NAME_TO_IDX["LEFT_HIP"]].z])
-    right_hip = np.array([landmarks[_NAME_TO_IDX["RIGHT_HIP"]].x, landmarks[_NAME_TO_IDX["RIGHT_HIP"]].y, landmarks[_NAME_TO_IDX["RIGHT_HIP"]].z])
-    left_shoulder = np.array([landmarks[_NAME_TO_IDX["LEFT_SHOULDER"]].x, landmarks[_NAME_TO_IDX["LEFT_SHOULDER"]].y, landmarks[_NAME_TO_IDX["LEFT_SHOULDER"]].z])
-    right_shoulder = np.array([landmarks[_NAME_TO_IDX["RIGHT_SHOULDER"]].x, landmarks[_NAME_TO_IDX["RIGHT_SHOULDER"]].y, landmarks[_NAME_TO_IDX["RIGHT_SHOULDER"]].z])
-    hip_center = (left_hip + right_hip) / 2
-    shoulder_center = (left_shoulder + right_shoulder) / 2
-    torso_size = np.linalg.norm(shoulder_center - hip_center) + 1e-8
-    # Only use selected landmarks
-    normed = [(np.array([landmarks[_NAME_TO_IDX[name]].x, landmarks[_NAME_TO_IDX[name]].y, landmarks[_NAME_TO_IDX[name]].z]) - hip_center) / torso_size for name in POS_LANDMARKS]
-    return np.stack(normed)
-
 # Joint triplets for angle computation: (parent, joint, child)
 ANGLE_JOINTS = [
     ("LEFT_SHOULDER", "LEFT_ELBOW", "LEFT_WRIST"),
@@ -75,32 +66,19 @@ LANDMARK_NAMES = [
 
 _NAME_TO_IDX = {name: i for i, name in enumerate(LANDMARK_NAMES)}
 
+_POS_IDX = np.array([_NAME_TO_IDX[name] for name in POS_LANDMARKS])
+_ANGLE_IDX = np.array([[_NAME_TO_IDX[name] for name in triplet] for triplet in ANGLE_JOINTS])  # [12, 3]
 
-def _angle_vector(landmarks: list, triplet: tuple[str, str, str]) -> np.ndarray:
-    """Compute the angle at the middle joint of a triplet, returned as [cos, sin]."""
-    a = np.array([landmarks[_NAME_TO_IDX[triplet[0]]].x,
-                   landmarks[_NAME_TO_IDX[triplet[0]]].y,
-                   landmarks[_NAME_TO_IDX[triplet[0]]].z])
-    b = np.array([landmarks[_NAME_TO_IDX[triplet[1]]].x,
-                   landmarks[_NAME_TO_IDX[triplet[1]]].y,
-                   landmarks[_NAME_TO_IDX[triplet[1]]].z])
-    c = np.array([landmarks[_NAME_TO_IDX[triplet[2]]].x,
-                   landmarks[_NAME_TO_IDX[triplet[2]]].y,
-                   landmarks[_NAME_TO_IDX[triplet[2]]].z])
-    ba = a - b
-    bc = c - b
-    cos_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc) + 1e-8)
-    cos_angle = np.clip(cos_angle, -1, 1)
-    sin_angle = np.sqrt(1 - cos_angle ** 2)
-    return np.array([cos_angle, sin_angle])
+# Key points for motion tracking
+MOTION_LANDMARKS = ["LEFT_WRIST", "RIGHT_WRIST", "LEFT_ELBOW", "RIGHT_ELBOW",
+                    "LEFT_KNEE", "RIGHT_KNEE", "LEFT_ANKLE", "RIGHT_ANKLE"]
+_MOTION_IDX = np.array([_NAME_TO_IDX[name] for name in MOTION_LANDMARKS])
 
 
-def _frame_to_angle_vector(landmarks: list) -> np.ndarray:
-    """Convert one frame's landmarks into a concatenated angle vector."""
-    angles = []
-    for triplet in ANGLE_JOINTS:
-        angles.append(_angle_vector(landmarks, triplet))
-    return np.concatenate(angles)
+def _pair_mid(landmarks: np.ndarray, left: str, right: str) -> np.ndarray:
+    """Midpoint of a left/right landmark pair for every frame -> [frames, 3]."""
+    return (landmarks[:, _NAME_TO_IDX[left], :3] + landmarks[:, _NAME_TO_IDX[right], :3]) / 2
+
 
 # Per-angle weights: elbows/knees/shoulders weighted higher
 ANGLE_WEIGHTS = np.array([
@@ -119,497 +97,704 @@ ANGLE_WEIGHTS = np.array([
 ])
 
 
-def _cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
-    dot = np.dot(a, b)
-    norm = np.linalg.norm(a) * np.linalg.norm(b) + 1e-8
-    return float(np.clip(dot / norm, -1, 1))
-
-
-def _body_level_score(landmarks: list) -> float:
-    """Calculate body compactness (0 = extended/standing, 1 = compact/floor) based on body span."""
-    # Get extremes
-    left_shoulder_y = landmarks[_NAME_TO_IDX["LEFT_SHOULDER"]].y
-    right_shoulder_y = landmarks[_NAME_TO_IDX["RIGHT_SHOULDER"]].y
-    left_ankle_y = landmarks[_NAME_TO_IDX["LEFT_ANKLE"]].y
-    right_ankle_y = landmarks[_NAME_TO_IDX["RIGHT_ANKLE"]].y
-    left_wrist_y = landmarks[_NAME_TO_IDX["LEFT_WRIST"]].y
-    right_wrist_y = landmarks[_NAME_TO_IDX["RIGHT_WRIST"]].y
-    
-    shoulder_y = (left_shoulder_y + right_shoulder_y) / 2
-    ankle_y = (left_ankle_y + right_ankle_y) / 2
-    wrist_y = (left_wrist_y + right_wrist_y) / 2
-    
-    # Vertical span from highest to lowest point
-    min_y = min(shoulder_y, ankle_y, wrist_y)
-    max_y = max(shoulder_y, ankle_y, wrist_y)
-    vertical_span = max_y - min_y
-    
-    # Standing = large span (~0.5-0.7), Floor = small span (~0.2-0.4)
-    return float(vertical_span)
-
-
-def _knee_hip_distance(landmarks: list) -> float:
-    """Calculate average vertical distance from knees to hips. Small value = kneeling/floor."""
-    left_hip_y = landmarks[_NAME_TO_IDX["LEFT_HIP"]].y
-    right_hip_y = landmarks[_NAME_TO_IDX["RIGHT_HIP"]].y
-    left_knee_y = landmarks[_NAME_TO_IDX["LEFT_KNEE"]].y
-    right_knee_y = landmarks[_NAME_TO_IDX["RIGHT_KNEE"]].y
-    
-    hip_y = (left_hip_y + right_hip_y) / 2
-    knee_y = (left_knee_y + right_knee_y) / 2
-    
-    # Distance (positive = knees below hips = standing/normal)
-    distance = knee_y - hip_y
-    return float(distance)
-
-
-def _wrist_hip_distance(landmarks: list) -> float:
-    """Calculate average vertical distance from wrists to hips. Negative = hands on floor."""
-    left_hip_y = landmarks[_NAME_TO_IDX["LEFT_HIP"]].y
-    right_hip_y = landmarks[_NAME_TO_IDX["RIGHT_HIP"]].y
-    left_wrist_y = landmarks[_NAME_TO_IDX["LEFT_WRIST"]].y
-    right_wrist_y = landmarks[_NAME_TO_IDX["RIGHT_WRIST"]].y
-    
-    hip_y = (left_hip_y + right_hip_y) / 2
-    wrist_y = (left_wrist_y + right_wrist_y) / 2
-    
-    # Distance (positive = wrists below hips, negative = wrists above/on floor near hips)
-    distance = wrist_y - hip_y
-    return float(distance)
-
-
-def _motion_magnitude(landmarks1: list, landmarks2: list) -> float:
-    """Calculate total motion between two frames by measuring landmark displacement."""
-    # Key points for motion tracking
-    key_points = ["LEFT_WRIST", "RIGHT_WRIST", "LEFT_ELBOW", "RIGHT_ELBOW",
-                  "LEFT_KNEE", "RIGHT_KNEE", "LEFT_ANKLE", "RIGHT_ANKLE"]
-    
-    total_displacement = 0.0
-    for point in key_points:
-        idx = _NAME_TO_IDX[point]
-        x1, y1 = landmarks1[idx].x, landmarks1[idx].y
-        x2, y2 = landmarks2[idx].x, landmarks2[idx].y
-        displacement = np.sqrt((x2 - x1)**2 + (y2 - y1)**2)
-        total_displacement += displacement
-    
-    return float(total_displacement / len(key_points))  # Average displacement
-
-
-def _spine_angle_to_vertical(landmarks: list) -> float:
-    """Calculate the angle of the spine relative to vertical (gravity).
-    
-    Returns angle in degrees where:
+class SequenceFeatures:
+    """Per-frame comparison features for a whole pose sequence.
+
+    angles:       [frames, 24] concatenated [cos, sin] of the 12 ANGLE_JOINTS
+    positions:    [frames, 14, 3] POS_LANDMARKS, hip-centered and torso-scaled
+    spine_angles: [frames] spine angle to vertical in degrees
+    motion:       [frames] mean displacement of MOTION_LANDMARKS since the
+                  previous frame (0 for the first frame)
+    """
+
+    __slots__ = ("angles", "positions", "spine_angles", "motion")
+
+    def __init__(self, angles: np.ndarray, positions: np.ndarray, spine_angles: np.ndarray, motion: np.ndarray):
+        self.angles = angles
+        self.positions = positions
+        self.spine_angles = spine_angles
+        self.motion = motion
+
+    def __len__(self) -> int:
+        return len(self.angles)
+
+
+def build_features(poses: PoseSequence) -> SequenceFeatures:
+    """Compute all comparison features for a sequence in bulk."""
+    # Work in float64 so scores do not depend on the float32 storage format
+    landmarks = poses.landmarks.astype(np.float64)
+    return SequenceFeatures(
+        angles=_sequence_angle_vectors(landmarks),
+        positions=_sequence_normalized_positions(landmarks),
+        spine_angles=_sequence_spine_angles(landmarks),
+        motion=_sequence_motion(landmarks),
+    )
+
+
+def _sequence_angle_vectors(landmarks: np.ndarray) -> np.ndarray:
+    """[frames, 33, >=3] landmarks -> [frames, 24] angle vectors ([cos, sin] per triplet)."""
+    a = landmarks[:, _ANGLE_IDX[:, 0], :3]
+    b = landmarks[:, _ANGLE_IDX[:, 1], :3]
+    c = landmarks[:, _ANGLE_IDX[:, 2], :3]
+    ba = a - b
+    bc = c - b
+    dot = np.einsum("fjk,fjk->fj", ba, bc)
+    norms = np.linalg.norm(ba, axis=2) * np.linalg.norm(bc, axis=2) + 1e-8
+    cos_angle = np.clip(dot / norms, -1, 1)
+    sin_angle = np.sqrt(1 - cos_angle ** 2)
+    return np.stack([cos_angle, sin_angle], axis=2).reshape(len(landmarks), -1)
+
+
+def _sequence_normalized_positions(landmarks: np.ndarray) -> np.ndarray:
+    """Subtract the hip center and divide by shoulder-hip distance (torso size) -> [frames, 14, 3]."""
+    hip_center = _pair_mid(landmarks, "LEFT_HIP", "RIGHT_HIP")
+    shoulder_center = _pair_mid(landmarks, "LEFT_SHOULDER", "RIGHT_SHOULDER")
+    torso_size = np.linalg.norm(shoulder_center - hip_center, axis=1) + 1e-8
+    # Only use selected landmarks
+    return (landmarks[:, _POS_IDX, :3] - hip_center[:, None, :]) / torso_size[:, None, None]
+
+
+def _sequence_spine_angles(landmarks: np.ndarray) -> np.ndarray:
+    """Angle of the spine relative to vertical (gravity) for every frame.
+
+    Returns degrees where:
     - 0° = perfectly upright (standing)
     - 90° = horizontal (laying down/floor work)
     - 180° = upside down (handstand)
     """
-    # Shoulder midpoint
-    left_shoulder = landmarks[_NAME_TO_IDX["LEFT_SHOULDER"]]
-    right_shoulder = landmarks[_NAME_TO_IDX["RIGHT_SHOULDER"]]
-    mid_shoulder_x = (left_shoulder.x + right_shoulder.x) / 2
-    mid_shoulder_y = (left_shoulder.y + right_shoulder.y) / 2
-    
-    # Hip midpoint
-    left_hip = landmarks[_NAME_TO_IDX["LEFT_HIP"]]
-    right_hip = landmarks[_NAME_TO_IDX["RIGHT_HIP"]]
-    mid_hip_x = (left_hip.x + right_hip.x) / 2
-    mid_hip_y = (left_hip.y + right_hip.y) / 2
-    
-    # Spine vector (from hip to shoulder)
-    spine_x = mid_shoulder_x - mid_hip_x
-    spine_y = mid_shoulder_y - mid_hip_y
-    
-    # Vertical reference vector (pointing up in image coordinates, Y decreases upward)
-    # In MediaPipe, Y increases downward, so upward is negative Y direction
-    vertical_x = 0
-    vertical_y = -1
-    
-    # Calculate angle using dot product
-    dot_product = spine_x * vertical_x + spine_y * vertical_y
-    spine_magnitude = np.sqrt(spine_x**2 + spine_y**2)
-    vertical_magnitude = 1.0  # Unit vector
-    
-    # Avoid division by zero
-    if spine_magnitude < 1e-6:
-        return 0.0
-    
-    # Cosine of angle
-    cos_angle = dot_product / (spine_magnitude * vertical_magnitude)
-    cos_angle = np.clip(cos_angle, -1.0, 1.0)  # Clamp to valid range
-    
-    # Convert to degrees
-    angle_rad = np.arccos(cos_angle)
-    angle_deg = np.degrees(angle_rad)
-    
-    return float(angle_deg)
+    # Spine vector (from hip midpoint to shoulder midpoint)
+    spine = _pair_mid(landmarks, "LEFT_SHOULDER", "RIGHT_SHOULDER") - _pair_mid(landmarks, "LEFT_HIP", "RIGHT_HIP")
+    spine_x = spine[:, 0]
+    spine_y = spine[:, 1]
+    spine_magnitude = np.sqrt(spine_x ** 2 + spine_y ** 2)
+
+    # In MediaPipe, Y increases downward, so vertical (up) is (0, -1)
+    degenerate = spine_magnitude < 1e-6  # Avoid division by zero
+    cos_angle = -spine_y / np.where(degenerate, 1.0, spine_magnitude)
+    cos_angle = np.clip(cos_angle, -1.0, 1.0)
+    angle_deg = np.degrees(np.arccos(cos_angle))
+    return np.where(degenerate, 0.0, angle_deg)
+
+
+def _sequence_motion(landmarks: np.ndarray) -> np.ndarray:
+    """Average 2D displacement of MOTION_LANDMARKS from the previous frame -> [frames]."""
+    motion = np.zeros(len(landmarks))
+    if len(landmarks) > 1:
+        xy = landmarks[:, _MOTION_IDX, :2]
+        step = np.diff(xy, axis=0)
+        displacement = np.sqrt(step[..., 0] ** 2 + step[..., 1] ** 2)
+        motion[1:] = displacement.sum(axis=1) / len(MOTION_LANDMARKS)
+    return motion
+
+
+def _body_level_scores(landmarks: np.ndarray) -> np.ndarray:
+    """Body compactness per frame from vertical span (standing ~0.5-0.7, floor ~0.2-0.4)."""
+    shoulder_y = _pair_mid(landmarks, "LEFT_SHOULDER", "RIGHT_SHOULDER")[:, 1]
+    ankle_y = _pair_mid(landmarks, "LEFT_ANKLE", "RIGHT_ANKLE")[:, 1]
+    wrist_y = _pair_mid(landmarks, "LEFT_WRIST", "RIGHT_WRIST")[:, 1]
+    ys = np.stack([shoulder_y, ankle_y, wrist_y], axis=1)
+    # Vertical span from highest to lowest point
+    return ys.max(axis=1) - ys.min(axis=1)
 
 
-def compare_dances(
-    ref_poses: list[FramePose],
-    user_poses: list[FramePose],
-    ref_fps: float,
-    user_fps: float,
-    segment_duration: float = 2.5,
-) -> ComparisonResult:
-    """Compare two dance sequences using DTW + joint angle cosine similarity."""
+def _knee_hip_distances(landmarks: np.ndarray) -> np.ndarray:
+    """Vertical knee-to-hip distance per frame. Small value = kneeling/floor."""
+    # Positive = knees below hips = standing/normal
+    return _pair_mid(landmarks, "LEFT_KNEE", "RIGHT_KNEE")[:, 1] - _pair_mid(landmarks, "LEFT_HIP", "RIGHT_HIP")[:, 1]
 
-    # Build angle matrices
-    ref_angles = np.array([_frame_to_angle_vector(fp.landmarks) for fp in ref_poses])
-    user_angles = np.array([_frame_to_angle_vector(fp.landmarks) for fp in user_poses])
 
-    # DTW alignment
-    alignment = dtw(ref_angles, user_angles, dist_method="cosine")
-    path = list(zip(alignment.index1.tolist(), alignment.index2.tolist()))
-
-    # Per-aligned-pair similarity
-    pair_scores = []
-    weights = {'angle': 0.40, 'position': 0.25, 'spine': 0.20, 'motion': 0.15}  # Total = 1.0
-    angle_similarities_raw = []
-    angle_similarities_scaled = []
-    pos_similarities_raw = []
-    pos_similarities_scaled = []
-    spine_similarities_raw = []
-    spine_similarities_scaled = []
-    motion_similarities_raw = []
-    motion_similarities_scaled = []
-    for ri, ui in path:
-        # Angle similarity (weighted)
-        ref_vec = ref_angles[ri].reshape(len(ANGLE_WEIGHTS), 2)
-        user_vec = user_angles[ui].reshape(len(ANGLE_WEIGHTS), 2)
-        per_angle_sims = np.array([_cosine_similarity(ref_vec[i], user_vec[i]) for i in range(len(ANGLE_WEIGHTS))])
-        per_angle_sims_01 = np.clip((per_angle_sims + 1) / 2, 0, 1)
-        weighted_angle_sim_raw = np.average(per_angle_sims_01, weights=ANGLE_WEIGHTS)
-        # Harsh scaling: 94%+ stays as is, below 94% drops harshly
-        if weighted_angle_sim_raw >= 0.94:
-            weighted_angle_sim = weighted_angle_sim_raw
-        else:
-            # Very harsh penalty below 94% (90% → ~40%)
-            weighted_angle_sim = weighted_angle_sim_raw ** 6
-        # Position similarity (normalized keypoints with weighting)
-        ref_norm = _normalize_landmarks(ref_poses[ri].landmarks)
-        user_norm = _normalize_landmarks(user_poses[ui].landmarks)
-        per_landmark_errors = np.sum((ref_norm - user_norm) ** 2, axis=1)  # Error per landmark
-        weighted_mse = np.average(per_landmark_errors, weights=POS_WEIGHTS)
-        sim_pos_01 = 1 / (1 + np.exp(5 * (weighted_mse - 2.5)))  # Sigmoid: high for mse < 2.5, gentler drop after
-        
-        # Spine angle similarity (global orientation relative to gravity)
-        ref_spine_angle = _spine_angle_to_vertical(ref_poses[ri].landmarks)
-        user_spine_angle = _spine_angle_to_vertical(user_poses[ui].landmarks)
-        spine_angle_diff = abs(ref_spine_angle - user_spine_angle)  # Difference in degrees
-        # Small differences (<1°) are essentially identical (floating point precision)
-        if spine_angle_diff < 1.0:
-            spine_sim_raw = 1.0
-        else:
-            spine_sim_raw = 1 / (1 + np.exp(0.1 * (spine_angle_diff - 20)))  # Sigmoid: 20° threshold
-        # Note: Penalty will be applied after checking overall alignment ratio
-        
-        # Motion similarity (compare movement magnitude)
-        # Calculate motion for both videos if not first frame
-        if ri > 0 and ui > 0:
-            ref_motion = _motion_magnitude(ref_poses[ri-1].landmarks, ref_poses[ri].landmarks)
-            user_motion = _motion_magnitude(user_poses[ui-1].landmarks, user_poses[ui].landmarks)
-            motion_diff = abs(ref_motion - user_motion)
-            motion_sim_raw = 1 / (1 + np.exp(100 * (motion_diff - 0.05)))  # Sigmoid: 0.05 threshold
-        else:
-            motion_sim_raw = 1.0  # First frame has no motion to compare
-        
-        # Apply harsh penalty below 85% threshold
-        if motion_sim_raw >= 0.85:
-            motion_sim = motion_sim_raw
-        else:
-            motion_sim = motion_sim_raw ** 4
-        
-        # Store raw similarities (scaled versions computed after alignment check)
-        angle_similarities_raw.append(weighted_angle_sim_raw)
-        angle_similarities_scaled.append(weighted_angle_sim)
-        pos_similarities_raw.append(weighted_mse)
-        pos_similarities_scaled.append(sim_pos_01)
-        spine_similarities_raw.append(spine_sim_raw)
-        motion_similarities_raw.append(motion_sim_raw)
-        motion_similarities_scaled.append(motion_sim)
-
-    overall_score = float(np.mean(pair_scores))
-    
-    # Check overall spine alignment: if average raw >70%, give full 15% credit
-    avg_spine_raw = float(np.mean(spine_similarities_raw)) if spine_similarities_raw else 0
-    
+def _wrist_hip_distances(landmarks: np.ndarray) -> np.ndarray:
+    """Vertical wrist-to-hip distance per frame. Negative = wrists above hips."""
+    return _pair_mid(landmarks, "LEFT_WRIST", "RIGHT_WRIST")[:, 1] - _pair_mid(landmarks, "LEFT_HIP", "RIGHT_HIP")[:, 1]
+
+
+# Component weights for the per-pair score (total = 1.0)
+SCORE_WEIGHTS = {'angle': 0.40, 'position': 0.25, 'spine': 0.20, 'motion': 0.15}
+
+# Newest attempt frames whose path IncrementalComparison.running_scores
+# re-scores on every call (~10 s at 30 fps); older pairs are settled
+RUNNING_SCORE_TRAIL = 300
+
+
+def _harsh_scale(raw: np.ndarray, threshold: float, power: int) -> np.ndarray:
+    """Keep values at/above threshold, raise the rest to `power` to penalize harshly."""
+    return np.where(raw >= threshold, raw, raw ** power)
+
+
+def _score_path(
+    ref_feat: SequenceFeatures,
+    user_feat: SequenceFeatures,
+    ref_idx: np.ndarray,
+    user_idx: np.ndarray,
+) -> dict[str, np.ndarray]:
+    """Score every aligned (ref, user) frame pair of a DTW path at once.
+
+    Returns per-pair arrays: 'pair_scores' (0-100), raw and scaled
+    angle/position/spine/motion similarities, and the [pairs, 12]
+    'joint_scores' matrix (0-100 per ANGLE_JOINTS entry).
+    """
+    weights = SCORE_WEIGHTS
+    n_angles = len(ANGLE_WEIGHTS)
+
+    # Angle similarity (weighted per-joint cosine of [cos, sin] vectors)
+    ref_vec = ref_feat.angles[ref_idx].reshape(-1, n_angles, 2)
+    user_vec = user_feat.angles[user_idx].reshape(-1, n_angles, 2)
+    dot = np.sum(ref_vec * user_vec, axis=2)
+    norm = np.linalg.norm(ref_vec, axis=2) * np.linalg.norm(user_vec, axis=2) + 1e-8
+    per_angle_sims = np.clip(dot / norm, -1, 1)
+    # Per-joint 0-100 scores shared by the moment and problem-joint reports
+    joint_scores = np.maximum(0, (per_angle_sims + 1) / 2) * 100
+    per_angle_sims_01 = np.clip((per_angle_sims + 1) / 2, 0, 1)
+    angle_raw = np.average(per_angle_sims_01, axis=1, weights=ANGLE_WEIGHTS)
+    # Harsh scaling: 94%+ stays as is, below 94% drops harshly (90% → ~40%)
+    angle_scaled = _harsh_scale(angle_raw, 0.94, 6)
+
+    # Position similarity (normalized keypoints with weighting)
+    diff = ref_feat.positions[ref_idx] - user_feat.positions[user_idx]
+    per_landmark_errors = np.sum(diff ** 2, axis=2)  # Error per landmark
+    pos_raw = np.average(per_landmark_errors, axis=1, weights=POS_WEIGHTS)
+    with np.errstate(over='ignore'):
+        pos_scaled = 1 / (1 + np.exp(5 * (pos_raw - 2.5)))  # Sigmoid: high for mse < 2.5, gentler drop after
+
+    # Spine angle similarity (global orientation relative to gravity)
+    spine_angle_diff = np.abs(ref_feat.spine_angles[ref_idx] - user_feat.spine_angles[user_idx])
+    # Small differences (<1°) are essentially identical (floating point precision)
+    with np.errstate(over='ignore'):
+        spine_raw = np.where(
+            spine_angle_diff < 1.0,
+            1.0,
+            1 / (1 + np.exp(0.1 * (spine_angle_diff - 20))),  # Sigmoid: 20° threshold
+        )
+
+    # Motion similarity (compare movement magnitude); the first frame has no motion to compare
+    has_motion = (ref_idx > 0) & (user_idx > 0)
+    motion_diff = np.abs(ref_feat.motion[ref_idx] - user_feat.motion[user_idx])
+    with np.errstate(over='ignore'):
+        motion_raw = np.where(
+            has_motion,
+            1 / (1 + np.exp(100 * (motion_diff - 0.05))),  # Sigmoid: 0.05 threshold
+            1.0,
+        )
+
+    n_pairs = len(ref_idx)
+
+    # Overall spine alignment: if average raw >= 70%, give full spine credit
+    avg_spine_raw = float(np.mean(spine_raw)) if n_pairs else 0
     if avg_spine_raw >= 0.70:
-        # Good overall spine alignment - give full weight contribution (15 points out of 100)
-        spine_weight_contribution = weights['spine'] * 100  # 15 points
-        spine_similarities_scaled = [1.0] * len(spine_similarities_raw)
+        spine_scaled = np.ones(n_pairs)
+        spine_contrib = np.full(n_pairs, weights['spine'])
     else:
-        # Poor spine alignment - use actual scaled values (apply penalties)
-        spine_weight_contribution = None  # Will be calculated from actual scores
-        spine_similarities_scaled = []
-        for spine_sim_raw in spine_similarities_raw:
-            if spine_sim_raw >= 0.85:
-                spine_similarities_scaled.append(spine_sim_raw)
-            else:
-                spine_similarities_scaled.append(spine_sim_raw ** 4)
-    
-    # Check overall motion alignment: if average raw >90%, give full 10% credit
-    avg_motion_raw = float(np.mean(motion_similarities_raw)) if motion_similarities_raw else 0
-    
+        spine_scaled = _harsh_scale(spine_raw, 0.85, 4)
+        spine_contrib = weights['spine'] * spine_scaled
+
+    # Overall motion alignment: if average raw >= 90%, give full motion credit
+    avg_motion_raw = float(np.mean(motion_raw)) if n_pairs else 0
     if avg_motion_raw >= 0.90:
-        # Good overall motion match - give full weight contribution (10 points out of 100)
-        motion_weight_contribution = weights['motion'] * 100  # 10 points
-        motion_similarities_scaled = [1.0] * len(motion_similarities_raw)
+        motion_scaled = np.ones(n_pairs)
+        motion_contrib = np.full(n_pairs, weights['motion'])
     else:
-        # Poor motion match - use actual scaled values (already computed with penalties)
-        motion_weight_contribution = None  # Will be calculated from actual scores
-        # motion_similarities_scaled already has penalties applied
-    
-    # Recalculate pair scores with adjusted spine and motion scaling
-    pair_scores = []
-    for i in range(len(angle_similarities_scaled)):
-        # Calculate component contributions
-        angle_contrib = weights['angle'] * angle_similarities_scaled[i]
-        pos_contrib = weights['position'] * pos_similarities_scaled[i]
-        
-        # Use override if threshold met, otherwise use actual score
-        if spine_weight_contribution is not None:
-            spine_contrib = spine_weight_contribution / 100  # Convert back to 0-1 scale
-        else:
-            spine_contrib = weights['spine'] * spine_similarities_scaled[i]
-            
-        if motion_weight_contribution is not None:
-            motion_contrib = motion_weight_contribution / 100  # Convert back to 0-1 scale
-        else:
-            motion_contrib = weights['motion'] * motion_similarities_scaled[i]
-        
-        sim_final = angle_contrib + pos_contrib + spine_contrib + motion_contrib
-        pair_scores.append(sim_final * 100)
-    
-    overall_score = float(np.mean(pair_scores))
-    
+        motion_scaled = _harsh_scale(motion_raw, 0.85, 4)
+        motion_contrib = weights['motion'] * motion_scaled
+
+    sim_final = weights['angle'] * angle_scaled + weights['position'] * pos_scaled + spine_contrib + motion_contrib
+    return {
+        'pair_scores': sim_final * 100,
+        'angle_raw': angle_raw,
+        'angle_scaled': angle_scaled,
+        'pos_raw': pos_raw,
+        'pos_scaled': pos_scaled,
+        'spine_raw': spine_raw,
+        'spine_scaled': spine_scaled,
+        'motion_raw': motion_raw,
+        'motion_scaled': motion_scaled,
+        'joint_scores': joint_scores,
+    }
+
+
+def _segment_edges(duration: float, segment_duration: float) -> np.ndarray:
+    """Fixed-length segment boundaries covering [0, duration] (last segment may be shorter)."""
+    if segment_duration <= 0:
+        raise ValueError("segment_duration must be positive")
+    edges = [0.0]
+    while edges[-1] < duration:
+        edges.append(min(edges[-1] + segment_duration, duration))
+    return np.array(edges)
+
+
+def _check_segment_boundaries(boundaries) -> np.ndarray:
+    edges = np.asarray(boundaries, dtype=np.float64)
+    if edges.ndim != 1 or len(edges) < 2 or np.any(np.diff(edges) <= 0):
+        raise ValueError("segment_boundaries must be at least two strictly increasing times")
+    return edges
+
+
+def _bucket_pairs(pair_ts: np.ndarray, edges: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Assign path pairs to segments [edges[k], edges[k+1]) by reference timestamp.
+
+    Returns (order, starts, counts): the pairs of segment k are
+    order[starts[k]:starts[k] + counts[k]], in path order.
+    """
+    n_segments = len(edges) - 1
+    seg = np.searchsorted(edges, pair_ts, side='right') - 1
+    inside = np.flatnonzero((seg >= 0) & (seg < n_segments))
+    order = inside[np.argsort(seg[inside], kind='stable')]
+    bounds = np.searchsorted(seg[order], np.arange(n_segments + 1))
+    return order, bounds[:-1], np.diff(bounds)
+
+
+def _segment_reduce(ufunc, values, order, starts, counts, empty=0.0) -> np.ndarray:
+    """Apply a ufunc reduction per segment; empty segments get `empty`."""
+    out = np.full(len(starts), empty, dtype=np.result_type(values, type(empty)))
+    filled = counts > 0
+    if filled.any():
+        out[filled] = ufunc.reduceat(values[order], starts[filled])
+    return out
+
+
+def _score_segments(
+    scores: dict[str, np.ndarray],
+    ref_idx: np.ndarray,
+    user_idx: np.ndarray,
+    ref_ts: np.ndarray,
+    user_ts: np.ndarray,
+    edges: np.ndarray,
+) -> tuple[list[SegmentScore], dict]:
+    """Aggregate per-pair scores into segments; returns (segment_scores, debug)."""
+    order, starts, counts = _bucket_pairs(ref_ts[ref_idx], edges)
+    filled = counts > 0
+    safe_counts = np.maximum(counts, 1)
+
+    def seg_mean(values):
+        return _segment_reduce(np.add, values, order, starts, counts) / safe_counts
+
+    seg_scores = seg_mean(scores['pair_scores'])
     # For debug: per-segment angle/pos/spine/motion similarity (raw and scaled)
-    segment_angle_sims_raw = []
-    segment_angle_sims_scaled = []
-    segment_pos_sims_raw = []
-    segment_pos_sims_scaled = []
-    segment_spine_sims_raw = []
-    segment_spine_sims_scaled = []
-    segment_motion_sims_raw = []
-    segment_motion_sims_scaled = []
-    
-
-    # Find worst 5 moments globally (lowest joint similarity across all DTW pairs)
-    def find_worst_moments(ref_poses, user_poses, path, n=5):
-        moments = []
-        for idx, (ri, ui) in enumerate(path):
-            ref_lm = ref_poses[ri].landmarks
-            usr_lm = user_poses[ui].landmarks
-            worst_joint = None
-            worst_score = 100.0
-            for triplet in ANGLE_JOINTS:
-                ref_a = _angle_vector(ref_lm, triplet)
-                usr_a = _angle_vector(usr_lm, triplet)
-                sim = _cosine_similarity(ref_a, usr_a)
-                score = max(0, (sim + 1) / 2) * 100
-                if score < worst_score:
-                    worst_score = score
-                    worst_joint = triplet[1]
-            moments.append({
-                'joint': worst_joint,
-                'score': round(worst_score, 1),
-                'ref_frame': ri,
-                'user_frame': ui,
-                'timestamp': ref_poses[ri].timestamp
-            })
-        # Sort by score ascending, pick worst n
-        moments_sorted = sorted(moments, key=lambda m: m['score'])[:n]
-        return moments_sorted
-
-    worst_moments = find_worst_moments(ref_poses, user_poses, path, n=5)
-
-    # Extended list: all moments with error below threshold (score < 95%)
-    def find_extended_moments(ref_poses, user_poses, path, threshold=95.0):
-        moments = []
-        for idx, (ri, ui) in enumerate(path):
-            ref_lm = ref_poses[ri].landmarks
-            usr_lm = user_poses[ui].landmarks
-            worst_joint = None
-            worst_score = 100.0
-            for triplet in ANGLE_JOINTS:
-                ref_a = _angle_vector(ref_lm, triplet)
-                usr_a = _angle_vector(usr_lm, triplet)
-                sim = _cosine_similarity(ref_a, usr_a)
-                score = max(0, (sim + 1) / 2) * 100
-                if score < worst_score:
-                    worst_score = score
-                    worst_joint = triplet[1]
-            if worst_score < threshold:
-                moments.append({
-                    'joint': worst_joint,
-                    'score': round(worst_score, 1),
-                    'ref_frame': ri,
-                    'user_frame': ui,
-                    'timestamp': ref_poses[ri].timestamp
-                })
-        return moments
-
-    extended_moments = find_extended_moments(ref_poses, user_poses, path, threshold=70.0)
-
-    # Per-segment scores based on reference timestamps
-    ref_duration = ref_poses[-1].timestamp if ref_poses else 0
+    seg_angle_raw = seg_mean(scores['angle_raw'])
+    seg_pos_raw = seg_mean(scores['pos_raw'])
+    seg_spine_raw = seg_mean(scores['spine_raw'])
+    seg_spine_scaled = seg_mean(scores['spine_scaled'])
+    seg_motion_raw = seg_mean(scores['motion_raw'])
+    with np.errstate(over='ignore'):
+        seg_pos_scaled = 1 / (1 + np.exp(5 * (seg_pos_raw - 2.5)))
+    seg_angle_scaled = np.where(filled, _harsh_scale(seg_angle_raw, 0.94, 6), 0.0)
+    seg_pos_scaled = np.where(filled, seg_pos_scaled, 0.0)
+    seg_motion_scaled = np.where(filled, _harsh_scale(seg_motion_raw, 0.85, 4), 0.0)
+
+    # Matching time range in the user video
+    user_first = _segment_reduce(np.minimum, user_idx, order, starts, counts, empty=0)
+    user_last = _segment_reduce(np.maximum, user_idx, order, starts, counts, empty=0)
+
+    joint_scores = scores['joint_scores']
     segment_scores: list[SegmentScore] = []
-    seg_start = 0.0
-
-    while seg_start < ref_duration:
-        seg_end = min(seg_start + segment_duration, ref_duration)
-        seg_pairs = [
-            (i, ri, ui)
-            for i, (ri, ui) in enumerate(path)
-            if seg_start <= ref_poses[ri].timestamp < seg_end
-        ]
-
-        if seg_pairs:
-            seg_pair_scores = [pair_scores[i] for i, _, _ in seg_pairs]
-            seg_score = float(np.mean(seg_pair_scores))
-<<<<<<< Updated upstream
-
-            # Find matching timestamps in user video
-            user_indices = [ui for _, _, ui in seg_pairs]
-            u_start = user_poses[min(user_indices)].timestamp
-            u_end = user_poses[max(user_indices)].timestamp
-            
-            print(f"DEBUG: Segment {seg_start:.2f}s-{seg_end:.2f}s aligned to user video at {u_start:.2f}s-{u_end:.2f}s")
-
+    for k in range(len(starts)):
+        if filled[k]:
+            rows = order[starts[k]:starts[k] + counts[k]]
+            u_start = float(user_ts[user_first[k]])
+            u_end = float(user_ts[user_last[k]])
             # Find problem joints for this segment
-=======
-            seg_angle_raw = float(np.mean([angle_similarities_raw[i] for i, _, _ in seg_pairs]))
-            seg_pos_raw = float(np.mean([pos_similarities_raw[i] for i, _, _ in seg_pairs]))
-            seg_spine_raw = float(np.mean([spine_similarities_raw[i] for i, _, _ in seg_pairs]))
-            seg_spine_scaled = float(np.mean([spine_similarities_scaled[i] for i, _, _ in seg_pairs]))
-            seg_motion_raw = float(np.mean([motion_similarities_raw[i] for i, _, _ in seg_pairs]))
-            if seg_angle_raw >= 0.94:
-                seg_angle_scaled = seg_angle_raw
-            else:
-                seg_angle_scaled = seg_angle_raw ** 6
-            seg_pos_scaled = 1 / (1 + np.exp(5 * (seg_pos_raw - 2.5)))
-            if seg_motion_raw >= 0.85:
-                seg_motion_scaled = seg_motion_raw
-            else:
-                seg_motion_scaled = seg_motion_raw ** 4
-            segment_angle_sims_raw.append(seg_angle_raw)
-            segment_angle_sims_scaled.append(seg_angle_scaled)
-            segment_pos_sims_raw.append(seg_pos_raw)
-            segment_pos_sims_scaled.append(seg_pos_scaled)
-            segment_spine_sims_raw.append(seg_spine_raw)
-            segment_spine_sims_scaled.append(seg_spine_scaled)
-            segment_motion_sims_raw.append(seg_motion_raw)
-            segment_motion_sims_scaled.append(seg_motion_scaled)
->>>>>>> Stashed changes
-            problem_joints = _find_problem_joints(
-                ref_poses, user_poses, seg_pairs, threshold=70
-            )
+            problem_joints = _find_problem_joints(joint_scores[rows], ref_idx[rows])
         else:
-            seg_score = 0.0
             u_start = 0.0
             u_end = 0.0
             problem_joints = []
-            segment_angle_sims_raw.append(0.0)
-            segment_angle_sims_scaled.append(0.0)
-            segment_pos_sims_raw.append(0.0)
-            segment_pos_sims_scaled.append(0.0)
-            segment_spine_sims_raw.append(0.0)
-            segment_spine_sims_scaled.append(0.0)
-            segment_motion_sims_raw.append(0.0)
-            segment_motion_sims_scaled.append(0.0)
-
         segment_scores.append(
             SegmentScore(
-                start_time=seg_start,
-                end_time=seg_end,
+                start_time=float(edges[k]),
+                end_time=float(edges[k + 1]),
                 user_start_time=u_start,
                 user_end_time=u_end,
-                score=round(seg_score, 1),
+                score=round(float(seg_scores[k]), 1),
                 problem_joints=problem_joints,
             )
         )
-        seg_start = seg_end
 
-    # Flatten keypoints for JSON transfer
-    ref_kp = [
-        [[lm.x, lm.y, lm.z] for lm in fp.landmarks] for fp in ref_poses
-    ]
-    user_kp = [
-        [[lm.x, lm.y, lm.z] for lm in fp.landmarks] for fp in user_poses
-    ]
-
-    # Attach debug info for frontend
     debug = {
-        'segment_angle_sims_raw': segment_angle_sims_raw,
-        'segment_angle_sims_scaled': segment_angle_sims_scaled,
-        'segment_pos_sims_raw': segment_pos_sims_raw,
-        'segment_pos_sims_scaled': segment_pos_sims_scaled,
-        'segment_spine_sims_raw': segment_spine_sims_raw,
-        'segment_spine_sims_scaled': segment_spine_sims_scaled,
-        'segment_motion_sims_raw': segment_motion_sims_raw,
-        'segment_motion_sims_scaled': segment_motion_sims_scaled,
+        'segment_angle_sims_raw': seg_angle_raw.tolist(),
+        'segment_angle_sims_scaled': seg_angle_scaled.tolist(),
+        'segment_pos_sims_raw': seg_pos_raw.tolist(),
+        'segment_pos_sims_scaled': seg_pos_scaled.tolist(),
+        'segment_spine_sims_raw': seg_spine_raw.tolist(),
+        'segment_spine_sims_scaled': seg_spine_scaled.tolist(),
+        'segment_motion_sims_raw': seg_motion_raw.tolist(),
+        'segment_motion_sims_scaled': seg_motion_scaled.tolist(),
     }
-    return ComparisonResult(
-        overall_score=round(overall_score, 1),
-        segment_scores=segment_scores,
-        ref_keypoints=ref_kp,
-        user_keypoints=user_kp,
-        dtw_path=path,
-        ref_fps=ref_fps,
-        user_fps=user_fps,
-        debug=debug,
-        worst_moments=worst_moments,
-        extended_moments=extended_moments,
+    return segment_scores, debug
+
+
+def _ignore_progress(stage: str) -> None:
+    pass
+
+
+def compare_dances(
+    ref_poses: PoseSequence,
+    user_poses: PoseSequence,
+    ref_fps: float,
+    user_fps: float,
+    segment_duration: float = 2.5,
+    segment_boundaries: list[float] | None = None,
+    alignment_method: str = "auto",
+    alignment_window: float | None = None,
+    ref_features: SequenceFeatures | None = None,
+    progress: Callable[[str], None] | None = None,
+) -> tuple[ResultSummary, dict[str, np.ndarray]]:
+    """Compare two dance sequences using DTW + joint angle cosine similarity.
+
+    Segments are fixed `segment_duration` windows over the reference video
+    unless `segment_boundaries` (increasing reference times in seconds,
+    e.g. choreography counts) is given. `alignment_method` selects the
+    DTW engine (see alignment.ALIGNMENT_METHODS). Precomputed reference
+    features (e.g. from the reference library) can be passed as
+    `ref_features` to skip rebuilding them. `progress(stage)` is called as
+    each stage ("features", "aligning", "scoring") starts. Returns the
+    ResultSummary and the keypoint and path arrays (see _build_result). The
+    seconds spent per stage are returned in debug['timings'].
+    """
+    progress = progress or _ignore_progress
+    timer = StageTimer()
+    edges = _comparison_edges(ref_poses, segment_duration, segment_boundaries)
+
+    # Build feature arrays for both sequences
+    progress("features")
+    with timer.stage("features"):
+        ref_feat = ref_features if ref_features is not None else build_features(ref_poses)
+        user_feat = build_features(user_poses)
+
+    # DTW alignment
+    progress("aligning")
+    with timer.stage("alignment"):
+        ref_idx, user_idx = align_sequences(
+            ref_feat.angles, user_feat.angles, method=alignment_method, window=alignment_window
+        )
+
+    progress("scoring")
+    return _build_result(
+        ref_poses, user_poses, ref_fps, user_fps, ref_feat, user_feat, ref_idx, user_idx, edges, timer
+    )
+
+
+def _slice_features(feat: SequenceFeatures, start: int) -> SequenceFeatures:
+    return SequenceFeatures(feat.angles[start:], feat.positions[start:], feat.spine_angles[start:], feat.motion[start:])
+
+
+def _concat_features(a: SequenceFeatures, b: SequenceFeatures) -> SequenceFeatures:
+    return SequenceFeatures(
+        np.concatenate([a.angles, b.angles]),
+        np.concatenate([a.positions, b.positions]),
+        np.concatenate([a.spine_angles, b.spine_angles]),
+        np.concatenate([a.motion, b.motion]),
     )
 
 
-def _find_problem_joints(
-    ref_poses, user_poses, seg_pairs, threshold=70
-) -> list[str]:
-    """Identify joints with high deviation in a segment."""
-    joint_errors: dict[str, list[float]] = {
-        triplet[1]: [] for triplet in ANGLE_JOINTS
+class IncrementalComparison:
+    """compare_dances for an attempt whose poses arrive in batches during extraction.
+
+    Every batch is aligned as it arrives by an OnlineAligner over the
+    reference's angle features, so once the last attempt frame is inferred
+    only the final backtrack and the bulk scoring remain. The result is the
+    same as compare_dances with alignment_method="online".
+    """
+
+    def __init__(
+        self,
+        ref_poses: PoseSequence,
+        ref_fps: float,
+        segment_duration: float = 2.5,
+        segment_boundaries: list[float] | None = None,
+        alignment_window: float | None = None,
+        ref_features: SequenceFeatures | None = None,
+    ):
+        self.ref_poses = ref_poses
+        self.ref_fps = ref_fps
+        self._edges = _comparison_edges(ref_poses, segment_duration, segment_boundaries)
+        self._ref_feat = ref_features if ref_features is not None else build_features(ref_poses)
+        self._aligner = OnlineAligner(self._ref_feat.angles, alignment_window)
+        self._last_landmarks: np.ndarray | None = None  # Newest frame, for the next batch's motion
+        # Features of the attempt frames from self._settled on; earlier frames
+        # are only kept as per-segment score sums
+        self._tail: SequenceFeatures | None = None
+        self._settled = 0
+        self._seg_sums = np.zeros(len(self._edges) - 1)
+        self._seg_counts = np.zeros(len(self._edges) - 1)
+
+    def __len__(self) -> int:
+        """Attempt frames aligned so far."""
+        return len(self._aligner)
+
+    def add(self, poses: PoseSequence) -> None:
+        """Align the next attempt frames."""
+        if not len(poses):
+            return
+        landmarks = poses.landmarks
+        if self._last_landmarks is not None:
+            # Prepend the previous frame so the first frame's motion is right
+            landmarks = np.concatenate([self._last_landmarks[None], landmarks])
+        nums = np.arange(len(landmarks))
+        feat = build_features(PoseSequence(landmarks, nums, nums.astype(np.float64)))
+        if self._last_landmarks is not None:
+            feat = _slice_features(feat, 1)
+        self._last_landmarks = poses.landmarks[-1]
+        self._aligner.extend(feat.angles)
+        self._tail = feat if self._tail is None else _concat_features(self._tail, feat)
+
+    def running_scores(self) -> dict | None:
+        """Scores of the open-end path so far (None before the first frame).
+
+        Returns the reference time reached ('ref_time'), the mean pair score
+        so far ('running_score') and the segments the attempt has already
+        passed ('segment_scores': start_time, end_time, score).
+
+        Only the path of the newest RUNNING_SCORE_TRAIL attempt frames is
+        backtracked and scored on every call; pairs older than that are
+        scored once and kept as per-segment sums, so a call costs the same
+        however long the attempt is. These are progress figures: the final
+        result rescores the whole path.
+        """
+        newest = len(self._aligner)
+        if newest == 0:
+            return None
+        ref_idx, user_idx = self._aligner.path(open_end=True, start=self._settled)
+        pair_scores = _score_path(self._ref_feat, self._tail, ref_idx, user_idx - self._settled)['pair_scores']
+
+        ref_ts = self.ref_poses.timestamps
+        n_segments = len(self._edges) - 1
+        seg = np.searchsorted(self._edges, ref_ts[ref_idx], side='right') - 1
+        inside = (seg >= 0) & (seg < n_segments)
+
+        # Pairs that left the trailing window are settled for good
+        settle = user_idx < newest - RUNNING_SCORE_TRAIL
+        if settle.any():
+            keep = settle & inside
+            self._seg_sums += np.bincount(seg[keep], weights=pair_scores[keep], minlength=n_segments)
+            self._seg_counts += np.bincount(seg[keep], minlength=n_segments)
+            settled = int(user_idx[settle].max()) + 1
+            self._tail = _slice_features(self._tail, settled - self._settled)
+            self._settled = settled
+
+        live = ~settle & inside
+        sums = self._seg_sums + np.bincount(seg[live], weights=pair_scores[live], minlength=n_segments)
+        counts = self._seg_counts + np.bincount(seg[live], minlength=n_segments)
+        ref_time = float(ref_ts[self._aligner.position])
+        passed = np.flatnonzero((counts > 0) & (self._edges[1:] <= ref_time))
+        return {
+            'ref_time': round(ref_time, 2),
+            'running_score': round(float(sums.sum() / max(counts.sum(), 1)), 1),
+            'segment_scores': [
+                {
+                    'start_time': float(self._edges[k]),
+                    'end_time': float(self._edges[k + 1]),
+                    'score': round(float(sums[k] / counts[k]), 1),
+                }
+                for k in passed
+            ],
+        }
+
+    def finish(
+        self,
+        user_poses: PoseSequence,
+        user_fps: float,
+        progress: Callable[[str], None] | None = None,
+    ) -> tuple[ResultSummary, dict[str, np.ndarray]]:
+        """Align the frames of `user_poses` not added yet and build the full result.
+
+        The batches added so far must be the start of `user_poses`. Stage
+        timings (of this call only) are in debug['timings'], as for compare_dances.
+        """
+        progress = progress or _ignore_progress
+        timer = StageTimer()
+        streamed = len(self._aligner)
+        if streamed > len(user_poses):
+            raise ValueError("More attempt frames were added than the attempt has")
+
+        progress("features")
+        with timer.stage("features"):
+            user_feat = build_features(user_poses)
+
+        progress("aligning")
+        with timer.stage("alignment"):
+            self._aligner.extend(user_feat.angles[streamed:])
+            ref_idx, user_idx = self._aligner.path()
+
+        progress("scoring")
+        summary, arrays = _build_result(
+            self.ref_poses, user_poses, self.ref_fps, user_fps,
+            self._ref_feat, user_feat, ref_idx, user_idx, self._edges, timer,
+        )
+        summary.debug['online_alignment'] = {'frames_streamed': streamed, 'frames_total': len(user_poses)}
+        return summary, arrays
+
+
+def _comparison_edges(
+    ref_poses: PoseSequence, segment_duration: float, segment_boundaries: list[float] | None
+) -> np.ndarray:
+    if segment_boundaries is not None:
+        return _check_segment_boundaries(segment_boundaries)
+    return _segment_edges(ref_poses.duration, segment_duration)
+
+
+def _build_result(
+    ref_poses: PoseSequence,
+    user_poses: PoseSequence,
+    ref_fps: float,
+    user_fps: float,
+    ref_feat: SequenceFeatures,
+    user_feat: SequenceFeatures,
+    ref_idx: np.ndarray,
+    user_idx: np.ndarray,
+    edges: np.ndarray,
+    timer: StageTimer,
+) -> tuple[ResultSummary, dict[str, np.ndarray]]:
+    """Score an alignment path and assemble the result, timing each stage with `timer`.
+
+    Returns the ResultSummary and the large fields as arrays: ref_keypoints
+    and user_keypoints (float32 [frames, 33, 3]) and dtw_path (int32
+    [pairs, 2] of ref_idx, user_idx), as stored by job_store.
+    """
+    ref_ts = ref_poses.timestamps
+    user_ts = user_poses.timestamps
+
+    # Score every aligned pair in bulk
+    with timer.stage("scoring"):
+        scores = _score_path(ref_feat, user_feat, ref_idx, user_idx)
+        overall_score = float(np.mean(scores['pair_scores']))
+
+    # Worst 5 moments globally, plus every moment scoring below 70%
+    with timer.stage("moments"):
+        joint_scores = scores['joint_scores']
+        worst_moments = _find_worst_moments(joint_scores, ref_idx, user_idx, ref_ts, n=5)
+        extended_moments = _find_extended_moments(joint_scores, ref_idx, user_idx, ref_ts, threshold=70.0)
+
+    # Per-segment scores (and their problem joints) based on reference timestamps
+    with timer.stage("segments"):
+        segment_scores, debug = _score_segments(scores, ref_idx, user_idx, ref_ts, user_ts, edges)
+
+    # Keypoints and path stay arrays; nested lists are only built for JSON responses
+    with timer.stage("assembly"):
+        arrays = {
+            'ref_keypoints': np.ascontiguousarray(ref_poses.landmarks[:, :, :3]),
+            'user_keypoints': np.ascontiguousarray(user_poses.landmarks[:, :, :3]),
+            'dtw_path': np.stack([ref_idx, user_idx], axis=1).astype(np.int32),
+        }
+        summary = ResultSummary(
+            overall_score=round(overall_score, 1),
+            segment_scores=segment_scores,
+            ref_fps=ref_fps,
+            user_fps=user_fps,
+            ref_frames=len(ref_poses),
+            user_frames=len(user_poses),
+            path_length=len(ref_idx),
+            debug=debug,
+            worst_moments=worst_moments,
+            extended_moments=extended_moments,
+        )
+    summary.debug['timings'] = timer.rounded()
+    return summary, arrays
+
+
+def score_frame_pair(
+    ref_feat: SequenceFeatures, user_feat: SequenceFeatures, ref_frame: int, user_frame: int
+) -> dict:
+    """Score of one aligned frame pair, for live feedback.
+
+    Returns 'score' (0-100) and 'joints': the 0-100 score of every
+    ANGLE_JOINTS entry as {joint, score}, in ANGLE_JOINTS order.
+    """
+    scores = _score_path(ref_feat, user_feat, np.array([ref_frame]), np.array([user_frame]))
+    return {
+        'score': round(float(scores['pair_scores'][0]), 1),
+        'joints': [
+            {'joint': name, 'score': round(float(score), 1)}
+            for name, score in zip(_JOINT_NAMES, scores['joint_scores'][0])
+        ],
     }
 
-    for _, ri, ui in seg_pairs:
-        ref_lm = ref_poses[ri].landmarks
-        usr_lm = user_poses[ui].landmarks
-        for triplet in ANGLE_JOINTS:
-            ref_a = _angle_vector(ref_lm, triplet)
-            usr_a = _angle_vector(usr_lm, triplet)
-            sim = _cosine_similarity(ref_a, usr_a)
-            score = max(0, (sim + 1) / 2) * 100
-            joint_errors[triplet[1]].append(score)
+
+# Middle-joint name reported for each ANGLE_JOINTS column of the joint-score matrix
+_JOINT_NAMES = [triplet[1] for triplet in ANGLE_JOINTS]
+# Columns pooled per reported joint (the shoulders appear in two triplets each)
+_JOINT_COLUMNS: dict[str, list[int]] = {}
+for _col, _name in enumerate(_JOINT_NAMES):
+    _JOINT_COLUMNS.setdefault(_name, []).append(_col)
+
+
+def _worst_joints(joint_scores: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Column index and score of the lowest-scoring joint for every path pair."""
+    cols = np.argmin(joint_scores, axis=1)
+    return cols, joint_scores[np.arange(len(joint_scores)), cols]
+
+
+def _moment(pair: int, col: int, score: float, ref_idx, user_idx, ref_ts) -> dict:
+    ri = int(ref_idx[pair])
+    return {
+        # A pair where every joint scores 100 has no offending joint
+        'joint': _JOINT_NAMES[col] if score < 100.0 else None,
+        'score': round(float(score), 1),
+        'ref_frame': ri,
+        'user_frame': int(user_idx[pair]),
+        'timestamp': float(ref_ts[ri]),
+    }
+
+
+def _find_worst_moments(joint_scores, ref_idx, user_idx, ref_ts, n=5) -> list[dict]:
+    """Worst n moments globally (lowest single-joint score across all DTW pairs)."""
+    worst_cols, worst = _worst_joints(joint_scores)
+    candidates = np.arange(len(worst))
+    if len(worst) > n:
+        kth = worst[np.argpartition(worst, n - 1)[:n]].max()
+        # Scores are ranked after rounding to 0.1, so keep everything that may tie at the cut
+        candidates = np.flatnonzero(worst <= kth + 0.1)
+    moments = [_moment(i, worst_cols[i], worst[i], ref_idx, user_idx, ref_ts) for i in candidates]
+    # Sort by score ascending (stable, so ties stay in path order), pick worst n
+    return sorted(moments, key=lambda m: m['score'])[:n]
+
+
+def _find_extended_moments(joint_scores, ref_idx, user_idx, ref_ts, threshold=95.0) -> list[dict]:
+    """All moments whose worst joint scores below threshold, in path order."""
+    worst_cols, worst = _worst_joints(joint_scores)
+    return [
+        _moment(i, worst_cols[i], worst[i], ref_idx, user_idx, ref_ts)
+        for i in np.flatnonzero(worst < threshold)
+    ]
+
+
+def _find_problem_joints(joint_scores: np.ndarray, seg_ref_idx: np.ndarray) -> list[dict]:
+    """Identify joints with high deviation in a segment.
+
+    joint_scores holds the segment's rows of the joint-score matrix and
+    seg_ref_idx the reference frame of each of those rows.
+    """
+    joint_errors = {
+        joint: joint_scores[:, cols].ravel() for joint, cols in _JOINT_COLUMNS.items()
+    }
+
+    def _min_score(joint):
+        scores = joint_errors[joint]
+        min_idx = int(np.argmin(scores))
+        # Pooled joints interleave their triplets' scores pair by pair
+        ref_frame = int(seg_ref_idx[min_idx // len(_JOINT_COLUMNS[joint])])
+        return round(float(scores[min_idx]), 1), ref_frame
 
     # Find the N most offset joints (lowest average similarity)
-    joint_means = {joint: np.mean(scores) if scores else 100.0 for joint, scores in joint_errors.items()}
+    joint_means = {joint: np.mean(scores) for joint, scores in joint_errors.items()}
     sorted_joints = sorted(joint_means.items(), key=lambda x: x[1])
     # Output top 3 most offset joints
     result = []
     for joint, mean in sorted_joints[:3]:
-        scores = joint_errors[joint]
-        if scores:
-            min_score = min(scores)
-            min_idx = scores.index(min_score)
-            if min_idx < len(seg_pairs):
-                seg_pair = seg_pairs[min_idx]
-                ref_frame = seg_pair[1]
-            else:
-                ref_frame = None
-            result.append({
-                'joint': joint,
-                'mean': round(mean, 1),
-                'min_score': round(min_score, 1),
-                'ref_frame': ref_frame
-            })
+        min_score, ref_frame = _min_score(joint)
+        result.append({
+            'joint': joint,
+            'mean': round(float(mean), 1),
+            'min_score': min_score,
+            'ref_frame': ref_frame
+        })
     # Optionally, check for paired joints (e.g., both elbows, both knees)
     pairs = [("LEFT_ELBOW", "RIGHT_ELBOW"), ("LEFT_KNEE", "RIGHT_KNEE"), ("LEFT_WRIST", "RIGHT_WRIST")]
     for j1, j2 in pairs:
-        if j1 in joint_means and j2 in joint_means:
-            if joint_means[j1] < 80 and joint_means[j2] < 80:
-                result.append({
-                    'joint': f'{j1},{j2}',
-                    'mean': (round(joint_means[j1], 1), round(joint_means[j2], 1)),
-                    'min_score': (round(min(joint_errors[j1]), 1), round(min(joint_errors[j2]), 1)),
-                    'ref_frame': (seg_pairs[joint_errors[j1].index(min(joint_errors[j1]))][1], seg_pairs[joint_errors[j2].index(min(joint_errors[j2]))][1])
-                })
+        if joint_means[j1] < 80 and joint_means[j2] < 80:
+            (min1, frame1), (min2, frame2) = _min_score(j1), _min_score(j2)
+            result.append({
+                'joint': f'{j1},{j2}',
+                'mean': (round(float(joint_means[j1]), 1), round(float(joint_means[j2]), 1)),
+                'min_score': (min1, min2),
+                'ref_frame': (frame1, frame2)
+            })
     return result
@@ -0,0 +1,372 @@
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable
+
+from pose_cache import pose_cache
+from pose_extractor import (
+    extract_poses,
+    extract_pose_range,
+    merge_stats,
+    pose_cache_key,
+    probe_video,
+    resolve_sampling,
+    warm_up_landmarkers,
+)
+from pose_sequence import PoseSequence
+
+# MediaPipe inference holds the GIL for much of each frame, so extractions run
+# in separate processes. Defaults to one worker per CPU.
+EXTRACTION_WORKERS = int(os.environ.get("DANCE_EXTRACTION_WORKERS", "0")) or (os.cpu_count() or 1)
+
+# Videos at least two chunks long are split into time ranges extracted in
+# parallel (0 disables chunking). Each chunk starts decoding WARMUP_SECONDS
+# early so the landmarker's tracking has settled at the chunk boundary.
+CHUNK_SECONDS = float(os.environ.get("DANCE_CHUNK_SECONDS", "60"))
+WARMUP_SECONDS = 1.0
+
+# Running extractions are stopped through a flag array shared with the
+# workers, which check their submission's slot before every frame.
+# Submissions beyond this many at once can only be cancelled before they start.
+CANCEL_SLOTS = 256
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+# Workers report (token, part, kind, payload) on a queue handed to them at
+# startup, where kind is "progress" with (frames_done, frames_total) or
+# "poses" with a PoseSequence batch; a listener thread in this process passes
+# the reports to the callbacks registered under each submission's token
+_progress_queue = None
+_progress_callbacks: dict[str, Callable[[int, str, object], None]] = {}
+
+_cancel_flags = None
+_free_cancel_slots = list(range(CANCEL_SLOTS))
+_cancel_slots_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool, _progress_queue, _cancel_flags
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the API process runs threads and MediaPipe is not fork-safe.
+            # Every worker loads the model and warms a landmarker before its first task.
+            context = multiprocessing.get_context("spawn")
+            if _progress_queue is None:
+                _progress_queue = context.Queue()
+                _cancel_flags = context.RawArray("b", CANCEL_SLOTS)
+                threading.Thread(
+                    target=_dispatch_progress, args=(_progress_queue,), name="extraction-progress", daemon=True
+                ).start()
+            _pool = ProcessPoolExecutor(
+                max_workers=EXTRACTION_WORKERS,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(_progress_queue, _cancel_flags),
+            )
+        return _pool
+
+
+def _init_worker(progress_queue, cancel_flags) -> None:
+    global _progress_queue, _cancel_flags
+    _progress_queue = progress_queue
+    _cancel_flags = cancel_flags
+    warm_up_landmarkers()
+
+
+def _run_extraction(
+    token: str | None, part: int, cancel_slot: int | None, fn, *args, stream_poses: bool = False, **kwargs
+):
+    """Runs in a worker: fn with callbacks reporting progress (and poses) to the parent process
+    under `token`, if any, and stopping once the submission's cancel flag is set."""
+    def report(done: int, total: int) -> None:
+        _progress_queue.put((token, part, "progress", (done, total)))
+
+    def send_poses(poses: PoseSequence) -> None:
+        _progress_queue.put((token, part, "poses", poses))
+
+    if token is not None:
+        kwargs["progress"] = report
+        if stream_poses:
+            kwargs["on_poses"] = send_poses
+    if cancel_slot is not None:
+        kwargs["cancelled"] = lambda: bool(_cancel_flags[cancel_slot])
+    return fn(*args, **kwargs)
+
+
+def _dispatch_progress(progress_queue) -> None:
+    while True:
+        token, part, kind, payload = progress_queue.get()
+        callback = _progress_callbacks.get(token)
+        if callback is not None:
+            try:
+                callback(part, kind, payload)
+            except Exception:
+                pass  # A broken callback must not stop progress for other jobs
+
+
+def _register_progress(
+    progress: Callable[[int, int], None] | None,
+    total: int | None = None,
+    on_poses: Callable[[PoseSequence], None] | None = None,
+) -> str:
+    """Token under which workers' reports reach `progress(frames_done, frames_total)` and `on_poses`.
+
+    Reports of all parts (chunks) are summed, against `total` if given.
+    """
+    token = uuid.uuid4().hex
+    parts: dict[int, tuple[int, int]] = {}
+
+    def on_report(part: int, kind: str, payload) -> None:
+        if kind == "poses":
+            if on_poses is not None:
+                on_poses(payload)
+            return
+        parts[part] = payload
+        if progress is not None:
+            progress(sum(d for d, _ in parts.values()), total or sum(t for _, t in parts.values()))
+
+    _progress_callbacks[token] = on_report
+    return token
+
+
+def _unregister_progress_when_done(future: Future, token: str | None) -> None:
+    if token is not None:
+        future.add_done_callback(lambda _: _progress_callbacks.pop(token, None))
+
+
+def _claim_cancel_slot() -> int | None:
+    _get_pool()  # Creates the flag array
+    with _cancel_slots_lock:
+        return _free_cancel_slots.pop() if _free_cancel_slots else None
+
+
+def _stop_when_done(outer: Future, parts: list[Future], slot: int | None) -> None:
+    """Stop the worker `parts` of `outer` if it finishes (is cancelled or fails) before them.
+
+    Pending parts are cancelled; running ones see their cancel flag `slot`,
+    which is freed for reuse once every part is done.
+    """
+    lock = threading.Lock()
+    remaining = [len(parts)]
+
+    def on_part_done(_) -> None:
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] or slot is None:
+                return
+            _cancel_flags[slot] = 0
+        with _cancel_slots_lock:
+            _free_cancel_slots.append(slot)
+
+    def on_outer_done(_) -> None:
+        with lock:
+            if not remaining[0]:
+                return
+            if slot is not None:
+                _cancel_flags[slot] = 1
+        for part in parts:
+            part.cancel()
+
+    for part in parts:
+        part.add_done_callback(on_part_done)
+    outer.add_done_callback(on_outer_done)
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(fn, *args, **kwargs) -> Future:
+    pool = _get_pool()
+    try:
+        return pool.submit(fn, *args, **kwargs)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM); start a fresh pool for this and later jobs
+        _discard_pool(pool)
+        return _get_pool().submit(fn, *args, **kwargs)
+
+
+def submit_extraction(
+    video_path: str,
+    use_cache: bool = True,
+    chunk_seconds: float | None = None,
+    target_fps: float | None = None,
+    max_inference_size: int | None = None,
+    video_hash: str | None = None,
+    progress: Callable[[int, int], None] | None = None,
+    on_poses: Callable[[PoseSequence], None] | None = None,
+) -> Future:
+    """Run pose extraction for a video in the shared process pool.
+
+    The future resolves to (PoseSequence, fps, stats) as returned by extract_poses;
+    the pose arrays are pickled back to the caller as compact NumPy buffers.
+    Videos spanning at least two chunks of `chunk_seconds` (default
+    CHUNK_SECONDS) are split across workers and stitched back together.
+    `video_hash` is the video's SHA-256, if known, for the pose cache key.
+    `progress(frames_done, frames_total)` is called from a background thread
+    as the workers advance (not on cache hits). Cancelling the future stops
+    the extraction, also once it is running: workers check a shared cancel
+    flag before every frame.
+
+    `on_poses(poses)` receives batches of newly detected poses from the same
+    thread while the video is extracted. The batches are always the start
+    of the final sequence but may not be all of it: nothing is streamed on
+    cache hits, and of a chunked video only the first chunk, since later
+    chunks finish at about the same time. Consumers take the remaining
+    frames from the result.
+    """
+    sampling = resolve_sampling(target_fps, max_inference_size)
+    chunk_seconds = CHUNK_SECONDS if chunk_seconds is None else chunk_seconds
+    if chunk_seconds > 0:
+        try:
+            info = probe_video(video_path)
+        except ValueError:
+            info = None  # Let the worker report the error
+        if info and info["frame_count"] >= 2 * chunk_seconds * info["fps"]:
+            return _submit_chunked(
+                video_path, info, chunk_seconds, use_cache, sampling, video_hash, progress, on_poses
+            )
+    token = _register_progress(progress, on_poses=on_poses) if progress or on_poses else None
+    slot = _claim_cancel_slot()
+    worker_future = _submit(
+        _run_extraction, token, 0, slot, extract_poses, video_path,
+        stream_poses=on_poses is not None, use_cache=use_cache, video_hash=video_hash, **sampling
+    )
+    _unregister_progress_when_done(worker_future, token)
+
+    # Stays pending while the worker runs, so callers can cancel() it
+    future: Future = Future()
+
+    def on_worker_done(done: Future) -> None:
+        try:
+            if done.cancelled():
+                future.set_exception(RuntimeError("Extraction cancelled"))
+            elif done.exception() is not None:
+                future.set_exception(done.exception())
+            else:
+                future.set_result(done.result())
+        except InvalidStateError:
+            pass  # future was cancelled
+
+    _stop_when_done(future, [worker_future], slot)
+    worker_future.add_done_callback(on_worker_done)
+    return future
+
+
+def _submit_chunked(
+    video_path: str,
+    info: dict,
+    chunk_seconds: float,
+    use_cache: bool,
+    sampling: dict,
+    video_hash: str | None,
+    progress: Callable[[int, int], None] | None,
+    on_poses: Callable[[PoseSequence], None] | None = None,
+) -> Future:
+    """Extract consecutive time ranges in parallel and stitch them into one sequence."""
+    key = pose_cache_key(video_path, sampling, video_hash) if use_cache and pose_cache.enabled else None
+    if key is not None:
+        cached = pose_cache.get(key)
+        if cached is not None:
+            hit: Future = Future()
+            hit.set_result((*cached, {"cache_hit": True}))
+            return hit
+
+    # Left pending (not running) so callers can cancel() it, which cancels the chunks
+    combined = _ChunkedExtraction(key)
+
+    source_fps = info["fps"]
+    chunk_frames = max(1, int(round(chunk_seconds * source_fps)))
+    warmup_frames = int(round(WARMUP_SECONDS * source_fps))
+    starts = list(range(0, info["frame_count"], chunk_frames))
+    # The frame count is only an estimate, so the last chunk runs to the end
+    ends = [start + chunk_frames for start in starts[:-1]] + [None]
+    token = _register_progress(progress, info["frame_count"], on_poses) if progress or on_poses else None
+    # One cancel flag stops all chunks
+    slot = _claim_cancel_slot()
+    chunks = [
+        _submit(
+            _run_extraction, token, part, slot, extract_pose_range, video_path, start, end, warmup_frames,
+            stream_poses=part == 0 and on_poses is not None, **sampling
+        )
+        for part, (start, end) in enumerate(zip(starts, ends))
+    ]
+    _unregister_progress_when_done(combined, token)
+    # Failing combined cancels the chunks, which re-enters the callback
+    lock = threading.RLock()
+    remaining = [len(chunks)]
+
+    def on_chunk_done(future: Future) -> None:
+        with lock:
+            if combined.done():
+                return
+            if future.cancelled() or future.exception() is not None:
+                try:
+                    combined.set_exception(
+                        RuntimeError("Extraction cancelled") if future.cancelled() else future.exception()
+                    )
+                except InvalidStateError:
+                    pass  # combined was cancelled concurrently
+                return
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        # Only hand over the chunk results: this runs on the pool's result
+        # thread, which must not be held up by stitching or the cache write
+        try:
+            combined.set_result([chunk.result() for chunk in chunks])
+        except InvalidStateError:
+            pass
+
+    _stop_when_done(combined, chunks, slot)
+    for chunk in chunks:
+        chunk.add_done_callback(on_chunk_done)
+    return combined
+
+
+class _ChunkedExtraction(Future):
+    """Future of a chunked extraction that resolves to the chunks' results.
+
+    result() stitches them into (PoseSequence, fps, stats) and writes the
+    pose cache in the thread that asks for it (the job's), once.
+    """
+
+    def __init__(self, cache_key: str | None):
+        super().__init__()
+        self._cache_key = cache_key
+        self._stitch_lock = threading.Lock()
+        self._stitched = None
+
+    def result(self, timeout=None):
+        results = super().result(timeout)
+        with self._stitch_lock:
+            if self._stitched is None:
+                poses = PoseSequence.concatenate([r[0] for r in results])
+                fps = results[0][1]  # Effective analysis rate
+                if self._cache_key is not None:
+                    pose_cache.put(self._cache_key, poses, fps)
+                self._stitched = (poses, fps, merge_stats([r[2] for r in results]))
+            return self._stitched
+
+
+def start_extraction_pool() -> None:
+    """Start all workers now so model loading happens before the first request."""
+    # Workers are spawned on demand, one per submission that finds none idle
+    for _ in range(EXTRACTION_WORKERS):
+        _submit(warm_up_landmarkers)
+
+
+def shutdown_extraction_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
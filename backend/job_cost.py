@@ -0,0 +1,100 @@
+import math
+import os
+
+from alignment import AUTO_FULL_MAX_CELLS, DEFAULT_MULTISCALE_RADIUS, DEFAULT_SAKOE_CHIBA_WINDOW
+from extraction_pool import CHUNK_SECONDS, EXTRACTION_WORKERS
+from pose_extractor import sampling_step
+
+# Jobs estimated to take longer than this many seconds are rejected up front (0 = no limit)
+MAX_JOB_SECONDS = float(os.environ.get("DANCE_MAX_JOB_SECONDS", "1800"))
+
+# Rough single-core figures for the lite model; only the relative size of
+# jobs matters for scheduling, the absolute values only for ETAs and budgets
+DECODE_SECONDS_PER_MEGAPIXEL = 0.002   # every source frame is decoded, sampled or not
+CONVERT_SECONDS_PER_MEGAPIXEL = 0.001  # resize + BGR->RGB of analysed frames
+INFER_SECONDS = 0.012                  # landmarker input is resized internally, so ~constant
+# DTW figures fitted to the alignment stage of `python benchmark.py --methods
+# full,sakoe_chiba,itakura,multiscale,online --sizes 2000,5000,10000,20000`
+# (each engine within about 25% from 2k to 20k frames)
+FULL_DTW_SECONDS_PER_CELL = 5e-8
+BANDED_DTW_SECONDS_PER_ROW = 3e-5
+BANDED_DTW_SECONDS_PER_CELL = 4e-8
+
+
+def analysed_frames(info: dict, sampling: dict) -> int:
+    """Frames the landmarker will run on for a probed video."""
+    return math.ceil(info["frame_count"] / sampling_step(info["fps"], sampling["target_fps"]))
+
+
+def extraction_seconds(info: dict, sampling: dict) -> float:
+    """Estimated wall time to extract poses from a probed video (see probe_video)."""
+    frames = info["frame_count"]
+    longest = max(info["width"], info["height"], 1)
+    megapixels = info["width"] * info["height"] / 1e6
+    inference_megapixels = megapixels
+    if 0 < sampling["max_inference_size"] < longest:
+        inference_megapixels *= (sampling["max_inference_size"] / longest) ** 2
+    seconds = frames * megapixels * DECODE_SECONDS_PER_MEGAPIXEL + analysed_frames(info, sampling) * (
+        inference_megapixels * CONVERT_SECONDS_PER_MEGAPIXEL + INFER_SECONDS
+    )
+    # Long videos are split into chunks extracted in parallel
+    chunk_frames = CHUNK_SECONDS * info["fps"]
+    if CHUNK_SECONDS > 0 and frames >= 2 * chunk_frames:
+        seconds /= min(math.ceil(frames / chunk_frames), EXTRACTION_WORKERS)
+    return seconds
+
+
+def alignment_seconds(n: int, m: int, method: str = "auto", window: float | None = None) -> float:
+    """Estimated DTW time for sequences of n and m frames (mirrors align_sequences' method choice)."""
+    if method == "auto":
+        method = "full" if n * m <= AUTO_FULL_MAX_CELLS else "multiscale"
+    if method == "full":
+        return n * m * FULL_DTW_SECONDS_PER_CELL
+    if method == "multiscale":
+        radius = int(window or DEFAULT_MULTISCALE_RADIUS)
+        rows = 2 * n  # all resolution levels together
+        cells = rows * (4 * radius + 4)
+    elif method == "online":
+        # One column of reference rows (within the search radius) per user frame
+        window = DEFAULT_SAKOE_CHIBA_WINDOW if window is None else window
+        rows = m
+        cells = m * min(2 * (window * n if window < 1 else window) + 1, n)
+    elif method == "itakura":
+        # The slope 1/2..2 parallelogram covers about a third of the matrix
+        rows = n
+        cells = n * m / 3
+        if window is not None:
+            cells = min(cells, n * min(2 * (window * max(n, m) if window < 1 else window) + 1, m))
+    else:
+        window = DEFAULT_SAKOE_CHIBA_WINDOW if window is None else window
+        width = 2 * (window * max(n, m) if window < 1 else window) + 1
+        rows = n
+        cells = n * min(width, m)
+    return rows * BANDED_DTW_SECONDS_PER_ROW + cells * BANDED_DTW_SECONDS_PER_CELL
+
+
+def estimate_job_seconds(
+    attempt: dict,
+    sampling: dict,
+    reference: dict | None = None,
+    reference_frames: int | None = None,
+    alignment_method: str = "auto",
+    alignment_window: float | None = None,
+) -> float:
+    """Estimated processing time of a comparison.
+
+    `attempt` and `reference` are probe_video() results; a library reference
+    is passed as `reference_frames` instead since its poses already exist.
+    Both videos are extracted concurrently, so the slower one counts.
+    Online alignment runs while the attempt is extracted.
+    """
+    extract = extraction_seconds(attempt, sampling)
+    if reference is not None:
+        extract = max(extract, extraction_seconds(reference, sampling))
+        reference_frames = analysed_frames(reference, sampling)
+    n = max(reference_frames or 0, 1)
+    m = max(analysed_frames(attempt, sampling), 1)
+    align = alignment_seconds(n, m, alignment_method, alignment_window)
+    if alignment_method == "online":
+        return max(extract, align)
+    return extract + align
@@ -0,0 +1,293 @@
+import importlib
+import json
+import os
+import signal
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from job_scheduler import (
+    JOB_QUEUE,
+    JOB_TIMEOUT,
+    JOB_WORKERS,
+    MAX_QUEUED_JOBS,
+    JobContext,
+    QueueFull,
+    queue_finish_times,
+    run_job,
+    scheduler as local_scheduler,
+)
+from job_store import JOB_DB_PATH
+
+# Workers refresh their heartbeat this often; jobs of a worker silent for
+# WORKER_EXPIRY_SECONDS are given up
+WORKER_HEARTBEAT_SECONDS = 2.0
+WORKER_EXPIRY_SECONDS = 30.0
+_IDLE_POLL_SECONDS = 0.5
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS job_queue (
+        job_id TEXT PRIMARY KEY,
+        target TEXT NOT NULL,
+        args TEXT NOT NULL,
+        kwargs TEXT NOT NULL,
+        cost REAL NOT NULL,
+        priority REAL NOT NULL,
+        worker_id TEXT,
+        started_at REAL,
+        cancel_requested INTEGER NOT NULL DEFAULT 0
+    )""",
+    "CREATE INDEX IF NOT EXISTS job_queue_order ON job_queue (worker_id, priority)",
+    """CREATE TABLE IF NOT EXISTS job_workers (
+        worker_id TEXT PRIMARY KEY,
+        threads INTEGER NOT NULL,
+        heartbeat REAL NOT NULL
+    )""",
+)
+
+
+def _resolve(target: str):
+    module, name = target.split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+class SqliteJobQueue:
+    """Job queue shared by API processes and worker processes through SQLite.
+
+    Same interface and ordering as JobScheduler, but jobs are only queued
+    here; `python worker.py` processes claim and run them. Job functions are
+    stored by import path and their arguments as JSON.
+    """
+
+    def __init__(self, path: str = JOB_DB_PATH, max_queued: int = MAX_QUEUED_JOBS):
+        self.path = path
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+
+    def start(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        pass
+
+    def _transaction(self, fn):
+        """Run fn(conn) inside an immediate (write-locked) transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def submit(self, job_id: str, fn, *args, cost: float = 0.0, **kwargs) -> None:
+        target = f"{fn.__module__}:{fn.__name__}"
+        payload = (job_id, target, json.dumps(args), json.dumps(kwargs), cost, time.time() + cost)
+
+        def insert(conn):
+            (queued,) = conn.execute("SELECT COUNT(*) FROM job_queue WHERE worker_id IS NULL").fetchone()
+            if queued >= self.max_queued:
+                raise QueueFull(f"Too many queued jobs ({self.max_queued})")
+            conn.execute(
+                "INSERT INTO job_queue (job_id, target, args, kwargs, cost, priority) VALUES (?, ?, ?, ?, ?, ?)",
+                payload,
+            )
+
+        self._transaction(insert)
+
+    def _queued(self) -> list[tuple[str, float]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT job_id, cost FROM job_queue WHERE worker_id IS NULL ORDER BY priority, rowid"
+            ).fetchall()
+
+    def queue_position(self, job_id: str) -> int | None:
+        for position, (queued_id, _) in enumerate(self._queued(), start=1):
+            if queued_id == job_id:
+                return position
+        return None
+
+    def eta(self, job_id: str) -> float | None:
+        now = time.time()
+        with self._lock:
+            running = self._conn.execute(
+                "SELECT job_id, cost, started_at FROM job_queue WHERE worker_id IS NOT NULL"
+            ).fetchall()
+            (capacity,) = self._conn.execute(
+                "SELECT COALESCE(SUM(threads), 0) FROM job_workers WHERE heartbeat > ?",
+                (now - WORKER_EXPIRY_SECONDS,),
+            ).fetchone()
+        remaining = {running_id: max(cost - (now - started), 0.0) for running_id, cost, started in running}
+        if job_id in remaining:
+            return remaining[job_id]
+        queued = self._queued()
+        ids = [queued_id for queued_id, _ in queued]
+        if job_id not in ids:
+            return None
+        finish = queue_finish_times(list(remaining.values()), [cost for _, cost in queued], max(capacity, 1))
+        return finish[ids.index(job_id)]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; see JobScheduler.cancel."""
+
+        def take(conn):
+            row = conn.execute(
+                "SELECT worker_id, target, args, kwargs FROM job_queue WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] is None:
+                conn.execute("DELETE FROM job_queue WHERE job_id = ?", (job_id,))
+            else:
+                conn.execute("UPDATE job_queue SET cancel_requested = 1 WHERE job_id = ?", (job_id,))
+            return row
+
+        row = self._transaction(take)
+        if row is None:
+            return False
+        worker_id, target, args, kwargs = row
+        if worker_id is None:
+            # Run it here with its context already cancelled, for its cleanup
+            _run_cancelled(target, args, kwargs, job_id, "Cancelled")
+        return True
+
+    def counts(self) -> dict:
+        with self._lock:
+            queued, running = self._conn.execute(
+                "SELECT COALESCE(SUM(worker_id IS NULL), 0), COALESCE(SUM(worker_id IS NOT NULL), 0) FROM job_queue"
+            ).fetchone()
+        return {"queued": queued, "running": running}
+
+
+def _run_cancelled(target: str, args: str, kwargs: str, job_id: str, reason: str) -> None:
+    ctx = JobContext(job_id, 0)
+    ctx.cancel(reason)
+    run_job(_resolve(target), json.loads(args), json.loads(kwargs), ctx)
+
+
+class QueueWorker:
+    """Process that claims jobs from a SqliteJobQueue and runs them on `threads` threads.
+
+    The main thread keeps the worker's heartbeat fresh, forwards cancel
+    requests to running jobs and gives up the jobs of workers that stopped
+    heartbeating (they are run once with a cancelled context for cleanup).
+    """
+
+    def __init__(self, queue: SqliteJobQueue, threads: int = JOB_WORKERS, timeout: float = JOB_TIMEOUT):
+        self.queue = queue
+        self.threads = max(1, threads)
+        self.timeout = timeout
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._running: dict[str, JobContext] = {}
+        self._running_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, lambda *_: self._stop.set())
+        self._heartbeat()
+        threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True) for i in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while not self._stop.wait(WORKER_HEARTBEAT_SECONDS):
+                self._heartbeat()
+                self._forward_cancellations()
+                self._reap_dead_workers()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stop.set()
+            with self._running_lock:
+                for ctx in self._running.values():
+                    ctx.cancel("Worker shutting down")
+            for thread in threads:
+                thread.join(timeout=10)
+            self.queue._transaction(
+                lambda conn: conn.execute("DELETE FROM job_workers WHERE worker_id = ?", (self.worker_id,))
+            )
+
+    def _heartbeat(self) -> None:
+        self.queue._transaction(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO job_workers (worker_id, threads, heartbeat) VALUES (?, ?, ?)",
+            (self.worker_id, self.threads, time.time()),
+        ))
+
+    def _claim(self):
+        def claim(conn):
+            row = conn.execute(
+                "SELECT job_id, target, args, kwargs FROM job_queue WHERE worker_id IS NULL "
+                "ORDER BY priority, rowid LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE job_queue SET worker_id = ?, started_at = ? WHERE job_id = ?",
+                    (self.worker_id, time.time(), row[0]),
+                )
+            return row
+
+        return self.queue._transaction(claim)
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            row = self._claim()
+            if row is None:
+                self._stop.wait(_IDLE_POLL_SECONDS)
+                continue
+            job_id, target, args, kwargs = row
+            ctx = JobContext(job_id, self.timeout)
+            with self._running_lock:
+                self._running[job_id] = ctx
+            ctx.start()
+            try:
+                run_job(_resolve(target), json.loads(args), json.loads(kwargs), ctx)
+            finally:
+                with self._running_lock:
+                    del self._running[job_id]
+                self.queue._transaction(
+                    lambda conn: conn.execute("DELETE FROM job_queue WHERE job_id = ?", (job_id,))
+                )
+
+    def _forward_cancellations(self) -> None:
+        with self.queue._lock:
+            rows = self.queue._conn.execute(
+                "SELECT job_id FROM job_queue WHERE worker_id = ? AND cancel_requested = 1", (self.worker_id,)
+            ).fetchall()
+        with self._running_lock:
+            for (job_id,) in rows:
+                if job_id in self._running:
+                    self._running[job_id].cancel()
+
+    def _reap_dead_workers(self) -> None:
+        cutoff = time.time() - WORKER_EXPIRY_SECONDS
+
+        def take(conn):
+            rows = conn.execute(
+                "SELECT job_id, target, args, kwargs FROM job_queue WHERE worker_id IS NOT NULL "
+                "AND worker_id NOT IN (SELECT worker_id FROM job_workers WHERE heartbeat > ?)",
+                (cutoff,),
+            ).fetchall()
+            conn.executemany("DELETE FROM job_queue WHERE job_id = ?", [(row[0],) for row in rows])
+            conn.execute("DELETE FROM job_workers WHERE heartbeat <= ?", (cutoff,))
+            return rows
+
+        for job_id, target, args, kwargs in self.queue._transaction(take):
+            _run_cancelled(target, args, kwargs, job_id, "Worker stopped responding")
+
+
+def create_scheduler(kind: str = JOB_QUEUE):
+    """The in-process JobScheduler ("local") or the shared SqliteJobQueue ("sqlite")."""
+    if kind == "local":
+        return local_scheduler
+    if kind == "sqlite":
+        return SqliteJobQueue()
+    raise ValueError(f"Unknown job queue {kind!r}; expected 'local' or 'sqlite'")
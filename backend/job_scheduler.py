@@ -0,0 +1,222 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, wait
+
+# Jobs processed at once; extraction inside them is further bounded by the
+# extraction process pool
+JOB_WORKERS = int(os.environ.get("DANCE_JOB_WORKERS", "2"))
+MAX_QUEUED_JOBS = int(os.environ.get("DANCE_MAX_QUEUED_JOBS", "16"))
+JOB_TIMEOUT = float(os.environ.get("DANCE_JOB_TIMEOUT", "900"))  # seconds of processing, 0 = none
+# "local" runs jobs on this process's scheduler; "sqlite" queues them in the
+# shared database for `python worker.py` processes (see job_queue)
+JOB_QUEUE = os.environ.get("DANCE_JOB_QUEUE", "local")
+
+# How often a job blocked on a future checks for cancellation / its deadline
+_POLL_SECONDS = 0.5
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    """Raised inside a job that was cancelled."""
+
+
+class JobContext:
+    """Handed to every job: cancellation flag and deadline, checked by the job between steps.
+
+    check() raises JobCancelled once the job is cancelled and TimeoutError
+    once it has been processing for longer than `timeout` seconds.
+    """
+
+    def __init__(self, job_id: str, timeout: float):
+        self.job_id = job_id
+        self.timeout = timeout
+        self.deadline: float | None = None
+        self.reason = ""
+        self._cancelled = threading.Event()
+
+    def start(self) -> None:
+        if self.timeout > 0:
+            self.deadline = time.monotonic() + self.timeout
+
+    def cancel(self, reason: str = "Cancelled") -> None:
+        self.reason = reason
+        self._cancelled.set()
+
+    def check(self) -> None:
+        if self._cancelled.is_set():
+            raise JobCancelled(self.reason)
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise TimeoutError(f"Timed out after {self.timeout:g}s")
+
+    def wait(self, future: Future):
+        """Result of `future`; cancels it if the job is cancelled or times out first."""
+        while not future.done():
+            try:
+                self.check()
+            except (JobCancelled, TimeoutError):
+                future.cancel()
+                raise
+            wait([future], timeout=_POLL_SECONDS)
+        return future.result()
+
+
+def run_job(fn, args, kwargs, ctx: JobContext) -> None:
+    try:
+        fn(ctx, *args, **kwargs)
+    except Exception:
+        pass  # Jobs record their own errors
+
+
+def queue_finish_times(running_remaining: list[float], queued_costs: list[float], workers: int) -> list[float]:
+    """Seconds from now until each queued job (in queue order) finishes.
+
+    Each worker becomes free once its running job's remaining estimated
+    cost has elapsed, then takes the next queued job.
+    """
+    free_at = sorted(running_remaining)[:workers]
+    free_at += [0.0] * (workers - len(free_at))
+    heapq.heapify(free_at)
+    finish = []
+    for cost in queued_costs:
+        finish.append(heapq.heappop(free_at) + cost)
+        heapq.heappush(free_at, finish[-1])
+    return finish
+
+
+class JobScheduler:
+    """Fixed pool of worker threads running jobs from a bounded queue.
+
+    Jobs are callables invoked as fn(ctx, *args, **kwargs) and report their
+    own status; the scheduler only orders, runs, cancels and times them out.
+
+    Each job carries an estimated cost in seconds. The queue is ordered by
+    submission time plus cost: shortest job first, but a long job's
+    waiting time counts in its favour, so it can't be starved.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = MAX_QUEUED_JOBS, timeout: float = JOB_TIMEOUT):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self._queue: list[tuple[float, int, str]] = []  # heap of (submitted + cost, seq, job_id)
+        self._jobs: dict[str, tuple] = {}  # queued and running: job_id -> (fn, args, kwargs, ctx)
+        self._costs: dict[str, float] = {}
+        self._started: dict[str, float] = {}  # running job_id -> monotonic start time
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._stopping = False
+
+    def start(self) -> None:
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, job_id: str, fn, *args, cost: float = 0.0, **kwargs) -> None:
+        """Queue a job with an estimated `cost` in seconds; raises QueueFull if max_queued jobs are waiting."""
+        self.start()
+        with self._cond:
+            if len(self._queue) >= self.max_queued:
+                raise QueueFull(f"Too many queued jobs ({self.max_queued})")
+            self._jobs[job_id] = (fn, args, kwargs, JobContext(job_id, self.timeout))
+            self._costs[job_id] = cost
+            heapq.heappush(self._queue, (time.monotonic() + cost, next(self._seq), job_id))
+            self._cond.notify()
+
+    def queue_position(self, job_id: str) -> int | None:
+        """1-based position among queued jobs, or None if the job is not waiting."""
+        with self._cond:
+            for position, (_, _, queued_id) in enumerate(sorted(self._queue), start=1):
+                if queued_id == job_id:
+                    return position
+        return None
+
+    def eta(self, job_id: str) -> float | None:
+        """Estimated seconds until a queued or running job finishes."""
+        with self._cond:
+            if job_id not in self._jobs:
+                return None
+            now = time.monotonic()
+            if job_id in self._started:
+                return max(self._costs[job_id] - (now - self._started[job_id]), 0.0)
+            remaining = [max(self._costs[i] - (now - started), 0.0) for i, started in self._started.items()]
+            queued = [queued_id for _, _, queued_id in sorted(self._queue)]
+            finish = queue_finish_times(remaining, [self._costs[i] for i in queued], self.workers)
+            return finish[queued.index(job_id)]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if the scheduler doesn't know it.
+
+        A running job stops at its next check(). A queued job is taken off
+        the queue and invoked right away with its context already cancelled,
+        so it goes through the same cancellation and cleanup path.
+        """
+        with self._cond:
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                return False
+            fn, args, kwargs, ctx = entry
+            ctx.cancel()
+            if job_id in self._started:
+                return True
+            self._queue = [item for item in self._queue if item[2] != job_id]
+            heapq.heapify(self._queue)
+            del self._jobs[job_id]
+            del self._costs[job_id]
+        run_job(fn, args, kwargs, ctx)
+        return True
+
+    def counts(self) -> dict:
+        with self._cond:
+            return {"queued": len(self._queue), "running": len(self._started)}
+
+    def shutdown(self) -> None:
+        """Stop the workers and cancel running jobs; queued jobs are run cancelled, like cancel()."""
+        with self._cond:
+            self._stopping = True
+            for job_id in self._jobs:
+                self._jobs[job_id][3].cancel("Server shutting down")
+            queued = []
+            for _, _, job_id in self._queue:
+                queued.append(self._jobs.pop(job_id))
+                del self._costs[job_id]
+            self._queue = []
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for fn, args, kwargs, ctx in queued:
+            run_job(fn, args, kwargs, ctx)
+        for thread in threads:
+            thread.join(timeout=5)
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                _, _, job_id = heapq.heappop(self._queue)
+                fn, args, kwargs, ctx = self._jobs[job_id]
+                self._started[job_id] = time.monotonic()
+            ctx.start()
+            try:
+                run_job(fn, args, kwargs, ctx)
+            finally:
+                with self._cond:
+                    del self._started[job_id]
+                    del self._jobs[job_id]
+                    del self._costs[job_id]
+
+
+scheduler = JobScheduler()
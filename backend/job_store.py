@@ -0,0 +1,308 @@
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from job_scheduler import JOB_QUEUE
+from models import ComparisonResult, ResultSummary
+
+# "memory" (per process, lost on restart) or "sqlite" (durable, DANCE_JOB_DB);
+# the shared job queue needs the sqlite store
+JOB_STORE = os.environ.get("DANCE_JOB_STORE", "sqlite" if JOB_QUEUE == "sqlite" else "memory")
+JOB_DB_PATH = os.environ.get("DANCE_JOB_DB", os.path.join(os.path.dirname(__file__), "jobs.sqlite3"))
+# Finished jobs (and their results) are dropped this many seconds after they finish
+JOB_TTL_SECONDS = float(os.environ.get("DANCE_JOB_TTL", "3600"))
+# The in-memory store also keeps at most this many finished jobs
+MAX_STORED_JOBS = int(os.environ.get("DANCE_MAX_STORED_JOBS", "100"))
+
+FINISHED_STATUSES = ("complete", "error", "cancelled")
+
+# Large result fields stored as typed arrays rather than JSON
+RESULT_ARRAYS = {"ref_keypoints": np.float32, "user_keypoints": np.float32, "dtw_path": np.int32}
+
+
+def split_result(summary: ResultSummary, arrays: dict[str, np.ndarray]) -> tuple[dict, dict[str, np.ndarray]]:
+    """A comparison's summary as JSON-ready fields and its large fields as RESULT_ARRAYS-typed arrays."""
+    return summary.model_dump(mode="json"), {
+        name: np.asarray(arrays[name], dtype=dtype) for name, dtype in RESULT_ARRAYS.items()
+    }
+
+
+def join_result(summary: dict, arrays: dict[str, np.ndarray]) -> ComparisonResult:
+    data = {name: value for name, value in summary.items() if name not in ("ref_frames", "user_frames", "path_length")}
+    data.update({name: values.tolist() for name, values in arrays.items()})
+    return ComparisonResult.model_validate(data)
+
+
+def encode_result(summary: ResultSummary, arrays: dict[str, np.ndarray]) -> bytes:
+    """Compact serialization: keypoints and DTW path as compressed arrays, the rest as JSON."""
+    fields, arrays = split_result(summary, arrays)
+    buf = io.BytesIO()
+    np.savez_compressed(buf, meta=np.frombuffer(json.dumps(fields).encode(), dtype=np.uint8), **arrays)
+    return buf.getvalue()
+
+
+def decode_result(blob: bytes, names=None) -> tuple[dict, dict[str, np.ndarray]]:
+    """Summary and the arrays in `names` (default all) of an encoded result; other arrays aren't decompressed."""
+    with np.load(io.BytesIO(blob), allow_pickle=False) as npz:
+        summary = json.loads(npz["meta"].tobytes())
+        arrays = {name: npz[name] for name in (RESULT_ARRAYS if names is None else names)}
+    return summary, arrays
+
+
+class MemoryJobStore:
+    """Jobs in a dict, with finished jobs evicted after `ttl` seconds or beyond `max_finished`.
+
+    Job records are dicts with job_id, status, message, created_at and
+    updated_at, plus finished_at once the job first reaches a finished
+    status (later updates, such as its timings, don't move it), progress
+    (a dict) once the job reports it and timings (a dict) once it has
+    finished. The TTL counts from finished_at. Results are kept alongside, split into a
+    summary and typed arrays (see split_result).
+    """
+
+    def __init__(self, ttl: float = JOB_TTL_SECONDS, max_finished: int = MAX_STORED_JOBS):
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self._jobs: dict[str, dict] = {}
+        self._results: dict[str, tuple[dict, dict[str, np.ndarray]]] = {}
+        self._finished: OrderedDict[str, float] = OrderedDict()  # job_id -> finish time, oldest first
+        self._metrics: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id: str, message: str = "Queued") -> None:
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            self._jobs[job_id] = {
+                "job_id": job_id, "status": "pending", "message": message, "created_at": now, "updated_at": now,
+            }
+
+    def update(self, job_id: str, **fields) -> None:
+        now = time.time()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields, updated_at=now)
+            if job["status"] in FINISHED_STATUSES and "finished_at" not in job:
+                job["finished_at"] = now
+                self._finished[job_id] = now
+
+    def complete(self, job_id: str, summary: ResultSummary, arrays: dict[str, np.ndarray]) -> None:
+        """Store a comparison's summary and arrays (see comparator.compare_dances) and mark the job complete."""
+        split = split_result(summary, arrays)
+        with self._lock:
+            if job_id in self._jobs:
+                self._results[job_id] = split
+        self.update(job_id, status="complete", message="Done")
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            self._evict(time.time())
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def result(self, job_id: str) -> ComparisonResult | None:
+        with self._lock:
+            split = self._results.get(job_id)
+        return join_result(*split) if split is not None else None
+
+    def result_summary(self, job_id: str) -> dict | None:
+        """Result fields except the large arrays, plus ref_frames, user_frames and path_length."""
+        with self._lock:
+            split = self._results.get(job_id)
+        return dict(split[0]) if split is not None else None
+
+    def result_arrays(self, job_id: str, names) -> dict[str, np.ndarray] | None:
+        """Some of ref_keypoints, user_keypoints and dtw_path as NumPy arrays."""
+        with self._lock:
+            split = self._results.get(job_id)
+        return {name: split[1][name] for name in names} if split is not None else None
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._drop(job_id)
+
+    def add_metrics(self, counters: dict[str, float]) -> None:
+        """Add to the named counters (see metrics.job_counters); they outlive the jobs."""
+        with self._lock:
+            for name, value in counters.items():
+                self._metrics[name] = self._metrics.get(name, 0.0) + value
+
+    def metrics(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._metrics)
+
+    def _drop(self, job_id: str) -> None:
+        self._jobs.pop(job_id, None)
+        self._results.pop(job_id, None)
+        self._finished.pop(job_id, None)
+
+    def _evict(self, now: float) -> None:
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if len(self._finished) <= self.max_finished and now - finished_at <= self.ttl:
+                break
+            self._drop(job_id)
+
+
+class SqliteJobStore:
+    """Jobs and encoded results in a SQLite database, so they survive restarts.
+
+    Finished jobs are deleted `ttl` seconds after they finish (finished_at,
+    set once when the job first reaches a finished status). With the
+    in-process scheduler, jobs still pending or processing when the store is
+    opened were lost in a restart and are marked as errors (the shared
+    queue's workers clean up after each other instead).
+    """
+
+    def __init__(self, path: str = JOB_DB_PATH, ttl: float = JOB_TTL_SECONDS, mark_interrupted: bool = True):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                message TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                result BLOB
+            )"""
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("progress", "TEXT"), ("timings", "TEXT"), ("finished_at", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS metrics (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+        if mark_interrupted:
+            now = time.time()
+            self._conn.execute(
+                "UPDATE jobs SET status = 'error', message = 'Interrupted by server restart', updated_at = ?, "
+                "finished_at = ? WHERE status IN ('pending', 'processing')",
+                (now, now),
+            )
+
+    def create(self, job_id: str, message: str = "Queued") -> None:
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, status, message, created_at, updated_at) VALUES (?, 'pending', ?, ?, ?)",
+                (job_id, message, now, now),
+            )
+
+    def update(self, job_id: str, **fields) -> None:
+        fields = {name: fields[name] for name in ("status", "message", "progress", "timings") if name in fields}
+        for name in ("progress", "timings"):
+            if name in fields:
+                fields[name] = json.dumps(fields[name])
+        if not fields:
+            return
+        now = time.time()
+        assignments = [f"{name} = ?" for name in fields]
+        values = list(fields.values())
+        if fields.get("status") in FINISHED_STATUSES:
+            assignments.append("finished_at = COALESCE(finished_at, ?)")
+            values.append(now)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {', '.join(assignments)}, updated_at = ? WHERE job_id = ?",
+                (*values, now, job_id),
+            )
+
+    def complete(self, job_id: str, summary: ResultSummary, arrays: dict[str, np.ndarray]) -> None:
+        blob = encode_result(summary, arrays)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'complete', message = 'Done', result = ?, updated_at = ?, "
+                "finished_at = COALESCE(finished_at, ?) WHERE job_id = ?",
+                (blob, now, now, job_id),
+            )
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, message, created_at, updated_at, finished_at, progress, timings FROM jobs "
+                "WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None or self._expired(row[0], row[4] if row[4] is not None else row[3], time.time()):
+            return None
+        status, message, created_at, updated_at, finished_at, progress, timings = row
+        job = {
+            "job_id": job_id, "status": status, "message": message, "created_at": created_at, "updated_at": updated_at,
+        }
+        if finished_at is not None:
+            job["finished_at"] = finished_at
+        if progress is not None:
+            job["progress"] = json.loads(progress)
+        if timings is not None:
+            job["timings"] = json.loads(timings)
+        return job
+
+    def _result_blob(self, job_id: str) -> bytes | None:
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def result(self, job_id: str) -> ComparisonResult | None:
+        blob = self._result_blob(job_id)
+        return join_result(*decode_result(blob)) if blob is not None else None
+
+    def result_summary(self, job_id: str) -> dict | None:
+        blob = self._result_blob(job_id)
+        return decode_result(blob, names=())[0] if blob is not None else None
+
+    def result_arrays(self, job_id: str, names) -> dict[str, np.ndarray] | None:
+        blob = self._result_blob(job_id)
+        return decode_result(blob, names=names)[1] if blob is not None else None
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def add_metrics(self, counters: dict[str, float]) -> None:
+        """Add to the named counters (see metrics.job_counters), shared by every process on the database."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO metrics (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                list(counters.items()),
+            )
+
+    def metrics(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT name, value FROM metrics").fetchall())
+
+    def _expired(self, status: str, finished_at: float, now: float) -> bool:
+        return status in FINISHED_STATUSES and now - finished_at > self.ttl
+
+    def _evict(self, now: float) -> None:
+        # Rows finished before finished_at existed fall back to updated_at
+        self._conn.execute(
+            f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED_STATUSES))}) "
+            "AND COALESCE(finished_at, updated_at) < ?",
+            (*FINISHED_STATUSES, now - self.ttl),
+        )
+
+
+def create_job_store(kind: str = JOB_STORE):
+    if kind == "memory":
+        if JOB_QUEUE == "sqlite":
+            raise ValueError("DANCE_JOB_QUEUE=sqlite requires DANCE_JOB_STORE=sqlite")
+        return MemoryJobStore()
+    if kind == "sqlite":
+        return SqliteJobStore(mark_interrupted=JOB_QUEUE == "local")
+    raise ValueError(f"Unknown job store {kind!r}; expected 'memory' or 'sqlite'")
+
+
+job_store = create_job_store()
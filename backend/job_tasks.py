@@ -0,0 +1,264 @@
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import Future
+
+from comparator import IncrementalComparison, compare_dances
+from extraction_pool import submit_extraction
+from job_scheduler import JobCancelled, JobContext
+from job_store import job_store
+from metrics import StageTimer, job_counters
+from reference_library import reference_library
+
+# Jobs run by the scheduler (or a queue worker process) as fn(ctx, **kwargs).
+# Arguments must be JSON-serializable so they can go through the shared queue.
+
+# Frame progress is written to the job store at most this often
+PROGRESS_STORE_INTERVAL = 0.5
+
+
+class _ProgressReporter:
+    """Keeps a comparison's progress on its job record: stage, frames and an extraction ETA.
+
+    Both videos' extraction progress is summed; the ETA extrapolates the
+    frame rate so far. Frame updates are throttled, stage changes not.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._stage = "extracting"
+        self._frames: dict[str, tuple[int, int]] = {}
+        self._running: dict = {}
+        self._started = time.monotonic()
+        self._stored = 0.0
+        self._lock = threading.Lock()
+
+    def frames(self, video: str):
+        """Progress callback for one video's extraction."""
+        def report(done: int, total: int) -> None:
+            with self._lock:
+                self._frames[video] = (done, total)
+                now = time.monotonic()
+                if now - self._stored < PROGRESS_STORE_INTERVAL:
+                    return
+                self._stored = now
+                progress = self._snapshot(now)
+            job_store.update(self.job_id, progress=progress)
+
+        return report
+
+    def running(self, scores: dict) -> None:
+        """Running scores of an incremental comparison (see IncrementalComparison.running_scores)."""
+        with self._lock:
+            self._running = scores
+            progress = self._snapshot(time.monotonic())
+        job_store.update(self.job_id, progress=progress)
+
+    def stage(self, stage: str) -> None:
+        with self._lock:
+            self._stage = stage
+            progress = self._snapshot(time.monotonic())
+        job_store.update(self.job_id, progress=progress)
+
+    def _snapshot(self, now: float) -> dict:
+        done = sum(d for d, _ in self._frames.values())
+        total = sum(t for _, t in self._frames.values())
+        progress = {"stage": self._stage, "frames_done": done, "frames_total": total}
+        if self._stage == "extracting" and 0 < done < total:
+            progress["eta_seconds"] = round((now - self._started) * (total - done) / done, 1)
+        progress.update(self._running)
+        return progress
+
+
+def _compare_while_extracting(ctx: JobContext, future: Future, batches: queue.Queue, comparison, progress):
+    """Feed streamed attempt poses to `comparison` until the extraction `future` is done, then return its result.
+
+    Running scores are published at most every PROGRESS_STORE_INTERVAL.
+    """
+    published = time.monotonic()
+    while not future.done():
+        try:
+            ctx.check()
+        except (JobCancelled, TimeoutError):
+            future.cancel()
+            raise
+        try:
+            comparison.add(batches.get(timeout=0.1))
+        except queue.Empty:
+            continue
+        while not batches.empty():
+            comparison.add(batches.get())
+        now = time.monotonic()
+        if now - published >= PROGRESS_STORE_INTERVAL:
+            progress.running(comparison.running_scores())
+            published = now
+    return future.result()
+
+
+def process_reference(
+    ctx: JobContext,
+    ref_id: str,
+    target_fps: float | None = None,
+    max_inference_size: int | None = None,
+    video_hash: str | None = None,
+):
+    """Extract a registered reference video and store its poses and features in the library."""
+    try:
+        ctx.check()
+        poses, fps, _ = ctx.wait(submit_extraction(
+            reference_library.video_path(ref_id),
+            target_fps=target_fps,
+            max_inference_size=max_inference_size,
+            video_hash=video_hash,
+        ))
+        if not poses:
+            raise ValueError("No person detected in reference video")
+        reference_library.complete(ref_id, poses, fps)
+    except Exception as e:
+        reference_library.fail(ref_id, str(e))
+
+
+def process_comparison(
+    ctx: JobContext,
+    job_id: str,
+    scratch_dir: str,
+    ref_path: str | None,
+    att_path: str,
+    segment_duration: float = 2.5,
+    segment_boundaries: list[float] | None = None,
+    alignment_method: str = "auto",
+    alignment_window: float | None = None,
+    reference_id: str | None = None,
+    target_fps: float | None = None,
+    max_inference_size: int | None = None,
+    ref_hash: str | None = None,
+    att_hash: str | None = None,
+):
+    """Extract both videos (or load a library reference), compare them and store the result.
+
+    The uploads live in `scratch_dir`, which is removed however the job ends.
+    Stage timings are stored on the job record and added to the metrics
+    however it ends.
+    """
+    att_future = None
+    timer = StageTimer()
+    started = time.time()
+    status = "error"
+    ref_stats = None
+    user_stats = None
+    try:
+        ctx.check()
+        job = job_store.get(job_id)
+        if job is not None:
+            timer.add("queued", started - job["created_at"])
+        job_store.update(job_id, status="processing")
+        progress = _ProgressReporter(job_id)
+        progress.stage("extracting")
+        ref_features = None
+        sampling = {"target_fps": target_fps, "max_inference_size": max_inference_size}
+        # With online alignment the attempt's poses are streamed back and
+        # aligned while its extraction is still running
+        online = alignment_method == "online"
+        att_batches: queue.Queue = queue.Queue()
+        # Both extractions run concurrently in the process pool
+        att_future = submit_extraction(
+            att_path,
+            video_hash=att_hash,
+            progress=progress.frames("attempt"),
+            on_poses=att_batches.put if online else None,
+            **sampling,
+        )
+        with timer.stage("reference"):
+            if reference_id is not None:
+                job_store.update(job_id, message="Loading reference...")
+                try:
+                    ref_poses, ref_fps, ref_features = reference_library.load(reference_id)
+                except KeyError:
+                    raise ValueError("Reference no longer available")
+            else:
+                job_store.update(job_id, message="Extracting poses from reference and attempt videos...")
+                ref_poses, ref_fps, ref_stats = ctx.wait(submit_extraction(
+                    ref_path, video_hash=ref_hash, progress=progress.frames("reference"), **sampling
+                ))
+                if not ref_poses:
+                    raise ValueError("No person detected in reference video")
+
+        comparison = None
+        # Time still spent waiting for the attempt once the reference is there
+        with timer.stage("extraction"):
+            if online:
+                comparison = IncrementalComparison(
+                    ref_poses, ref_fps,
+                    segment_duration=segment_duration,
+                    segment_boundaries=segment_boundaries,
+                    alignment_window=alignment_window,
+                    ref_features=ref_features,
+                )
+                job_store.update(job_id, message="Extracting poses from attempt video and comparing...")
+                user_poses, user_fps, user_stats = _compare_while_extracting(
+                    ctx, att_future, att_batches, comparison, progress
+                )
+            else:
+                job_store.update(job_id, message="Extracting poses from attempt video...")
+                user_poses, user_fps, user_stats = ctx.wait(att_future)
+        if not user_poses:
+            raise ValueError("No person detected in attempt video")
+
+        ctx.check()
+        job_store.update(job_id, message="Comparing dances...")
+        if comparison is not None:
+            summary, arrays = comparison.finish(user_poses, user_fps, progress=progress.stage)
+        else:
+            summary, arrays = compare_dances(
+                ref_poses, user_poses, ref_fps, user_fps,
+                segment_duration=segment_duration,
+                segment_boundaries=segment_boundaries,
+                alignment_method=alignment_method,
+                alignment_window=alignment_window,
+                ref_features=ref_features,
+                progress=progress.stage,
+            )
+        summary.debug["extraction"] = {"reference": ref_stats, "attempt": user_stats}
+        for stage, seconds in summary.debug["timings"].items():
+            timer.add(stage, seconds)
+
+        # Serialization and the write to the job store
+        with timer.stage("store"):
+            job_store.complete(job_id, summary, arrays)
+        status = "complete"
+    except JobCancelled as e:
+        status = "cancelled"
+        job_store.update(job_id, status="cancelled", message=str(e))
+    except Exception as e:
+        job_store.update(job_id, status="error", message=str(e))
+    finally:
+        if att_future is not None:
+            att_future.cancel()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+        _record_timings(job_id, status, timer, started, [ref_stats, user_stats])
+
+
+def _record_timings(job_id: str, status: str, timer: StageTimer, started: float, extraction_stats: list) -> None:
+    """Store a finished comparison's timings on its job record and add them to the metrics.
+
+    The job's own stages (queued, reference, extraction, comparator stages,
+    store) are wall times. decode / convert / infer are the busy seconds of
+    both videos' extraction workers, so they overlap the job's stages.
+    """
+    stats = [s for s in extraction_stats if s and not s.get("cache_hit")]
+    for stage in ("decode", "convert", "infer"):
+        seconds = sum(s.get(f"{stage}_s", 0.0) for s in stats)
+        if seconds:
+            timer.add(stage, seconds)
+    timings = {
+        "stages": timer.rounded(),
+        "total_s": round(time.time() - started, 4),
+        "frames_extracted": sum(s.get("frames_analysed", 0) for s in stats),
+        "extraction_wall_s": round(sum(s.get("wall_s", 0.0) for s in stats), 4),
+    }
+    try:
+        job_store.update(job_id, timings=timings)
+        job_store.add_metrics(job_counters(status, timings))
+    except Exception:
+        pass  # Timings must not turn a finished job into an error
@@ -0,0 +1,118 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import mediapipe as mp
+import numpy as np
+
+PoseLandmarker = mp.tasks.vision.PoseLandmarker
+PoseLandmarkerOptions = mp.tasks.vision.PoseLandmarkerOptions
+RunningMode = mp.tasks.vision.RunningMode
+BaseOptions = mp.tasks.BaseOptions
+
+# Idle landmarkers kept per process. Extraction workers run one video at a
+# time, so one is enough there; in-process callers may want more.
+WARM_LANDMARKERS = int(os.environ.get("DANCE_WARM_LANDMARKERS", "1"))
+
+# Timestamp distance left between the warm-up inference and the video
+_VIDEO_GAP_MS = 60_000
+
+
+class WarmLandmarker:
+    """A VIDEO-mode landmarker plus the timestamp its video must start after.
+
+    VIDEO mode requires strictly increasing timestamps for the landmarker's
+    whole lifetime, so the video is shifted past the warm-up inference with
+    video_timestamp().
+    """
+
+    def __init__(self, landmarker):
+        self.landmarker = landmarker
+        self.base_ms = 0
+        self.last_ms = -1
+
+    def begin_video(self) -> None:
+        self.base_ms = self.last_ms + 1 + _VIDEO_GAP_MS if self.last_ms >= 0 else 0
+
+    def video_timestamp(self, timestamp_ms: int) -> int:
+        self.last_ms = max(self.last_ms, self.base_ms + timestamp_ms)
+        return self.base_ms + timestamp_ms
+
+    def detect_for_video(self, image, timestamp_ms: int):
+        return self.landmarker.detect_for_video(image, self.video_timestamp(timestamp_ms))
+
+
+class LandmarkerPool:
+    """Warm PoseLandmarkers sharing one in-memory copy of the model.
+
+    Creating a landmarker loads the model and initializes its graph, which
+    is a large part of the cost of a short video. Up to `max_idle` are kept
+    created and warmed ahead of time and handed out by acquire().
+    """
+
+    def __init__(self, model_path: str, settings: dict, max_idle: int = WARM_LANDMARKERS):
+        self.model_path = model_path
+        self.settings = settings
+        self.max_idle = max_idle
+        self._model: bytes | None = None
+        self._idle: list[WarmLandmarker] = []
+        self._lock = threading.Lock()
+
+    def _model_bytes(self) -> bytes:
+        with self._lock:
+            if self._model is None:
+                with open(self.model_path, "rb") as f:
+                    self._model = f.read()
+            return self._model
+
+    def _create(self) -> WarmLandmarker:
+        options = PoseLandmarkerOptions(
+            base_options=BaseOptions(model_asset_buffer=self._model_bytes()),
+            running_mode=RunningMode.VIDEO,
+            **self.settings,
+        )
+        return WarmLandmarker(PoseLandmarker.create_from_options(options))
+
+    @contextmanager
+    def acquire(self):
+        """Yield a WarmLandmarker for one video (or live stream).
+
+        VIDEO mode tracks the pose region from frame to frame, so a reused
+        landmarker would start the next video from the previous one's
+        tracking state, and poses (and the pose cache) would depend on which
+        job ran before. Each landmarker therefore serves a single video and
+        is closed afterwards; a fresh one is created and warmed in the
+        background to take its place.
+        """
+        with self._lock:
+            warm = self._idle.pop() if self._idle else None
+        if warm is None:
+            warm = self._create()
+        warm.begin_video()
+        try:
+            yield warm
+        finally:
+            warm.landmarker.close()
+            if self.max_idle > 0:
+                threading.Thread(target=self.warm_up, name="landmarker-refill", daemon=True).start()
+
+    def warm_up(self) -> None:
+        """Load the model and fill the pool, running one inference per landmarker.
+
+        The first inference initializes lazily allocated resources, so after
+        this the first real video runs at steady-state speed.
+        """
+        blank = mp.Image(image_format=mp.ImageFormat.SRGB, data=np.zeros((256, 256, 3), dtype=np.uint8))
+        created = []
+        with self._lock:
+            missing = self.max_idle - len(self._idle)
+        for _ in range(missing):
+            warm = self._create()
+            warm.detect_for_video(blank, 0)
+            created.append(warm)
+        with self._lock:
+            # A concurrent warm_up may have filled the pool meanwhile
+            keep = max(0, self.max_idle - len(self._idle))
+            self._idle.extend(created[:keep])
+        for warm in created[keep:]:
+            warm.landmarker.close()
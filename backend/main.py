@@ -1,16 +1,61 @@
+import asyncio
+import json
 import os
+import time
 import uuid
+import shutil
 import tempfile
 import threading
+import mimetypes
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 
-from models import JobStatus, ComparisonResult
-from pose_extractor import extract_poses
-from comparator import compare_dances
+from models import JobStatus, ComparisonResult, ReferenceInfo, ResultSummary
+from extraction_pool import start_extraction_pool, shutdown_extraction_pool
+from alignment import ALIGNMENT_METHODS
+from reference_library import reference_library
+from job_scheduler import JOB_QUEUE, QueueFull
+from job_queue import create_scheduler
+from job_store import FINISHED_STATUSES, JOB_TTL_SECONDS, job_store
+from job_tasks import process_comparison, process_reference
+from job_cost import MAX_JOB_SECONDS, estimate_job_seconds, extraction_seconds
+from pose_extractor import probe_video, resolve_sampling, warm_up_landmarkers
+from practice import MAX_PRACTICE_SESSIONS, PRACTICE_LATENCY_MS, PracticeSession, TooManySessions, parse_message
+from results_binary import RESULTS_MEDIA_TYPE, encode_binary
+from metrics import render as render_metrics
+from uploads import MAX_REQUEST_BYTES, UploadTooLarge, save_upload
 
-app = FastAPI(title="DanceCompare API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # With the shared queue, extraction happens in worker.py processes instead
+    if JOB_QUEUE == "local":
+        start_extraction_pool()
+    # Practice sessions run inference in this process
+    if MAX_PRACTICE_SESSIONS > 0:
+        threading.Thread(target=warm_up_landmarkers, name="warm-landmarkers", daemon=True).start()
+    scheduler.start()
+    yield
+    scheduler.shutdown()
+    shutdown_extraction_pool()
+
+
+app = FastAPI(title="DanceCompare API", lifespan=lifespan)
+
+# In-process scheduler, or the SQLite queue shared with worker.py processes
+scheduler = create_scheduler()
+
+# Uploads are kept here until their job has run; must be shared with the
+# workers when using the shared queue
+UPLOAD_DIR = os.environ.get("DANCE_UPLOAD_DIR") or None
+
+# /api/events checks the job store this often (a local read, unlike client
+# polling) and sends a comment line after this many idle seconds
+EVENT_POLL_SECONDS = 0.25
+EVENT_KEEPALIVE_SECONDS = 15.0
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,8 +65,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory job store
-jobs: dict[str, dict] = {}
+
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    # Refuse oversized uploads before their body is read; uploads without a
+    # Content-Length are still limited per file while being saved
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_REQUEST_BYTES:
+        return JSONResponse(status_code=413, content={"detail": "Upload too large"})
+    return await call_next(request)
 
 
 @app.get("/api/health")
@@ -29,78 +81,453 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text format: queue depth, active jobs, per-stage job time and extraction throughput.
+
+    Job counters live in the job store, so with the SQLite store they cover
+    every process sharing it (and every API process reports the same totals).
+    """
+    counts = scheduler.counts()
+    gauges = {"dance_queue_depth": counts["queued"], "dance_jobs_active": counts["running"]}
+    return PlainTextResponse(
+        render_metrics(job_store.metrics(), gauges), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.post("/api/references")
+async def register_reference(
+    video: UploadFile = File(...),
+    name: str = Form(""),
+    target_fps: float | None = Form(None),
+    max_inference_size: int | None = Form(None),
+):
+    _check_sampling(target_fps, max_inference_size)
+    # Library, probe and scheduler calls touch disk / SQLite, so they run off the event loop
+    meta = await run_in_threadpool(reference_library.create, name, video.filename or "")
+    ref_id = meta["reference_id"]
+
+    def enqueue(video_hash: str) -> None:
+        # Extract and precompute features on a scheduler worker
+        sampling = resolve_sampling(target_fps, max_inference_size)
+        cost = _admit(extraction_seconds(_probe(reference_library.video_path(ref_id)), sampling))
+        scheduler.submit(
+            ref_id, process_reference, ref_id,
+            cost=cost, target_fps=target_fps, max_inference_size=max_inference_size, video_hash=video_hash,
+        )
+
+    try:
+        video_hash = await _save(video, reference_library.video_path(ref_id))
+        await run_in_threadpool(enqueue, video_hash)
+    except QueueFull as e:
+        await run_in_threadpool(reference_library.delete, ref_id)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    except BaseException:
+        await run_in_threadpool(reference_library.delete, ref_id)
+        raise
+
+    return ReferenceInfo(**meta)
+
+
+async def _save(upload: UploadFile, path: str) -> str:
+    """Copy an upload to `path` off the event loop; returns its SHA-256 for the pose cache."""
+    try:
+        return await run_in_threadpool(save_upload, upload.file, path)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+def _probe(video_path: str) -> dict:
+    try:
+        return probe_video(video_path)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Cannot read uploaded video")
+
+
+def _admit(cost: float) -> float:
+    """Reject jobs whose estimated processing time exceeds the budget; returns the cost.
+
+    The upload itself was within the size limit, so this is a 422 rather than a 413.
+    """
+    if MAX_JOB_SECONDS > 0 and cost > MAX_JOB_SECONDS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Estimated processing time {cost:.0f}s exceeds the limit of {MAX_JOB_SECONDS:.0f}s",
+        )
+    return cost
+
+
+def _check_sampling(target_fps: float | None, max_inference_size: int | None):
+    # 0 means every source frame / full resolution; None the server default
+    if target_fps is not None and target_fps < 0:
+        raise HTTPException(status_code=422, detail="target_fps must not be negative")
+    if max_inference_size is not None and max_inference_size < 0:
+        raise HTTPException(status_code=422, detail="max_inference_size must not be negative")
+
+
+@app.get("/api/references")
+def list_references():
+    return [ReferenceInfo(**meta) for meta in reference_library.list()]
+
+
+@app.get("/api/references/{ref_id}")
+def get_reference(ref_id: str):
+    meta = reference_library.get(ref_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Reference not found")
+    return ReferenceInfo(**meta)
+
+
+@app.get("/api/references/{ref_id}/video")
+def get_reference_video(ref_id: str):
+    meta = reference_library.get(ref_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Reference not found")
+    media_type = mimetypes.guess_type(meta["filename"])[0] or "application/octet-stream"
+    return FileResponse(reference_library.video_path(ref_id), media_type=media_type)
+
+
+@app.delete("/api/references/{ref_id}")
+def delete_reference(ref_id: str):
+    if not reference_library.delete(ref_id):
+        raise HTTPException(status_code=404, detail="Reference not found")
+    return {"deleted": ref_id}
+
+
+@app.websocket("/api/practice/{reference_id}")
+async def practice(websocket: WebSocket, reference_id: str):
+    """Score a live stream of frames against a ready library reference (message format in practice.py).
+
+    Every frame gets one JSON reply: its scores and latency, {"timestamp",
+    "skipped": true} when a newer frame is already waiting or it waited
+    longer than PRACTICE_LATENCY_MS, or {"error"} for a malformed frame.
+    """
+    await websocket.accept()
+    try:
+        session = await run_in_threadpool(PracticeSession, reference_id)
+    except KeyError:
+        await websocket.close(code=1008, reason="Reference not found or not ready")
+        return
+    except TooManySessions as e:
+        await websocket.close(code=1013, reason=str(e))
+        return
+
+    frames: asyncio.Queue = asyncio.Queue()
+    receiver = asyncio.create_task(_receive_frames(websocket, frames))
+    try:
+        while (item := await frames.get()) is not None:
+            received, message = item
+            try:
+                timestamp, image, landmarks = parse_message(message)
+            except ValueError as e:
+                await websocket.send_json({"error": str(e)})
+                continue
+            if not frames.empty() or (time.monotonic() - received) * 1000 > PRACTICE_LATENCY_MS:
+                await websocket.send_json({"timestamp": timestamp, "skipped": True})
+                continue
+            try:
+                reply = await run_in_threadpool(session.process, timestamp, image, landmarks)
+            except ValueError as e:
+                await websocket.send_json({"error": str(e)})
+                continue
+            reply["latency_ms"] = round((time.monotonic() - received) * 1000, 1)
+            await websocket.send_json(reply)
+    except WebSocketDisconnect:
+        pass
+    except Exception:
+        await websocket.close(code=1011, reason="Practice session failed")
+        raise
+    finally:
+        receiver.cancel()
+        await run_in_threadpool(session.close)
+
+
+async def _receive_frames(websocket: WebSocket, frames: asyncio.Queue) -> None:
+    """Queue incoming messages with their arrival time, then None once the client disconnects."""
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            frames.put_nowait((time.monotonic(), message))
+    finally:
+        frames.put_nowait(None)
+
+
 @app.post("/api/compare")
 async def compare(
-    reference: UploadFile = File(...),
+    reference: UploadFile | None = File(None),
     attempt: UploadFile = File(...),
+    reference_id: str | None = Form(None),
+    segment_duration: float = Form(2.5),
+    segment_boundaries: str | None = Form(None),
+    alignment_method: str = Form("auto"),
+    alignment_window: float | None = Form(None),
+    target_fps: float | None = Form(None),
+    max_inference_size: int | None = Form(None),
 ):
-    job_id = str(uuid.uuid4())
-    jobs[job_id] = {"status": "pending", "message": "Queued", "result": None}
+    # Either upload a reference video or compare against a registered one
+    if (reference is None) == (reference_id is None):
+        raise HTTPException(status_code=422, detail="Provide exactly one of reference or reference_id")
+    if reference_id is not None:
+        meta = await run_in_threadpool(reference_library.get, reference_id)
+        if meta is None:
+            raise HTTPException(status_code=404, detail="Reference not found")
+        if meta["status"] != "ready":
+            raise HTTPException(status_code=409, detail=f"Reference not ready: {meta['status']}")
 
-    # Save uploads to temp files
-    tmp_dir = tempfile.mkdtemp()
-    ref_path = os.path.join(tmp_dir, f"ref_{reference.filename}")
-    att_path = os.path.join(tmp_dir, f"att_{attempt.filename}")
+    # Optional comma-separated reference times (seconds), e.g. choreography counts
+    boundaries = None
+    if segment_boundaries:
+        try:
+            boundaries = [float(t) for t in segment_boundaries.split(",")]
+        except ValueError:
+            raise HTTPException(status_code=422, detail="segment_boundaries must be comma-separated numbers")
+        if len(boundaries) < 2 or any(b <= a for a, b in zip(boundaries, boundaries[1:])):
+            raise HTTPException(status_code=422, detail="segment_boundaries must be at least two increasing times")
+    if segment_duration <= 0:
+        raise HTTPException(status_code=422, detail="segment_duration must be positive")
+    if alignment_method not in ALIGNMENT_METHODS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"alignment_method must be one of: {', '.join(ALIGNMENT_METHODS)}",
+        )
+    if alignment_window is not None and alignment_window <= 0:
+        raise HTTPException(status_code=422, detail="alignment_window must be positive")
+    _check_sampling(target_fps, max_inference_size)
 
-    with open(ref_path, "wb") as f:
-        f.write(await reference.read())
-    with open(att_path, "wb") as f:
-        f.write(await attempt.read())
+    # Save uploads to a scratch directory, which the job removes when it ends.
+    # Store, probe and scheduler calls touch disk / SQLite, so they run off the event loop
+    tmp_dir = await run_in_threadpool(tempfile.mkdtemp, dir=UPLOAD_DIR)
+    job_id = str(uuid.uuid4())
 
-    # Process in background thread
-    thread = threading.Thread(
-        target=_process_job, args=(job_id, ref_path, att_path)
-    )
-    thread.start()
+    def enqueue(ref_path: str | None, att_path: str, ref_hash: str | None, att_hash: str) -> None:
+        # Estimate the cost from container metadata and process on a scheduler worker
+        cost = _admit(estimate_job_seconds(
+            _probe(att_path),
+            resolve_sampling(target_fps, max_inference_size),
+            reference=_probe(ref_path) if ref_path is not None else None,
+            reference_frames=meta["frame_count"] if reference_id is not None else None,
+            alignment_method=alignment_method,
+            alignment_window=alignment_window,
+        ))
+        scheduler.submit(
+            job_id, process_comparison, job_id, tmp_dir, ref_path, att_path,
+            cost=cost,
+            segment_duration=segment_duration,
+            segment_boundaries=boundaries,
+            alignment_method=alignment_method,
+            alignment_window=alignment_window,
+            reference_id=reference_id,
+            target_fps=target_fps,
+            max_inference_size=max_inference_size,
+            ref_hash=ref_hash,
+            att_hash=att_hash,
+        )
+
+    try:
+        await run_in_threadpool(job_store.create, job_id)
+        att_path = os.path.join(tmp_dir, f"att_{os.path.basename(attempt.filename or '')}")
+        ref_path = ref_hash = None
+        if reference is not None:
+            ref_path = os.path.join(tmp_dir, f"ref_{os.path.basename(reference.filename or '')}")
+            ref_hash = await _save(reference, ref_path)
+        att_hash = await _save(attempt, att_path)
+        await run_in_threadpool(enqueue, ref_path, att_path, ref_hash, att_hash)
+    except QueueFull as e:
+        await run_in_threadpool(_discard_job, job_id, tmp_dir)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    except BaseException:
+        await run_in_threadpool(_discard_job, job_id, tmp_dir)
+        raise
 
     return {"job_id": job_id}
 
 
-def _process_job(job_id: str, ref_path: str, att_path: str):
-    try:
-        jobs[job_id]["status"] = "processing"
-        jobs[job_id]["message"] = "Extracting poses from reference video..."
-
-        ref_poses, ref_fps = extract_poses(ref_path)
-        if not ref_poses:
-            raise ValueError("No person detected in reference video")
-
-        jobs[job_id]["message"] = "Extracting poses from attempt video..."
-        user_poses, user_fps = extract_poses(att_path)
-        if not user_poses:
-            raise ValueError("No person detected in attempt video")
-
-        jobs[job_id]["message"] = "Comparing dances..."
-        result = compare_dances(ref_poses, user_poses, ref_fps, user_fps)
-
-        jobs[job_id]["status"] = "complete"
-        jobs[job_id]["message"] = "Done"
-        jobs[job_id]["result"] = result
-    except Exception as e:
-        jobs[job_id]["status"] = "error"
-        jobs[job_id]["message"] = str(e)
-    finally:
-        # Clean up temp files
-        for p in (ref_path, att_path):
-            try:
-                os.remove(p)
-            except OSError:
-                pass
+def _discard_job(job_id: str, tmp_dir: str) -> None:
+    """Undo a comparison that was not queued."""
+    job_store.delete(job_id)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _get_job(job_id: str) -> dict:
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def _job_status(job: dict) -> JobStatus:
+    job_id = job["job_id"]
+    position = scheduler.queue_position(job_id) if job["status"] == "pending" else None
+    message = f"Queued (position {position})" if position is not None else job["message"]
+    progress = job.get("progress") if job["status"] == "processing" else None
+    # While extracting, the frame rate so far predicts better than the cost estimate
+    eta = progress.get("eta_seconds") if progress else None
+    if eta is None:
+        eta = scheduler.eta(job_id)
+    return JobStatus(
+        job_id=job_id,
+        status=job["status"],
+        message=message,
+        queue_position=position,
+        eta_seconds=round(eta, 1) if eta is not None else None,
+        progress=progress,
+        timings=job.get("timings"),
+    )
 
 
 @app.get("/api/status/{job_id}")
 def get_status(job_id: str):
-    if job_id not in jobs:
-        raise HTTPException(status_code=404, detail="Job not found")
-    job = jobs[job_id]
+    return _job_status(_get_job(job_id))
+
+
+@app.get("/api/events/{job_id}")
+async def job_events(job_id: str, request: Request):
+    """Server-sent events: `status` (a JobStatus) whenever it changes, then `result` (the summary) on completion.
+
+    The stream ends after the result or an error / cancellation status.
+    """
+    await run_in_threadpool(_get_job, job_id)
+
+    async def stream():
+        last = None
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            job = await run_in_threadpool(job_store.get, job_id)
+            if job is None:
+                yield _sse("status", JobStatus(job_id=job_id, status="error", message="Job not found").model_dump_json())
+                return
+            status = (await run_in_threadpool(_job_status, job)).model_dump_json()
+            if status != last:
+                yield _sse("status", status)
+                last = status
+                last_sent = time.monotonic()
+            if job["status"] == "complete":
+                summary = await run_in_threadpool(job_store.result_summary, job_id)
+                yield _sse("result", json.dumps(summary))
+                return
+            if job["status"] in FINISHED_STATUSES:
+                return
+            if time.monotonic() - last_sent > EVENT_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(EVENT_POLL_SECONDS)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+@app.post("/api/cancel/{job_id}")
+def cancel_job(job_id: str):
+    job = _get_job(job_id)
+    if not scheduler.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job already finished: {job['status']}")
+    job = _get_job(job_id)
     return JobStatus(job_id=job_id, status=job["status"], message=job["message"])
 
 
-@app.get("/api/results/{job_id}")
-def get_results(job_id: str):
-    if job_id not in jobs:
-        raise HTTPException(status_code=404, detail="Job not found")
-    job = jobs[job_id]
+# Keypoint frames returned per request at most
+KEYPOINT_PAGE_FRAMES = 1000
+_KEYPOINT_SIDES = {"ref": "ref_keypoints", "user": "user_keypoints"}
+
+
+def _complete_job(job_id: str) -> dict:
+    job = _get_job(job_id)
     if job["status"] != "complete":
         raise HTTPException(status_code=400, detail=f"Job not complete: {job['status']}")
-    return job["result"]
+    return job
+
+
+def _result_response(request: Request, job_id: str, part: str, load) -> Response:
+    """Negotiated response for part of a finished job's result.
+
+    `load()` returns (fields, arrays). Clients that accept RESULTS_MEDIA_TYPE
+    get the arrays as typed binary buffers, others JSON. Results never
+    change once complete, so the ETag is built from the job record alone
+    (job id and finished_at, which later writes such as the job's timings
+    don't move) plus the part and format, and a matching
+    If-None-Match is answered with 304 before the result is loaded.
+    A Server-Timing header reports the time spent loading and serializing.
+    """
+    job = _complete_job(job_id)
+    binary = RESULTS_MEDIA_TYPE in request.headers.get("accept", "")
+    finished_at = job.get("finished_at", job["updated_at"])
+    etag = f'"{job_id}-{int(finished_at * 1e6)}-{part}-{"bin" if binary else "json"}"'
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={int(JOB_TTL_SECONDS)}", "Vary": "Accept"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    started = time.perf_counter()
+    loaded = load()
+    if loaded is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    fields, arrays = loaded
+    loaded_at = time.perf_counter()
+    if binary:
+        body = encode_binary(fields, arrays)
+    else:
+        content = {**fields, **{name: values.tolist() for name, values in arrays.items()}}
+        body = json.dumps(content, separators=(",", ":")).encode()
+    headers["Server-Timing"] = (
+        f"load;dur={(loaded_at - started) * 1000:.1f}, serialize;dur={(time.perf_counter() - loaded_at) * 1000:.1f}"
+    )
+    return Response(body, media_type=RESULTS_MEDIA_TYPE if binary else "application/json", headers=headers)
+
+
+@app.get("/api/results/{job_id}", response_model=ComparisonResult)
+def get_results(job_id: str, request: Request):
+
+    def load():
+        summary = job_store.result_summary(job_id)
+        arrays = job_store.result_arrays(job_id, ("ref_keypoints", "user_keypoints", "dtw_path"))
+        return (summary, arrays) if summary is not None and arrays is not None else None
+
+    return _result_response(request, job_id, "full", load)
+
+
+@app.get("/api/results/{job_id}/summary", response_model=ResultSummary)
+def get_result_summary(job_id: str, request: Request):
+
+    def load():
+        summary = job_store.result_summary(job_id)
+        return (summary, {}) if summary is not None else None
+
+    return _result_response(request, job_id, "summary", load)
+
+
+@app.get("/api/results/{job_id}/keypoints/{side}")
+def get_result_keypoints(job_id: str, side: str, request: Request, start: int = 0, end: int | None = None):
+    """Keypoints of frames [start, end) of the reference ("ref") or attempt ("user")."""
+    if side not in _KEYPOINT_SIDES:
+        raise HTTPException(status_code=404, detail="Unknown side; expected 'ref' or 'user'")
+    if start < 0 or (end is not None and end < start):
+        raise HTTPException(status_code=422, detail="Invalid frame range")
+    end = start + KEYPOINT_PAGE_FRAMES if end is None else min(end, start + KEYPOINT_PAGE_FRAMES)
+    name = _KEYPOINT_SIDES[side]
+
+    def load():
+        arrays = job_store.result_arrays(job_id, (name,))
+        if arrays is None:
+            return None
+        keypoints = arrays[name]
+        page = keypoints[start:end]
+        return {"start": start, "end": start + len(page), "total": len(keypoints)}, {"keypoints": page}
+
+    return _result_response(request, job_id, f"{side}-{start}-{end}", load)
+
+
+@app.get("/api/results/{job_id}/dtw_path")
+def get_result_dtw_path(job_id: str, request: Request):
+
+    def load():
+        arrays = job_store.result_arrays(job_id, ("dtw_path",))
+        return ({}, arrays) if arrays is not None else None
+
+    return _result_response(request, job_id, "dtw_path", load)
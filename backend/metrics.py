@@ -0,0 +1,72 @@
+import re
+import time
+from contextlib import contextmanager
+
+# Counters are kept in the job store (see add_metrics there), keyed by their
+# Prometheus series, e.g. 'dance_job_stage_seconds_sum{stage="alignment"}',
+# so jobs run by worker processes count as well.
+
+_HELP = {
+    "dance_queue_depth": ("gauge", "Jobs waiting in the queue"),
+    "dance_jobs_active": ("gauge", "Jobs being processed"),
+    "dance_jobs_finished_total": ("counter", "Finished comparison jobs by status"),
+    "dance_job_stage_seconds": ("summary", "Seconds spent per comparison job stage"),
+    "dance_frames_extracted_total": ("counter", "Frames run through pose inference for comparison jobs"),
+    "dance_extraction_seconds_total": ("counter", "Wall seconds of those extractions"),
+    "dance_extraction_frames_per_second": ("gauge", "Extraction throughput: frames extracted / extraction seconds"),
+}
+
+
+class StageTimer:
+    """Wall time per named stage; a stage entered again adds to its total."""
+
+    def __init__(self):
+        self.seconds: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def rounded(self) -> dict[str, float]:
+        return {name: round(seconds, 4) for name, seconds in self.seconds.items()}
+
+
+def job_counters(status: str, timings: dict) -> dict[str, float]:
+    """Counter increments for one finished comparison job with the given job-record timings."""
+    counters = {f'dance_jobs_finished_total{{status="{status}"}}': 1}
+    for stage, seconds in timings.get("stages", {}).items():
+        counters[f'dance_job_stage_seconds_sum{{stage="{stage}"}}'] = seconds
+        counters[f'dance_job_stage_seconds_count{{stage="{stage}"}}'] = 1
+    if timings.get("frames_extracted"):
+        counters["dance_frames_extracted_total"] = timings["frames_extracted"]
+        counters["dance_extraction_seconds_total"] = timings["extraction_wall_s"]
+    return counters
+
+
+def render(counters: dict[str, float], gauges: dict[str, float]) -> str:
+    """Prometheus text exposition of counter and gauge series."""
+    series = dict(counters)
+    series.update(gauges)
+    seconds = counters.get("dance_extraction_seconds_total", 0.0)
+    series["dance_extraction_frames_per_second"] = (
+        counters.get("dance_frames_extracted_total", 0.0) / seconds if seconds > 0 else 0.0
+    )
+    lines = []
+    described = set()
+    for key in sorted(series):
+        name = re.match(r"[a-zA-Z_:][a-zA-Z0-9_:]*", key).group()
+        family = re.sub(r"_(sum|count)$", "", name) if name not in _HELP else name
+        if family not in described and family in _HELP:
+            kind, text = _HELP[family]
+            lines.append(f"# HELP {family} {text}")
+            lines.append(f"# TYPE {family} {kind}")
+            described.add(family)
+        lines.append(f"{key} {float(series[key])}")
+    return "\n".join(lines) + "\n"
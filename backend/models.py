@@ -41,7 +41,47 @@ class ComparisonResult(BaseModel):
     extended_moments: list[dict] = None  # Extended list of moments with error below threshold
 
 
+class ResultSummary(BaseModel):
+    """ComparisonResult without keypoints and DTW path, which are fetched separately."""
+    overall_score: float
+    segment_scores: list[SegmentScore]
+    ref_fps: float
+    user_fps: float
+    ref_frames: int
+    user_frames: int
+    path_length: int
+    debug: dict = None
+    worst_moments: list[dict] = None
+    extended_moments: list[dict] = None
+
+
+class JobProgress(BaseModel):
+    stage: str  # extracting, features, aligning, scoring
+    frames_done: int = 0  # source frames extracted so far, both videos together
+    frames_total: int = 0
+    # Incremental comparisons (alignment_method "online") only
+    ref_time: float | None = None  # reference time the attempt has reached
+    running_score: float | None = None  # overall score so far
+    segment_scores: list[dict] | None = None  # segments passed so far: start_time, end_time, score
+
+
 class JobStatus(BaseModel):
     job_id: str
-    status: str  # pending, processing, complete, error
+    status: str  # pending, processing, complete, error, cancelled
+    message: str = ""
+    queue_position: int | None = None  # 1-based, while pending
+    eta_seconds: float | None = None  # estimated time until complete
+    progress: JobProgress | None = None  # while processing
+    timings: dict | None = None  # once finished: per-stage seconds (see job_tasks._record_timings)
+
+
+class ReferenceInfo(BaseModel):
+    reference_id: str
+    name: str
+    filename: str
+    status: str  # processing, ready, error
     message: str = ""
+    created_at: float
+    frame_count: int = 0
+    fps: float = 0.0
+    duration: float = 0.0
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zipfile
+
+import numpy as np
+from pose_sequence import PoseSequence
+
+CACHE_DIR = os.environ.get(
+    "DANCE_POSE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "dancecompare", "poses"),
+)
+CACHE_MAX_BYTES = int(float(os.environ.get("DANCE_POSE_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+
+_FORMAT_VERSION = 1
+_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    """Hex SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_model_hashes: dict[tuple[str, float, int], str] = {}
+
+
+def model_sha256(path: str) -> str:
+    """SHA-256 of the model file, memoized on (path, mtime, size)."""
+    st = os.stat(path)
+    key = (path, st.st_mtime, st.st_size)
+    if key not in _model_hashes:
+        _model_hashes[key] = file_sha256(path)
+    return _model_hashes[key]
+
+
+class PoseCache:
+    """Content-addressed on-disk cache of extract_poses results.
+
+    Entries are uncompressed .npz files (float32 landmarks, frame numbers,
+    timestamps, fps) named by a key derived from the video bytes, the model
+    file and the detection settings. Total size is kept under `max_bytes`
+    by evicting least recently used entries; a hit refreshes the entry's
+    mtime, which is the LRU clock.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(video_hash: str, model_hash: str, settings: dict) -> str:
+        payload = json.dumps(
+            {"v": _FORMAT_VERSION, "video": video_hash, "model": model_hash, "settings": settings},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key: str) -> tuple[PoseSequence, float] | None:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                poses = PoseSequence(data["landmarks"], data["frame_nums"], data["timestamps"])
+                fps = float(data["fps"])
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # Truncated or corrupt entry: drop it so the next extraction rewrites it
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return poses, fps
+
+    def put(self, key: str, poses: PoseSequence, fps: float) -> None:
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    landmarks=poses.landmarks,
+                    frame_nums=poses.frame_nums,
+                    timestamps=poses.timestamps,
+                    fps=np.float64(fps),
+                )
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            try:
+                names = os.listdir(self.directory)
+            except OSError:
+                return
+            for name in names:
+                if not name.endswith(".npz"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue  # Evicted concurrently
+                entries.append((st.st_mtime, st.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+                total -= size
+
+
+pose_cache = PoseCache()
@@ -1,89 +1,356 @@
 import os
+import queue
+import threading
+import time
+from typing import Callable
+
 import cv2
 import mediapipe as mp
 import numpy as np
-from models import FramePose, Landmark
+from pose_sequence import PoseSequence, NUM_LANDMARKS
+from pose_cache import pose_cache, file_sha256, model_sha256
+from landmarker_pool import LandmarkerPool
 
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "pose_landmarker_lite.task")
 
-PoseLandmarker = mp.tasks.vision.PoseLandmarker
-PoseLandmarkerOptions = mp.tasks.vision.PoseLandmarkerOptions
-RunningMode = mp.tasks.vision.RunningMode
-BaseOptions = mp.tasks.BaseOptions
+# Landmarker settings; also part of the pose cache key
+DETECTION_SETTINGS = {
+    "num_poses": 1,
+    "min_pose_detection_confidence": 0.5,
+    "min_tracking_confidence": 0.5,
+}
+
+landmarker_pool = LandmarkerPool(MODEL_PATH, DETECTION_SETTINGS)
+
+
+def warm_up_landmarkers() -> None:
+    """Preload the model and warm this process's landmarkers (extraction worker initializer)."""
+    try:
+        landmarker_pool.warm_up()
+    except Exception:
+        pass  # e.g. model missing; the error resurfaces on the first extraction
+
+# Analysis frame rate and longest inference side in pixels (0 = every source
+# frame / full resolution). Landmarks are normalized to the frame, so
+# downscaling only trades detection accuracy for inference time.
+TARGET_FPS = float(os.environ.get("DANCE_TARGET_FPS", "0"))
+MAX_INFERENCE_SIZE = int(os.environ.get("DANCE_MAX_INFERENCE_SIZE", "0"))
+
+# Converted RGB frames the decoder thread may run ahead of inference
+PREFETCH_FRAMES = 8
+# Seconds between progress callbacks during extraction
+PROGRESS_INTERVAL = 0.25
 
+_STAGE_FRAMES = {"decode": "frames_decoded", "convert": "frames_analysed", "infer": "frames_analysed"}
 
-def extract_poses(video_path: str) -> tuple[list[FramePose], float]:
-    """Extract pose landmarks from every frame of a video.
 
-    Returns (list of FramePose, fps).
+class ExtractionCancelled(Exception):
+    pass
+
+
+def extract_poses(
+    video_path: str,
+    use_cache: bool = True,
+    target_fps: float | None = None,
+    max_inference_size: int | None = None,
+    video_hash: str | None = None,
+    progress: Callable[[int, int], None] | None = None,
+    on_poses: Callable[[PoseSequence], None] | None = None,
+    cancelled: Callable[[], bool] | None = None,
+) -> tuple[PoseSequence, float, dict]:
+    """Extract pose landmarks from a video, sampled at `target_fps`.
+
+    Returns (PoseSequence, fps, stats) where fps is the effective analysis
+    rate and stats the pipeline stage timings (see extract_pose_range).
+    Frames without a detected person are skipped. Results are cached on disk
+    by video content, model file, detection and sampling settings, so a
+    repeat upload of a known video skips inference. `video_hash` is the
+    video's SHA-256 if the caller already computed it. `progress`,
+    `on_poses` and `cancelled` are passed on to extract_pose_range (none is
+    called on a cache hit).
     """
+    sampling = resolve_sampling(target_fps, max_inference_size)
+    callbacks = {"progress": progress, "on_poses": on_poses, "cancelled": cancelled}
+    if not (use_cache and pose_cache.enabled):
+        return extract_pose_range(video_path, **callbacks, **sampling)
+
+    key = pose_cache_key(video_path, sampling, video_hash)
+    cached = pose_cache.get(key)
+    if cached is not None:
+        return (*cached, {"cache_hit": True})
+    poses, fps, stats = extract_pose_range(video_path, **callbacks, **sampling)
+    pose_cache.put(key, poses, fps)
+    return poses, fps, stats
+
+
+def resolve_sampling(target_fps: float | None = None, max_inference_size: int | None = None) -> dict:
+    """Sampling settings with unset values taken from DANCE_TARGET_FPS / DANCE_MAX_INFERENCE_SIZE."""
+    return {
+        "target_fps": float(TARGET_FPS if target_fps is None else target_fps),
+        "max_inference_size": int(MAX_INFERENCE_SIZE if max_inference_size is None else max_inference_size),
+    }
+
+
+def sampling_step(source_fps: float, target_fps: float) -> int:
+    """Source frames per analysed frame: the whole-frame step nearest to target_fps."""
+    if target_fps <= 0:
+        return 1
+    return max(1, round(source_fps / target_fps))
+
+
+def pose_cache_key(video_path: str, sampling: dict, video_hash: str | None = None) -> str:
+    """Cache key for a video; pass `video_hash` (its SHA-256) when already known to skip rehashing."""
+    settings = {**DETECTION_SETTINGS, **sampling}
+    return pose_cache.make_key(video_hash or file_sha256(video_path), model_sha256(MODEL_PATH), settings)
+
+
+def probe_video(video_path: str) -> dict:
+    """Container metadata without decoding: frame_count, fps, width, height."""
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         raise ValueError(f"Cannot open video: {video_path}")
+    info = {
+        "frame_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        "fps": cap.get(cv2.CAP_PROP_FPS) or 30.0,
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+    }
+    cap.release()
+    return info
+
+
+def extract_pose_range(
+    video_path: str,
+    start_frame: int = 0,
+    end_frame: int | None = None,
+    warmup_frames: int = 0,
+    target_fps: float = 0.0,
+    max_inference_size: int = 0,
+    progress: Callable[[int, int], None] | None = None,
+    on_poses: Callable[[PoseSequence], None] | None = None,
+    cancelled: Callable[[], bool] | None = None,
+) -> tuple[PoseSequence, float, dict]:
+    """Extract poses for source frames [start_frame, end_frame) (to the end if None).
 
-    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-    frame_poses: list[FramePose] = []
+    Decoding starts `warmup_frames` earlier so the landmarker's tracking has
+    settled by start_frame; warm-up detections are discarded. Only every
+    sampling_step()-th source frame is decoded and analysed, downscaled so
+    its longest side is at most `max_inference_size`. Frame numbers and
+    timestamps are absolute positions in the video; the returned fps is the
+    effective analysis rate.
 
-    options = PoseLandmarkerOptions(
-        base_options=BaseOptions(model_asset_path=MODEL_PATH),
-        running_mode=RunningMode.VIDEO,
-        num_poses=1,
-        min_pose_detection_confidence=0.5,
-        min_tracking_confidence=0.5,
+    A decoder thread grabs, downscales and converts frames into a small
+    ring of reused RGB buffers while this thread runs inference, so decode
+    and inference overlap. The returned stats hold busy seconds and
+    throughput per stage plus `infer_wait_s`, the time inference sat idle
+    waiting for frames (large when decode is the bottleneck).
+
+    `progress(frames_done, frames_total)` is called about every
+    PROGRESS_INTERVAL seconds and once at the end, counting source frames
+    of the range (the total is the container's estimate). `on_poses` is
+    called at the same times with the poses detected since its last call,
+    so a consumer can work on the sequence while it is being extracted.
+    `cancelled()` is checked before every inference; once it returns True
+    ExtractionCancelled is raised.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    step = sampling_step(source_fps, target_fps)
+    range_end = end_frame if end_frame is not None else int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames_total = max(range_end - start_frame, 0)
+    frame_landmarks: list[np.ndarray] = []
+    frame_nums: list[int] = []
+    stats = {
+        "cache_hit": False,
+        "frames_decoded": 0,
+        "frames_analysed": 0,
+        "decode_s": 0.0,
+        "convert_s": 0.0,
+        "infer_s": 0.0,
+        "infer_wait_s": 0.0,
+    }
+    started = time.perf_counter()
+    reported = started
+    streamed = 0
+
+    def report(done: int) -> None:
+        nonlocal streamed
+        if progress is not None:
+            progress(done, frames_total)
+        if on_poses is not None and len(frame_nums) > streamed:
+            nums = np.array(frame_nums[streamed:], dtype=np.int64)
+            on_poses(PoseSequence(np.stack(frame_landmarks[streamed:]), nums, nums / source_fps))
+            streamed = len(frame_nums)
+
+    first_frame = max(0, start_frame - warmup_frames)
+    if first_frame > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first_frame)
+
+    # Every buffer is either free, queued or being inferred on, which bounds
+    # how far the decoder runs ahead. Buffers are allocated on first use.
+    free: queue.Queue = queue.Queue()
+    for _ in range(PREFETCH_FRAMES + 1):
+        free.put(None)
+    ready: queue.Queue = queue.Queue()
+    stop = threading.Event()
+    decoder = threading.Thread(
+        target=_decode_frames,
+        args=(cap, first_frame, end_frame, step, max_inference_size, free, ready, stop, stats),
+        daemon=True,
     )
 
-    with PoseLandmarker.create_from_options(options) as landmarker:
-        frame_num = 0
-        while True:
-            ret, frame = cap.read()
+    try:
+        with landmarker_pool.acquire() as landmarker:
+            decoder.start()
+            while True:
+                t0 = time.perf_counter()
+                item = ready.get()
+                t1 = time.perf_counter()
+                stats["infer_wait_s"] += t1 - t0
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if cancelled is not None and cancelled():
+                    raise ExtractionCancelled("Extraction cancelled")
+                frame_num, rgb = item
+
+                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+                timestamp_ms = int(frame_num * 1000 / source_fps)
+                result = landmarker.detect_for_video(mp_image, timestamp_ms)
+
+                if frame_num >= start_frame and result.pose_landmarks and len(result.pose_landmarks) > 0:
+                    raw = result.pose_landmarks[0]  # first person
+                    frame_landmarks.append(_landmarks_to_array(raw))
+                    frame_nums.append(frame_num)
+
+                free.put(rgb)
+                stats["frames_analysed"] += 1
+                t2 = time.perf_counter()
+                stats["infer_s"] += t2 - t1
+                if t2 - reported >= PROGRESS_INTERVAL:
+                    report(min(max(frame_num + 1 - start_frame, 0), frames_total))
+                    reported = t2
+    finally:
+        stop.set()
+        free.put(None)  # Unblock a decoder waiting for a buffer
+        if decoder.is_alive():
+            decoder.join()
+        cap.release()
+
+    report(frames_total)
+    stats["wall_s"] = time.perf_counter() - started
+    stats = with_throughput(stats)
+    fps = source_fps / step
+    if not frame_landmarks:
+        return PoseSequence.empty(), fps, stats
+    frame_nums_arr = np.array(frame_nums, dtype=np.int64)
+    poses = PoseSequence(np.stack(frame_landmarks), frame_nums_arr, frame_nums_arr / source_fps)
+    return poses, fps, stats
+
+
+def _decode_frames(
+    cap: cv2.VideoCapture,
+    frame_num: int,
+    end_frame: int | None,
+    step: int,
+    max_inference_size: int,
+    free: queue.Queue,
+    ready: queue.Queue,
+    stop: threading.Event,
+    stats: dict,
+) -> None:
+    """Decoder thread: put (frame_num, rgb) items on `ready`, then None (or the exception raised)."""
+    try:
+        while (end_frame is None or frame_num < end_frame) and not stop.is_set():
+            t0 = time.perf_counter()
+            # Sampled on absolute frame numbers so parallel chunks line up;
+            # skipped frames are only grabbed, never decoded into an image
+            if not cap.grab():
+                break
+            stats["frames_decoded"] += 1
+            if frame_num % step:
+                stats["decode_s"] += time.perf_counter() - t0
+                frame_num += 1
+                continue
+            ret, frame = cap.retrieve()
+            t1 = time.perf_counter()
+            stats["decode_s"] += t1 - t0
             if not ret:
                 break
 
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
-            timestamp_ms = int(frame_num * 1000 / fps)
+            buf = free.get()
+            if stop.is_set():
+                break
+            t2 = time.perf_counter()
+            frame = _fit_inference_size(frame, max_inference_size)
+            if buf is None or buf.shape != frame.shape:
+                buf = np.empty_like(frame)
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buf)
+            stats["convert_s"] += time.perf_counter() - t2
+            ready.put((frame_num, buf))
+            frame_num += 1
+    except Exception as e:
+        ready.put(e)
+    finally:
+        ready.put(None)
+
 
-            result = landmarker.detect_for_video(mp_image, timestamp_ms)
+def with_throughput(stats: dict) -> dict:
+    """Add `<stage>_fps` (frames per busy second) for each timed pipeline stage."""
+    stats = {name: round(value, 4) if isinstance(value, float) else value for name, value in stats.items()}
+    for stage, frames in _STAGE_FRAMES.items():
+        seconds = stats.get(f"{stage}_s", 0.0)
+        stats[f"{stage}_fps"] = round(stats.get(frames, 0) / seconds, 1) if seconds > 0 else 0.0
+    return stats
 
-            if result.pose_landmarks and len(result.pose_landmarks) > 0:
-                raw = result.pose_landmarks[0]  # first person
-                landmarks = _normalize_landmarks(raw)
-                frame_poses.append(
-                    FramePose(
-                        frame_num=frame_num,
-                        timestamp=frame_num / fps,
-                        landmarks=landmarks,
-                    )
-                )
 
-            frame_num += 1
+def merge_stats(parts: list[dict]) -> dict:
+    """Combine the stats of extraction chunks that ran in parallel."""
+    merged = {"cache_hit": False, "chunks": len(parts)}
+    for part in parts:
+        for name, value in part.items():
+            if name.endswith("_fps") or isinstance(value, bool):
+                continue
+            if name == "wall_s":
+                merged[name] = max(merged.get(name, 0.0), value)
+            else:
+                merged[name] = merged.get(name, 0) + value
+    return with_throughput(merged)
 
-    cap.release()
-    return frame_poses, fps
+
+def detect_pose(landmarker, frame: np.ndarray, timestamp_ms: int, max_inference_size: int = 0) -> np.ndarray | None:
+    """[33, 4] landmarks of the first person in one BGR frame of a live stream, or None.
+
+    `landmarker` is a WarmLandmarker from landmarker_pool, held for the whole
+    stream; timestamps must increase from frame to frame.
+    """
+    rgb = cv2.cvtColor(_fit_inference_size(frame, max_inference_size), cv2.COLOR_BGR2RGB)
+    result = landmarker.detect_for_video(mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb), timestamp_ms)
+    if not result.pose_landmarks:
+        return None
+    return _landmarks_to_array(result.pose_landmarks[0])
+
+
+def _fit_inference_size(frame: np.ndarray, max_size: int) -> np.ndarray:
+    """Downscale a frame so its longest side is at most max_size (0 = unchanged)."""
+    height, width = frame.shape[:2]
+    longest = max(height, width)
+    if max_size <= 0 or longest <= max_size:
+        return frame
+    scale = max_size / longest
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
 
 
-def _normalize_landmarks(raw_landmarks) -> list[Landmark]:
-    """Normalize landmarks relative to the hip midpoint."""
+def _landmarks_to_array(raw_landmarks) -> np.ndarray:
+    """Pack one frame of MediaPipe landmarks into a [33, 4] float32 array."""
     # MediaPipe Tasks API: landmarks are NormalizedLandmark with x, y, z, visibility
-    left_hip_idx = 23
-    right_hip_idx = 24
-    left_hip = raw_landmarks[left_hip_idx]
-    right_hip = raw_landmarks[right_hip_idx]
-    # mid_x = (left_hip.x + right_hip.x) / 2
-    # mid_y = (left_hip.y + right_hip.y) / 2
-    # mid_z = (left_hip.z + right_hip.z) / 2
-
-    landmarks = []
-    for lm in raw_landmarks:
-        landmarks.append(
-            Landmark(
-                # x=lm.x - mid_x,
-                # y=lm.y - mid_y,
-                # z=lm.z - mid_z,
-                x=lm.x,
-                y=lm.y,
-                z=lm.z,
-                visibility=getattr(lm, 'visibility', 1.0) or 1.0,
-            )
-        )
-    return landmarks
+    # (positions are kept in image space; hip-centering happens in the comparator)
+    out = np.empty((NUM_LANDMARKS, 4), dtype=np.float32)
+    for i, lm in enumerate(raw_landmarks):
+        out[i] = (lm.x, lm.y, lm.z, getattr(lm, 'visibility', 1.0) or 1.0)
+    return out
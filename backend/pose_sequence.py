@@ -0,0 +1,83 @@
+import numpy as np
+from models import FramePose, Landmark
+
+NUM_LANDMARKS = 33
+
+
+class PoseSequence:
+    """Compact pose track for one video.
+
+    Landmarks are kept in a single contiguous float32 array of shape
+    [frames, 33, 4] holding (x, y, z, visibility), alongside the source
+    frame number and timestamp (seconds) of every detected frame. The
+    pydantic FramePose/Landmark models are only built on request at the
+    API boundary.
+    """
+
+    __slots__ = ("landmarks", "frame_nums", "timestamps")
+
+    def __init__(self, landmarks: np.ndarray, frame_nums: np.ndarray, timestamps: np.ndarray):
+        landmarks = np.ascontiguousarray(landmarks, dtype=np.float32)
+        if landmarks.ndim != 3 or landmarks.shape[1:] != (NUM_LANDMARKS, 4):
+            raise ValueError(f"Expected landmarks of shape [frames, {NUM_LANDMARKS}, 4], got {landmarks.shape}")
+        frame_nums = np.ascontiguousarray(frame_nums, dtype=np.int64)
+        timestamps = np.ascontiguousarray(timestamps, dtype=np.float64)
+        if not (len(frame_nums) == len(timestamps) == len(landmarks)):
+            raise ValueError("landmarks, frame_nums and timestamps must have the same length")
+        self.landmarks = landmarks
+        self.frame_nums = frame_nums
+        self.timestamps = timestamps
+
+    def __len__(self) -> int:
+        return len(self.landmarks)
+
+    @classmethod
+    def empty(cls) -> "PoseSequence":
+        return cls(
+            np.empty((0, NUM_LANDMARKS, 4), dtype=np.float32),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float64),
+        )
+
+    @classmethod
+    def concatenate(cls, sequences: list["PoseSequence"]) -> "PoseSequence":
+        """Join sequences covering consecutive frame ranges into one."""
+        sequences = [seq for seq in sequences if len(seq)]
+        if not sequences:
+            return cls.empty()
+        return cls(
+            np.concatenate([seq.landmarks for seq in sequences]),
+            np.concatenate([seq.frame_nums for seq in sequences]),
+            np.concatenate([seq.timestamps for seq in sequences]),
+        )
+
+    @classmethod
+    def from_frame_poses(cls, frame_poses: list[FramePose]) -> "PoseSequence":
+        if not frame_poses:
+            return cls.empty()
+        landmarks = np.array(
+            [[[lm.x, lm.y, lm.z, lm.visibility] for lm in fp.landmarks] for fp in frame_poses],
+            dtype=np.float32,
+        )
+        frame_nums = np.array([fp.frame_num for fp in frame_poses])
+        timestamps = np.array([fp.timestamp for fp in frame_poses])
+        return cls(landmarks, frame_nums, timestamps)
+
+    def to_frame_poses(self) -> list[FramePose]:
+        return [
+            FramePose(
+                frame_num=int(fn),
+                timestamp=float(ts),
+                landmarks=[Landmark(x=x, y=y, z=z, visibility=v) for x, y, z, v in frame],
+            )
+            for fn, ts, frame in zip(self.frame_nums, self.timestamps, self.landmarks.tolist())
+        ]
+
+    @property
+    def duration(self) -> float:
+        """Timestamp of the last detected frame (0 for an empty sequence)."""
+        return float(self.timestamps[-1]) if len(self) else 0.0
+
+    def keypoints(self) -> list[list[list[float]]]:
+        """[frame][landmark][x,y,z] nested lists for JSON transfer."""
+        return self.landmarks[:, :, :3].tolist()
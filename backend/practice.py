@@ -0,0 +1,136 @@
+import json
+import os
+import struct
+import threading
+from contextlib import ExitStack
+
+import cv2
+import numpy as np
+
+from alignment import OnlineAligner
+from comparator import build_features, score_frame_pair
+from pose_extractor import detect_pose, landmarker_pool, resolve_sampling
+from pose_sequence import NUM_LANDMARKS, PoseSequence
+from reference_library import reference_library
+
+# Live practice over /api/practice/{reference_id}: every incoming frame is
+# aligned against the reference with an online DTW and scored on its own.
+#
+# Messages from the client are either
+#   binary: float64 LE timestamp (seconds) followed by an encoded image (JPEG, PNG, ...)
+#   text:   {"timestamp": seconds, "landmarks": [[x, y, z(, visibility)] * 33] or null}
+# for frames whose landmarks were already detected on the client.
+
+# Concurrent sessions per API process (0 disables practice); each holds a landmarker
+MAX_PRACTICE_SESSIONS = int(os.environ.get("DANCE_PRACTICE_SESSIONS", "4"))
+# Frames that would be answered later than this are skipped instead of scored
+PRACTICE_LATENCY_MS = float(os.environ.get("DANCE_PRACTICE_LATENCY_MS", "250"))
+# Reference seconds the online DTW searches on either side of the position reached
+PRACTICE_SEARCH_SECONDS = 3.0
+
+_session_slots = threading.BoundedSemaphore(MAX_PRACTICE_SESSIONS) if MAX_PRACTICE_SESSIONS > 0 else None
+
+
+class TooManySessions(Exception):
+    pass
+
+
+def parse_message(message: dict) -> tuple[float, bytes | None, np.ndarray | None]:
+    """(timestamp, image, landmarks) of a WebSocket message; raises ValueError if malformed.
+
+    Exactly one of image / landmarks is set, except for a landmarks message
+    reporting no person (both None).
+    """
+    if message.get("bytes") is not None:
+        data = message["bytes"]
+        if len(data) <= 8:
+            raise ValueError("Binary frames are a float64 timestamp followed by an image")
+        (timestamp,) = struct.unpack_from("<d", data)
+        return timestamp, data[8:], None
+    try:
+        frame = json.loads(message.get("text") or "")
+        timestamp = float(frame["timestamp"])
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Text frames must be JSON with a numeric 'timestamp'")
+    if frame.get("landmarks") is None:
+        return timestamp, None, None
+    try:
+        landmarks = np.array(frame["landmarks"], dtype=np.float32)
+    except (ValueError, TypeError):
+        raise ValueError("landmarks must be a list of numbers per landmark")
+    if landmarks.shape not in ((NUM_LANDMARKS, 3), (NUM_LANDMARKS, 4)):
+        raise ValueError(f"landmarks must be {NUM_LANDMARKS} [x, y, z(, visibility)] lists")
+    if landmarks.shape[1] == 3:
+        landmarks = np.hstack([landmarks, np.ones((NUM_LANDMARKS, 1), dtype=np.float32)])
+    return timestamp, None, landmarks
+
+
+class PracticeSession:
+    """One live pose stream scored against a ready library reference.
+
+    Methods must not be called concurrently. Images go through a VIDEO-mode
+    landmarker held for the whole session, so tracking carries over from
+    frame to frame. Raises KeyError if the reference is not ready and
+    TooManySessions when MAX_PRACTICE_SESSIONS are open.
+    """
+
+    def __init__(self, reference_id: str):
+        if _session_slots is None or not _session_slots.acquire(blocking=False):
+            raise TooManySessions("Too many practice sessions, try again later")
+        self._resources = ExitStack()
+        self._resources.callback(_session_slots.release)
+        try:
+            ref_poses, ref_fps, self._ref_feat = reference_library.load(reference_id)
+        except BaseException:
+            self._resources.close()
+            raise
+        self._ref_ts = ref_poses.timestamps
+        # Only the position is used, never the path, so no step history is kept
+        # and memory stays constant however long the session runs
+        self._aligner = OnlineAligner(
+            self._ref_feat.angles, max(1.0, PRACTICE_SEARCH_SECONDS * ref_fps), history=1
+        )
+        self._inference_size = resolve_sampling()["max_inference_size"]
+        self._landmarker = None
+        self._last_ms = -1
+        self._prev: np.ndarray | None = None  # Landmarks of the previous scored frame
+
+    def process(self, timestamp: float, image: bytes | None = None, landmarks: np.ndarray | None = None) -> dict:
+        """Detect (for an image), align and score one frame.
+
+        Returns {timestamp, detected} plus, for a detected pose, the matched
+        reference frame and time, 'score' and 'joints' (see score_frame_pair).
+        """
+        if image is not None:
+            landmarks = self._detect(image, timestamp)
+        reply = {"timestamp": timestamp, "detected": landmarks is not None}
+        if landmarks is None:
+            return reply
+
+        # The previous frame gives the motion feature
+        frames = landmarks[None] if self._prev is None else np.stack([self._prev, landmarks])
+        self._prev = landmarks
+        nums = np.arange(len(frames))
+        feat = build_features(PoseSequence(frames, nums, nums.astype(np.float64)))
+        self._aligner.extend(feat.angles[-1:])
+        ref_frame = self._aligner.position
+        reply.update(
+            ref_frame=ref_frame,
+            ref_time=round(float(self._ref_ts[ref_frame]), 3),
+            **score_frame_pair(self._ref_feat, feat, ref_frame, len(frames) - 1),
+        )
+        return reply
+
+    def _detect(self, image: bytes, timestamp: float) -> np.ndarray | None:
+        frame = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("Cannot decode frame image")
+        if self._landmarker is None:
+            self._landmarker = self._resources.enter_context(landmarker_pool.acquire())
+        # VIDEO mode needs strictly increasing timestamps
+        self._last_ms = max(int(timestamp * 1000), self._last_ms + 1)
+        return detect_pose(self._landmarker, frame, self._last_ms, self._inference_size)
+
+    def close(self) -> None:
+        """Return the landmarker to the pool and free the session slot."""
+        self._resources.close()
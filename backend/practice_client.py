@@ -0,0 +1,88 @@
+"""Stand-in practice client: plays a recorded video into /api/practice in real time.
+
+Frames are sent as JPEG at the video's own pace, like a webcam would, and
+every reply is printed as one line; a latency and score summary follows:
+
+    python practice_client.py attempt.mp4 <reference_id> [--url ws://localhost:8000] [--fps 15]
+"""
+import argparse
+import json
+import struct
+import threading
+import time
+
+import cv2
+from websockets.exceptions import ConnectionClosed, ConnectionClosedError
+from websockets.sync.client import connect
+
+
+def send_frames(ws, video_path: str, fps: float, max_size: int) -> None:
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"Cannot open video: {video_path}")
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    step = max(1, round(source_fps / fps)) if fps > 0 else 1
+    started = time.monotonic()
+    frame_num = 0
+    try:
+        while cap.grab():
+            if frame_num % step == 0:
+                ok, frame = cap.retrieve()
+                if not ok:
+                    break
+                longest = max(frame.shape[:2])
+                if 0 < max_size < longest:
+                    frame = cv2.resize(frame, None, fx=max_size / longest, fy=max_size / longest, interpolation=cv2.INTER_AREA)
+                timestamp = frame_num / source_fps
+                # Real-time pace: a frame is not sent before its time in the video
+                time.sleep(max(0.0, started + timestamp - time.monotonic()))
+                jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+                ws.send(struct.pack("<d", timestamp) + jpeg)
+            frame_num += 1
+    except ConnectionClosed:
+        return
+    finally:
+        cap.release()
+        # Let the last replies arrive before closing
+        time.sleep(1.0)
+        ws.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video")
+    parser.add_argument("reference_id")
+    parser.add_argument("--url", default="ws://localhost:8000")
+    parser.add_argument("--fps", type=float, default=15.0, help="frames sent per second of video (0 = all)")
+    parser.add_argument("--max-size", type=int, default=640, help="longest side of sent frames in pixels (0 = unchanged)")
+    args = parser.parse_args()
+
+    scored = []
+    skipped = 0
+    with connect(f"{args.url}/api/practice/{args.reference_id}", max_size=None) as ws:
+        sender = threading.Thread(target=send_frames, args=(ws, args.video, args.fps, args.max_size), daemon=True)
+        sender.start()
+        try:
+            for message in ws:
+                reply = json.loads(message)
+                print(json.dumps(reply))
+                if reply.get("skipped"):
+                    skipped += 1
+                elif "latency_ms" in reply and reply.get("detected"):
+                    scored.append(reply)
+        except ConnectionClosedError as e:
+            print(f"Connection closed: {e}")
+
+    if scored:
+        latencies = sorted(r["latency_ms"] for r in scored)
+        print(
+            f"{len(scored)} frames scored, {skipped} skipped; "
+            f"latency median {latencies[len(latencies) // 2]:.1f} ms, max {latencies[-1]:.1f} ms; "
+            f"mean score {sum(r['score'] for r in scored) / len(scored):.1f}"
+        )
+    else:
+        print(f"No frames scored ({skipped} skipped)")
+
+
+if __name__ == "__main__":
+    main()
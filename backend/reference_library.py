@@ -0,0 +1,170 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+from comparator import SequenceFeatures, build_features
+from pose_sequence import PoseSequence
+
+REFERENCE_DIR = os.environ.get(
+    "DANCE_REFERENCE_DIR", os.path.join(os.path.dirname(__file__), "references")
+)
+
+# Loaded references kept in memory for repeat comparisons. Other processes
+# share the directory, so entries are checked against poses.npz before use.
+_MAX_LOADED = 8
+
+
+class ReferenceLibrary:
+    """Persistent store of registered reference videos.
+
+    Each reference lives in its own directory holding the uploaded video,
+    `meta.json` and, once extraction finishes, `poses.npz` with the pose
+    arrays plus the comparator's precomputed feature arrays, so attempts
+    compared against it skip both extraction and feature building.
+    """
+
+    def __init__(self, directory: str = REFERENCE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # ref_id -> ((inode, mtime, size) of poses.npz when loaded, (poses, fps, features))
+        self._loaded: dict[str, tuple[tuple[int, int, int], tuple[PoseSequence, float, SequenceFeatures]]] = {}
+
+    def _ref_dir(self, ref_id: str) -> str:
+        # Only accept canonical UUIDs so ids can never escape the library directory
+        try:
+            ref_id = str(uuid.UUID(ref_id))
+        except ValueError:
+            raise KeyError(ref_id)
+        return os.path.join(self.directory, ref_id)
+
+    def _write_meta(self, ref_id: str, meta: dict) -> None:
+        ref_dir = self._ref_dir(ref_id)
+        fd, tmp_path = tempfile.mkstemp(dir=ref_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(ref_dir, "meta.json"))
+
+    def create(self, name: str, filename: str) -> dict:
+        """Register a new reference in `processing` state; the caller writes the video to video_path()."""
+        ref_id = str(uuid.uuid4())
+        os.makedirs(self._ref_dir(ref_id))
+        meta = {
+            "reference_id": ref_id,
+            "name": name or filename,
+            "filename": filename,
+            "status": "processing",
+            "message": "Extracting poses...",
+            "created_at": time.time(),
+            "frame_count": 0,
+            "fps": 0.0,
+            "duration": 0.0,
+        }
+        self._write_meta(ref_id, meta)
+        return meta
+
+    def video_path(self, ref_id: str) -> str:
+        return os.path.join(self._ref_dir(ref_id), "video")
+
+    def get(self, ref_id: str) -> dict | None:
+        try:
+            with open(os.path.join(self._ref_dir(ref_id), "meta.json")) as f:
+                return json.load(f)
+        except (KeyError, OSError, ValueError):
+            return None
+
+    def list(self) -> list[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        metas = [self.get(name) for name in os.listdir(self.directory)]
+        return sorted((m for m in metas if m is not None), key=lambda m: m["created_at"])
+
+    def complete(self, ref_id: str, poses: PoseSequence, fps: float) -> dict:
+        """Persist extracted poses and their precomputed features and mark the reference ready."""
+        features = build_features(poses)
+        ref_dir = self._ref_dir(ref_id)
+        fd, tmp_path = tempfile.mkstemp(dir=ref_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f,
+                landmarks=poses.landmarks,
+                frame_nums=poses.frame_nums,
+                timestamps=poses.timestamps,
+                fps=np.float64(fps),
+                angles=features.angles,
+                positions=features.positions,
+                spine_angles=features.spine_angles,
+                motion=features.motion,
+            )
+        os.replace(tmp_path, os.path.join(ref_dir, "poses.npz"))
+
+        meta = self.get(ref_id)
+        meta.update(
+            status="ready",
+            message="",
+            frame_count=len(poses),
+            fps=fps,
+            duration=poses.duration,
+        )
+        self._write_meta(ref_id, meta)
+        return meta
+
+    def fail(self, ref_id: str, message: str) -> None:
+        meta = self.get(ref_id)
+        if meta is not None:
+            meta.update(status="error", message=message)
+            self._write_meta(ref_id, meta)
+
+    def load(self, ref_id: str) -> tuple[PoseSequence, float, SequenceFeatures]:
+        """Return (poses, fps, features) for a ready reference. Raises KeyError if unavailable."""
+        path = os.path.join(self._ref_dir(ref_id), "poses.npz")
+        try:
+            # Another process may have deleted or re-registered it since it was cached
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._loaded.pop(ref_id, None)
+            raise KeyError(ref_id)
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._loaded.get(ref_id)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+        try:
+            data = np.load(path, allow_pickle=False)
+        except OSError:
+            raise KeyError(ref_id)
+        with data:
+            poses = PoseSequence(data["landmarks"], data["frame_nums"], data["timestamps"])
+            fps = float(data["fps"])
+            features = SequenceFeatures(
+                angles=data["angles"],
+                positions=data["positions"],
+                spine_angles=data["spine_angles"],
+                motion=data["motion"],
+            )
+        with self._lock:
+            self._loaded.pop(ref_id, None)
+            self._loaded[ref_id] = (stamp, (poses, fps, features))
+            while len(self._loaded) > _MAX_LOADED:
+                self._loaded.pop(next(iter(self._loaded)))
+        return poses, fps, features
+
+    def delete(self, ref_id: str) -> bool:
+        try:
+            ref_dir = self._ref_dir(ref_id)
+        except KeyError:
+            return False
+        with self._lock:
+            self._loaded.pop(ref_id, None)
+        if not os.path.isdir(ref_dir):
+            return False
+        shutil.rmtree(ref_dir, ignore_errors=True)
+        return True
+
+
+reference_library = ReferenceLibrary()
@@ -0,0 +1,67 @@
+import json
+import struct
+
+import numpy as np
+
+# Served by the /api/results endpoints to clients that send this in their Accept header
+RESULTS_MEDIA_TYPE = "application/vnd.dancecompare.results"
+
+_MAGIC = b"DCR1"
+_ALIGN = 8
+
+
+def encode_binary(fields: dict, arrays: dict[str, np.ndarray]) -> bytes:
+    """JSON fields plus typed arrays a browser can view without parsing.
+
+    Layout: b"DCR1", uint32 LE header length, UTF-8 JSON header, then the
+    little-endian arrays, each starting on an 8-byte boundary. The header
+    holds `fields` plus `arrays`: name -> {dtype, shape, offset[, scale]},
+    with offsets counted from the first 8-byte boundary after the header.
+
+    Integer arrays are sent as int32. Float arrays (keypoints) are quantized
+    to int16 with one scale per array, to be multiplied back on decoding;
+    the error of at most max|x| / 65534 is far below a pixel.
+    """
+    header = dict(fields, arrays={})
+    buffers = []
+    offset = 0
+    for name, values in arrays.items():
+        spec = {"shape": list(values.shape), "offset": offset}
+        if np.issubdtype(values.dtype, np.floating):
+            peak = float(np.abs(values).max()) if values.size else 0.0
+            spec["dtype"] = "int16"
+            spec["scale"] = peak / np.iinfo(np.int16).max if peak > 0 else 1.0
+            buffer = np.round(values / spec["scale"]).astype("<i2").tobytes()
+        else:
+            spec["dtype"] = "int32"
+            buffer = values.astype("<i4").tobytes()
+        buffers.append(buffer)
+        header["arrays"][name] = spec
+        offset = _aligned(offset + len(buffer))
+
+    encoded = json.dumps(header).encode()
+    out = bytearray(_MAGIC + struct.pack("<I", len(encoded)) + encoded)
+    base = _aligned(len(out))
+    for spec, buffer in zip(header["arrays"].values(), buffers):
+        out.extend(b"\0" * (base + spec["offset"] - len(out)))
+        out.extend(buffer)
+    return bytes(out)
+
+
+def decode_binary(blob: bytes) -> tuple[dict, dict[str, np.ndarray]]:
+    if blob[:4] != _MAGIC:
+        raise ValueError("Not a binary results payload")
+    (header_len,) = struct.unpack_from("<I", blob, 4)
+    fields = json.loads(blob[8:8 + header_len])
+    base = _aligned(8 + header_len)
+    arrays = {}
+    for name, spec in fields.pop("arrays").items():
+        dtype = np.dtype("<i2" if spec["dtype"] == "int16" else "<i4")
+        count = int(np.prod(spec["shape"]))
+        values = np.frombuffer(blob, dtype=dtype, count=count, offset=base + spec["offset"]).reshape(spec["shape"])
+        arrays[name] = values * np.float32(spec["scale"]) if "scale" in spec else values
+    return fields, arrays
+
+
+def _aligned(n: int) -> int:
+    return -(-n // _ALIGN) * _ALIGN
@@ -0,0 +1,174 @@
+import numpy as np
+import pytest
+from dtw import dtw
+
+import alignment
+from alignment import ALIGNMENT_METHODS, DEFAULT_SAKOE_CHIBA_WINDOW, OnlineAligner, align_sequences
+
+
+def warped_pair(n: int, m: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Smooth 24-dim feature sequences, the second a time-warped, noised copy of the first."""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 6, n)[:, None]
+    warped = (np.linspace(0, 1, m) ** 1.2 * 6)[:, None]
+    ref = np.hstack([np.sin(t * k) for k in range(1, 25)]) + 1.2
+    user = np.hstack([np.sin(warped * k) for k in range(1, 25)]) + 1.2 + rng.normal(0, 0.05, (m, 24))
+    return ref, user
+
+
+def path_cost(ref: np.ndarray, user: np.ndarray, ref_idx: np.ndarray, user_idx: np.ndarray) -> float:
+    """symmetric2 cost of a path under cosine distance: diagonal steps count twice."""
+    unit_ref = ref / np.linalg.norm(ref, axis=1, keepdims=True)
+    unit_user = user / np.linalg.norm(user, axis=1, keepdims=True)
+    cost = 1 - np.sum(unit_ref[ref_idx] * unit_user[user_idx], axis=1)
+    weights = np.ones(len(ref_idx))
+    weights[1:][(np.diff(ref_idx) == 1) & (np.diff(user_idx) == 1)] = 2
+    return float(np.sum(cost * weights))
+
+
+def assert_valid_path(ref_idx: np.ndarray, user_idx: np.ndarray, n: int, m: int) -> None:
+    assert (ref_idx[0], user_idx[0]) == (0, 0)
+    assert (ref_idx[-1], user_idx[-1]) == (n - 1, m - 1)
+    steps = np.stack([np.diff(ref_idx), np.diff(user_idx)], axis=1)
+    assert np.isin(steps, (0, 1)).all()
+    assert (steps.sum(axis=1) >= 1).all()
+
+
+def test_path_cost_matches_dtw_python():
+    ref, user = warped_pair(120, 90)
+    reference = dtw(ref, user, dist_method="cosine")
+    assert path_cost(ref, user, reference.index1, reference.index2) == pytest.approx(reference.distance)
+
+
+def test_full_is_dtw_python():
+    ref, user = warped_pair(120, 90)
+    reference = dtw(ref, user, dist_method="cosine")
+    ref_idx, user_idx = align_sequences(ref, user, method="full")
+    np.testing.assert_array_equal(ref_idx, reference.index1)
+    np.testing.assert_array_equal(user_idx, reference.index2)
+
+
+@pytest.mark.parametrize("n, m", [(1, 1), (1, 7), (7, 1), (150, 110), (110, 150)])
+def test_unbounded_band_gives_the_optimal_cost(n, m):
+    ref, user = warped_pair(n, m)
+    optimal = dtw(ref, user, dist_method="cosine").distance
+    ref_idx, user_idx = align_sequences(ref, user, method="sakoe_chiba", window=max(n, m))
+    assert_valid_path(ref_idx, user_idx, n, m)
+    assert path_cost(ref, user, ref_idx, user_idx) == pytest.approx(optimal)
+
+
+@pytest.mark.parametrize("method", ["sakoe_chiba", "itakura", "multiscale"])
+@pytest.mark.parametrize("n, m", [(300, 260), (260, 300)])
+def test_constrained_engines_stay_near_the_optimum(method, n, m):
+    ref, user = warped_pair(n, m)
+    optimal = dtw(ref, user, dist_method="cosine").distance
+    ref_idx, user_idx = align_sequences(ref, user, method=method)
+    assert_valid_path(ref_idx, user_idx, n, m)
+    cost = path_cost(ref, user, ref_idx, user_idx)
+    assert optimal - 1e-9 <= cost <= optimal * 1.05 + 1e-9
+
+
+@pytest.mark.parametrize("method", ALIGNMENT_METHODS)
+@pytest.mark.parametrize("n, m", [(1, 1), (2, 40), (40, 2), (90, 70)])
+def test_every_engine_returns_a_complete_path(method, n, m):
+    ref, user = warped_pair(n, m)
+    ref_idx, user_idx = align_sequences(ref, user, method=method)
+    assert_valid_path(ref_idx, user_idx, n, m)
+
+
+def test_auto_switches_to_multiscale_for_large_matrices(monkeypatch):
+    ref, user = warped_pair(200, 180)
+    monkeypatch.setattr(alignment, "AUTO_FULL_MAX_CELLS", 100)
+    np.testing.assert_array_equal(
+        np.stack(align_sequences(ref, user, method="auto")),
+        np.stack(align_sequences(ref, user, method="multiscale")),
+    )
+
+
+def test_invalid_input():
+    ref, user = warped_pair(10, 10)
+    with pytest.raises(ValueError, match="Unknown alignment method"):
+        align_sequences(ref, user, method="nope")
+    with pytest.raises(ValueError, match="empty"):
+        align_sequences(ref[:0], user)
+    assert "auto" in ALIGNMENT_METHODS
+
+
+@pytest.mark.parametrize("n, m", [(1, 1), (1, 6), (6, 1), (120, 90), (90, 120)])
+def test_online_aligner_with_an_unbounded_window_is_full_dtw(n, m):
+    ref, user = warped_pair(n, m)
+    aligner = OnlineAligner(ref, window=n)
+    aligner.extend(user)
+    ref_idx, user_idx = aligner.path()
+    assert_valid_path(ref_idx, user_idx, n, m)
+    assert path_cost(ref, user, ref_idx, user_idx) == pytest.approx(dtw(ref, user, dist_method="cosine").distance)
+
+
+def test_online_aligner_batches_do_not_change_the_alignment():
+    ref, user = warped_pair(200, 170)
+    whole = OnlineAligner(ref)
+    whole.extend(user)
+    batched = OnlineAligner(ref)
+    for chunk in np.array_split(user, [1, 2, 30, 31, 100]):
+        batched.extend(chunk)
+    assert len(batched) == len(user)
+    assert batched.position == whole.position
+    np.testing.assert_array_equal(np.stack(batched.path()), np.stack(whole.path()))
+
+
+def test_online_aligner_default_window_stays_near_the_optimum():
+    n, m = 600, 520
+    ref, user = warped_pair(n, m)
+    aligner = OnlineAligner(ref)
+    aligner.extend(user)
+    # Each column covers a band around the position, not the whole reference
+    assert max(len(step) for step in aligner._steps) < n * DEFAULT_SAKOE_CHIBA_WINDOW * 4
+    ref_idx, user_idx = aligner.path()
+    assert_valid_path(ref_idx, user_idx, n, m)
+    optimal = dtw(ref, user, dist_method="cosine").distance
+    assert optimal - 1e-9 <= path_cost(ref, user, ref_idx, user_idx) <= optimal * 1.05
+
+
+def test_online_aligner_tracks_a_partial_attempt():
+    ref, _ = warped_pair(300, 300)
+    aligner = OnlineAligner(ref)
+    aligner.extend(ref[:150])
+    assert abs(aligner.position - 149) <= 2
+    ref_idx, user_idx = aligner.path(open_end=True)
+    assert (ref_idx[0], user_idx[0]) == (0, 0)
+    assert (ref_idx[-1], user_idx[-1]) == (aligner.position, 149)
+
+    tail_ref, tail_user = aligner.path(open_end=True, start=100)
+    keep = user_idx >= 100
+    np.testing.assert_array_equal(tail_ref, ref_idx[keep])
+    np.testing.assert_array_equal(tail_user, user_idx[keep])
+
+
+def test_online_aligner_history_bounds_memory_without_changing_positions():
+    ref, user = warped_pair(300, 280)
+    full = OnlineAligner(ref)
+    bounded = OnlineAligner(ref, history=20)
+    for frame in user:
+        full.extend(frame[None])
+        bounded.extend(frame[None])
+        assert bounded.position == full.position
+        assert len(bounded._steps) < 40
+    assert len(bounded) == len(user)
+
+    # Only the kept columns can be backtracked
+    tail_ref, tail_user = bounded.path(open_end=True)
+    full_ref, full_user = full.path(open_end=True)
+    keep = full_user >= tail_user[0]
+    assert tail_user[0] >= len(user) - 40
+    np.testing.assert_array_equal(tail_ref, full_ref[keep])
+    np.testing.assert_array_equal(tail_user, full_user[keep])
+
+
+def test_online_aligner_needs_frames():
+    ref, _ = warped_pair(10, 10)
+    with pytest.raises(ValueError):
+        OnlineAligner(ref[:0])
+    with pytest.raises(ValueError):
+        OnlineAligner(ref).path()
+    with pytest.raises(ValueError):
+        OnlineAligner(ref, history=0)
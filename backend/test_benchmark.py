@@ -0,0 +1,47 @@
+from benchmark import check
+
+BASELINE = {
+    "compare/auto/1000": {
+        "wall_s": 1.0,
+        "peak_rss_mb": 100.0,
+        "stages": {"alignment": 0.5, "scoring": 0.2, "moments": 0.01},
+    },
+}
+
+
+def run(wall_s=1.0, peak_rss_mb=100.0, **stages):
+    return {"wall_s": wall_s, "peak_rss_mb": peak_rss_mb, "stages": {"alignment": 0.5, "scoring": 0.2, **stages}}
+
+
+def test_within_tolerance_passes():
+    assert check({"compare/auto/1000": run(wall_s=1.2, peak_rss_mb=120.0, alignment=0.6)}, BASELINE, 0.25) == []
+
+
+def test_wall_time_and_memory_regressions():
+    failures = check({"compare/auto/1000": run(wall_s=1.3, peak_rss_mb=130.0)}, BASELINE, 0.25)
+    assert len(failures) == 2
+    assert failures[0].startswith("compare/auto/1000: wall_s 1.3 > 1.0")
+    assert failures[1].startswith("compare/auto/1000: peak_rss_mb 130.0 > 100.0")
+
+
+def test_stage_regression():
+    failures = check({"compare/auto/1000": run(scoring=0.3)}, BASELINE, 0.25)
+    assert failures == ["compare/auto/1000: stage scoring 0.3 > 0.2 (+25%)"]
+
+
+def test_short_stages_are_not_checked():
+    assert check({"compare/auto/1000": run(moments=0.04)}, BASELINE, 0.25) == []
+
+
+def test_missing_stage():
+    result = run()
+    del result["stages"]["alignment"]
+    assert check({"compare/auto/1000": result}, BASELINE, 0.25) == ["compare/auto/1000: stage alignment missing"]
+
+
+def test_new_and_failed_cases_are_skipped():
+    results = {
+        "compare/auto/1000": {"error": "RuntimeError: boom"},
+        "compare/auto/2000": run(wall_s=100.0),
+    }
+    assert check(results, BASELINE, 0.25) == []
@@ -0,0 +1,247 @@
+import numpy as np
+import pytest
+
+from comparator import (
+    ANGLE_JOINTS,
+    ANGLE_WEIGHTS,
+    MOTION_LANDMARKS,
+    POS_LANDMARKS,
+    POS_WEIGHTS,
+    SCORE_WEIGHTS,
+    _JOINT_COLUMNS,
+    _JOINT_NAMES,
+    _NAME_TO_IDX,
+    _find_problem_joints,
+    _find_worst_moments,
+    _score_path,
+    build_features,
+)
+from pose_sequence import NUM_LANDMARKS, PoseSequence
+
+# Per-frame reference implementation of the features and scores, kept as
+# the original loops so the vectorized comparator can be checked against it
+
+
+def _point(frame, name):
+    return frame[_NAME_TO_IDX[name], :3]
+
+
+def loop_angle_vector(frame):
+    angles = []
+    for parent, joint, child in ANGLE_JOINTS:
+        ba = _point(frame, parent) - _point(frame, joint)
+        bc = _point(frame, child) - _point(frame, joint)
+        cos_angle = np.clip(np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc) + 1e-8), -1, 1)
+        angles.extend([cos_angle, np.sqrt(1 - cos_angle ** 2)])
+    return np.array(angles)
+
+
+def loop_normalized_positions(frame):
+    hip_center = (_point(frame, "LEFT_HIP") + _point(frame, "RIGHT_HIP")) / 2
+    shoulder_center = (_point(frame, "LEFT_SHOULDER") + _point(frame, "RIGHT_SHOULDER")) / 2
+    torso_size = np.linalg.norm(shoulder_center - hip_center) + 1e-8
+    return np.stack([(_point(frame, name) - hip_center) / torso_size for name in POS_LANDMARKS])
+
+
+def loop_spine_angle(frame):
+    shoulder = (_point(frame, "LEFT_SHOULDER") + _point(frame, "RIGHT_SHOULDER")) / 2
+    hip = (_point(frame, "LEFT_HIP") + _point(frame, "RIGHT_HIP")) / 2
+    spine_x, spine_y = shoulder[0] - hip[0], shoulder[1] - hip[1]
+    magnitude = np.sqrt(spine_x ** 2 + spine_y ** 2)
+    if magnitude < 1e-6:
+        return 0.0
+    return float(np.degrees(np.arccos(np.clip(-spine_y / magnitude, -1.0, 1.0))))
+
+
+def loop_motion(previous, frame):
+    total = 0.0
+    for name in MOTION_LANDMARKS:
+        (x1, y1), (x2, y2) = _point(previous, name)[:2], _point(frame, name)[:2]
+        total += np.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+    return total / len(MOTION_LANDMARKS)
+
+
+def loop_cosine(a, b):
+    return float(np.clip(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-8), -1, 1))
+
+
+def loop_scores(ref, user, path):
+    """Per-pair scores as computed pair by pair before vectorization."""
+    ref, user = ref.astype(np.float64), user.astype(np.float64)
+    weights = SCORE_WEIGHTS
+    out = {name: [] for name in ("angle_raw", "angle_scaled", "pos_raw", "pos_scaled", "spine_raw", "motion_raw")}
+    joint_scores = []
+    for ri, ui in path:
+        ref_vec = loop_angle_vector(ref[ri]).reshape(-1, 2)
+        user_vec = loop_angle_vector(user[ui]).reshape(-1, 2)
+        sims = np.array([loop_cosine(r, u) for r, u in zip(ref_vec, user_vec)])
+        joint_scores.append([max(0, (sim + 1) / 2) * 100 for sim in sims])
+        angle_raw = np.average(np.clip((sims + 1) / 2, 0, 1), weights=ANGLE_WEIGHTS)
+        out["angle_raw"].append(angle_raw)
+        out["angle_scaled"].append(angle_raw if angle_raw >= 0.94 else angle_raw ** 6)
+
+        errors = np.sum((loop_normalized_positions(ref[ri]) - loop_normalized_positions(user[ui])) ** 2, axis=1)
+        mse = np.average(errors, weights=POS_WEIGHTS)
+        out["pos_raw"].append(mse)
+        with np.errstate(over="ignore"):
+            out["pos_scaled"].append(1 / (1 + np.exp(5 * (mse - 2.5))))
+
+        spine_diff = abs(loop_spine_angle(ref[ri]) - loop_spine_angle(user[ui]))
+        out["spine_raw"].append(1.0 if spine_diff < 1.0 else 1 / (1 + np.exp(0.1 * (spine_diff - 20))))
+
+        if ri > 0 and ui > 0:
+            motion_diff = abs(loop_motion(ref[ri - 1], ref[ri]) - loop_motion(user[ui - 1], user[ui]))
+            with np.errstate(over="ignore"):
+                out["motion_raw"].append(1 / (1 + np.exp(100 * (motion_diff - 0.05))))
+        else:
+            out["motion_raw"].append(1.0)
+
+    if np.mean(out["spine_raw"]) >= 0.70:
+        out["spine_scaled"] = [1.0] * len(path)
+    else:
+        out["spine_scaled"] = [s if s >= 0.85 else s ** 4 for s in out["spine_raw"]]
+    if np.mean(out["motion_raw"]) >= 0.90:
+        out["motion_scaled"] = [1.0] * len(path)
+    else:
+        out["motion_scaled"] = [m if m >= 0.85 else m ** 4 for m in out["motion_raw"]]
+    out["pair_scores"] = [
+        100 * (
+            weights["angle"] * a + weights["position"] * p + weights["spine"] * s + weights["motion"] * m
+        )
+        for a, p, s, m in zip(out["angle_scaled"], out["pos_scaled"], out["spine_scaled"], out["motion_scaled"])
+    ]
+    out["joint_scores"] = joint_scores
+    return {name: np.array(values) for name, values in out.items()}
+
+
+def make_poses(frames: int, seed: int, jitter_of: np.ndarray | None = None) -> np.ndarray:
+    """Random [frames, 33, 4] landmarks (or a jittered copy of `jitter_of`) with some missing landmarks."""
+    rng = np.random.default_rng(seed)
+    if jitter_of is None:
+        landmarks = rng.uniform(0, 1, (frames, NUM_LANDMARKS, 4)).astype(np.float32)
+    else:
+        landmarks = (jitter_of + rng.normal(0, 0.005, jitter_of.shape)).astype(np.float32)
+    # Undetected landmarks: a whole frame, one arm, and a torso collapsed to a point
+    landmarks[2] = 0.0
+    for name in ("LEFT_ELBOW", "LEFT_WRIST", "LEFT_INDEX"):
+        landmarks[4, _NAME_TO_IDX[name]] = 0.0
+    for name in ("LEFT_SHOULDER", "RIGHT_SHOULDER", "LEFT_HIP", "RIGHT_HIP"):
+        landmarks[5, _NAME_TO_IDX[name], :3] = landmarks[5, _NAME_TO_IDX["LEFT_HIP"], :3]
+    return landmarks
+
+
+def sequence(landmarks: np.ndarray) -> PoseSequence:
+    frames = np.arange(len(landmarks))
+    return PoseSequence(landmarks, frames, frames / 30.0)
+
+
+REF = make_poses(10, seed=1)
+PATH = [(0, 0), (1, 0), (2, 1), (2, 2), (3, 3), (4, 4), (5, 5), (6, 5), (7, 6), (8, 7), (8, 8), (9, 9), (9, 10)]
+
+
+def test_features_match_the_per_frame_loops():
+    landmarks = REF.astype(np.float64)
+    features = build_features(sequence(REF))
+    np.testing.assert_allclose(features.angles, [loop_angle_vector(f) for f in landmarks], rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(
+        features.positions, [loop_normalized_positions(f) for f in landmarks], rtol=1e-12, atol=1e-12
+    )
+    np.testing.assert_allclose(features.spine_angles, [loop_spine_angle(f) for f in landmarks], rtol=1e-12)
+    expected_motion = [0.0] + [loop_motion(a, b) for a, b in zip(landmarks, landmarks[1:])]
+    np.testing.assert_allclose(features.motion, expected_motion, rtol=1e-12, atol=1e-15)
+    # The fully missing frame and the collapsed torso have no spine direction
+    assert features.spine_angles[2] == features.spine_angles[5] == 0.0
+
+
+@pytest.mark.parametrize(
+    "user, path",
+    [
+        (make_poses(11, seed=2), PATH),
+        (make_poses(11, seed=3, jitter_of=np.concatenate([REF, REF[-1:]])), PATH),
+        (REF.copy(), [(i, i) for i in range(len(REF))]),
+    ],
+    ids=["different", "close", "same"],
+)
+def test_path_scores_match_the_per_pair_loop(user, path):
+    ref_idx, user_idx = (np.array(column) for column in zip(*path))
+    scores = _score_path(build_features(sequence(REF)), build_features(sequence(user)), ref_idx, user_idx)
+    expected = loop_scores(REF, user, path)
+    assert set(scores) == set(expected)
+    for name, values in expected.items():
+        np.testing.assert_allclose(scores[name], values, rtol=1e-10, atol=1e-10, err_msg=name)
+
+
+def brute_force_worst_moments(joint_scores, ref_idx, user_idx, ref_ts, n):
+    """Every pair's worst joint, sorted by rounded score (stable, so ties keep path order)."""
+    moments = []
+    for pair, row in enumerate(joint_scores):
+        col = int(np.argmin(row))
+        moments.append({
+            'joint': _JOINT_NAMES[col] if row[col] < 100.0 else None,
+            'score': round(float(row[col]), 1),
+            'ref_frame': int(ref_idx[pair]),
+            'user_frame': int(user_idx[pair]),
+            'timestamp': float(ref_ts[ref_idx[pair]]),
+        })
+    return sorted(moments, key=lambda m: m['score'])[:n]
+
+
+def test_worst_moments_break_rounded_ties_in_path_order():
+    joint_scores = np.full((8, len(ANGLE_JOINTS)), 100.0)
+    # Pairs 1, 3, 4 and 6 all round to 50.0; pair 5 is clearly the worst
+    for pair, col, score in [(1, 0, 50.04), (3, 7, 49.96), (4, 11, 50.02), (5, 2, 31.0), (6, 4, 49.95), (7, 3, 50.2)]:
+        joint_scores[pair, col] = score
+    ref_idx = np.arange(8)
+    user_idx = np.arange(8) + 1
+    ref_ts = np.arange(8) / 10
+
+    moments = _find_worst_moments(joint_scores, ref_idx, user_idx, ref_ts, n=3)
+
+    assert [(m['ref_frame'], m['joint'], m['score']) for m in moments] == [
+        (5, 'LEFT_WRIST', 31.0), (1, 'LEFT_ELBOW', 50.0), (3, 'RIGHT_KNEE', 50.0),
+    ]
+    assert moments == brute_force_worst_moments(joint_scores, ref_idx, user_idx, ref_ts, 3)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_worst_moments_match_a_full_sort(seed):
+    rng = np.random.default_rng(seed)
+    # Coarse scores so many pairs tie, some rows perfect
+    joint_scores = np.round(rng.uniform(40, 100, (60, len(ANGLE_JOINTS))), 1)
+    joint_scores[::7] = 100.0
+    ref_idx = np.sort(rng.integers(0, 40, 60))
+    user_idx = np.arange(60)
+    ref_ts = np.arange(40) / 30
+    for n in (1, 5, 60, 80):
+        assert _find_worst_moments(joint_scores, ref_idx, user_idx, ref_ts, n=n) == brute_force_worst_moments(
+            joint_scores, ref_idx, user_idx, ref_ts, n
+        )
+
+
+def test_perfect_pairs_have_no_worst_joint():
+    joint_scores = np.full((3, len(ANGLE_JOINTS)), 100.0)
+    moments = _find_worst_moments(joint_scores, np.arange(3), np.arange(3), np.arange(3.0), n=5)
+    assert [m['joint'] for m in moments] == [None, None, None]
+
+
+def test_pooled_joints_report_the_reference_frame_of_their_minimum():
+    joint_scores = np.full((4, len(ANGLE_JOINTS)), 100.0)
+    # LEFT_SHOULDER is pooled from columns 4 and 11: its minimum is row 2's torso angle
+    joint_scores[:, 4] = 90.0
+    joint_scores[:, 11] = [95.0, 95.0, 40.0, 95.0]
+    # RIGHT_SHOULDER (columns 5 and 10) bottoms out in row 3's arm angle
+    joint_scores[:, 5] = [92.0, 92.0, 92.0, 61.0]
+    joint_scores[:, 10] = 93.0
+    # A single-column joint for comparison
+    joint_scores[:, 6] = [70.0, 96.0, 96.0, 96.0]
+    seg_ref_idx = np.array([10, 11, 13, 17])
+
+    problems = {p['joint']: p for p in _find_problem_joints(joint_scores, seg_ref_idx)}
+
+    assert _JOINT_COLUMNS['LEFT_SHOULDER'] == [4, 11]
+    assert problems['LEFT_SHOULDER'] == {
+        'joint': 'LEFT_SHOULDER', 'mean': round(float(np.mean([90.0] * 4 + [95.0, 95.0, 40.0, 95.0])), 1),
+        'min_score': 40.0, 'ref_frame': 13,
+    }
+    assert (problems['RIGHT_SHOULDER']['min_score'], problems['RIGHT_SHOULDER']['ref_frame']) == (61.0, 17)
+    assert (problems['LEFT_KNEE']['min_score'], problems['LEFT_KNEE']['ref_frame']) == (70.0, 10)
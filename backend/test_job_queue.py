@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+
+import job_queue
+from job_queue import QueueWorker, SqliteJobQueue
+from job_scheduler import JobCancelled, QueueFull
+
+CALLS: list[tuple[str, str, str | None]] = []
+
+
+def record_job(ctx, label, wait=0.0):
+    """Job function: records its id, label and cancellation reason, optionally waiting to be cancelled first."""
+    deadline = time.monotonic() + wait
+    try:
+        while True:
+            ctx.check()
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(0.01)
+    except JobCancelled as exc:
+        CALLS.append((ctx.job_id, label, str(exc)))
+        return
+    CALLS.append((ctx.job_id, label, None))
+
+
+@pytest.fixture
+def queue(tmp_path):
+    CALLS.clear()
+    return SqliteJobQueue(str(tmp_path / "queue.sqlite3"), max_queued=3)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_queue_orders_by_submission_time_plus_cost(queue):
+    queue.submit("long", record_job, "long", cost=100.0)
+    queue.submit("short", record_job, "short", cost=1.0)
+    queue.submit("medium", record_job, "medium", cost=10.0)
+    assert [queue.queue_position(job_id) for job_id in ("short", "medium", "long")] == [1, 2, 3]
+    assert queue.queue_position("missing") is None
+    assert queue.counts() == {"queued": 3, "running": 0}
+    assert queue.eta("short") == pytest.approx(1.0)
+    assert queue.eta("medium") == pytest.approx(11.0)
+
+
+def test_full_queue_rejects_jobs(queue):
+    for i in range(3):
+        queue.submit(f"job-{i}", record_job, i)
+    with pytest.raises(QueueFull):
+        queue.submit("one-too-many", record_job, 3)
+
+
+def test_cancelling_a_queued_job_runs_it_cancelled(queue):
+    queue.submit("a", record_job, "a")
+    assert queue.cancel("a")
+    assert CALLS == [("a", "a", "Cancelled")]
+    assert queue.counts() == {"queued": 0, "running": 0}
+    assert not queue.cancel("a")
+
+
+def test_worker_claims_and_runs_jobs(queue):
+    queue.submit("a", record_job, "a", cost=2.0)
+    queue.submit("b", record_job, "b", cost=1.0)
+    worker = QueueWorker(queue, threads=1, timeout=0)
+    thread = threading.Thread(target=worker._work)
+    thread.start()
+    try:
+        wait_for(lambda: len(CALLS) == 2)
+    finally:
+        worker._stop.set()
+        thread.join()
+    assert CALLS == [("b", "b", None), ("a", "a", None)]
+    wait_for(lambda: queue.counts() == {"queued": 0, "running": 0})
+
+
+def test_worker_forwards_cancel_requests(queue):
+    queue.submit("a", record_job, "a", wait=30.0)
+    worker = QueueWorker(queue, threads=1, timeout=0)
+    thread = threading.Thread(target=worker._work)
+    thread.start()
+    try:
+        wait_for(lambda: queue.counts()["running"] == 1)
+        assert queue.cancel("a")
+        worker._forward_cancellations()
+        wait_for(lambda: CALLS)
+    finally:
+        worker._stop.set()
+        thread.join()
+    assert CALLS == [("a", "a", "Cancelled")]
+
+
+def test_jobs_of_dead_workers_are_reaped(queue):
+    queue.submit("orphan", record_job, "orphan")
+    queue.submit("alive", record_job, "alive", cost=5.0)
+    dead, live = QueueWorker(queue), QueueWorker(queue)
+    dead._heartbeat()
+    assert dead._claim()[0] == "orphan"
+    live._heartbeat()
+    assert live._claim()[0] == "alive"
+    queue._transaction(lambda conn: conn.execute(
+        "UPDATE job_workers SET heartbeat = ? WHERE worker_id = ?",
+        (time.time() - job_queue.WORKER_EXPIRY_SECONDS - 1, dead.worker_id),
+    ))
+
+    live._reap_dead_workers()
+
+    assert CALLS == [("orphan", "orphan", "Worker stopped responding")]
+    assert queue.counts() == {"queued": 0, "running": 1}
+    workers = queue._transaction(lambda conn: conn.execute("SELECT worker_id FROM job_workers").fetchall())
+    assert workers == [(live.worker_id,)]
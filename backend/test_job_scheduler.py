@@ -0,0 +1,217 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+import extraction_pool
+import job_scheduler
+from job_scheduler import JobCancelled, JobContext, JobScheduler, QueueFull
+from pose_extractor import ExtractionCancelled
+from pose_sequence import PoseSequence
+
+
+class FakeRunner:
+    """Job function for the scheduler: records how each job ended, optionally held until released."""
+
+    def __init__(self):
+        self.ended: dict[str, str] = {}
+        self.order: list[str] = []
+        self.started = {}
+        self.release = {}
+        self._lock = threading.Lock()
+
+    def hold(self, job_id: str) -> None:
+        self.started[job_id] = threading.Event()
+        self.release[job_id] = threading.Event()
+
+    def __call__(self, ctx: JobContext, label: str):
+        with self._lock:
+            self.order.append(label)
+        if label in self.started:
+            self.started[label].set()
+        try:
+            ctx.check()
+            while label in self.release and not self.release[label].wait(0.01):
+                ctx.check()
+            outcome = "done"
+        except JobCancelled as exc:
+            outcome = f"cancelled: {exc}"
+        except TimeoutError:
+            outcome = "timed out"
+        finally:
+            # Stands in for a job's cleanup (scratch files, job store status)
+            with self._lock:
+                self.ended[label] = outcome
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def runner():
+    return FakeRunner()
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = JobScheduler(workers=1, max_queued=3, timeout=0)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def occupy_worker(scheduler, runner, job_id="blocker", cost=0.0):
+    runner.hold(job_id)
+    scheduler.submit(job_id, runner, job_id, cost=cost)
+    assert runner.started[job_id].wait(5)
+
+
+def test_queue_runs_shortest_estimated_job_first(scheduler, runner):
+    occupy_worker(scheduler, runner)
+    for job_id, cost in [("long", 100.0), ("short", 1.0), ("medium", 10.0)]:
+        scheduler.submit(job_id, runner, job_id, cost=cost)
+    assert [scheduler.queue_position(job_id) for job_id in ("short", "medium", "long")] == [1, 2, 3]
+    assert scheduler.queue_position("blocker") is None
+    assert scheduler.counts() == {"queued": 3, "running": 1}
+
+    runner.release["blocker"].set()
+    wait_for(lambda: len(runner.ended) == 4)
+    assert runner.order == ["blocker", "short", "medium", "long"]
+    assert scheduler.counts() == {"queued": 0, "running": 0}
+
+
+def test_waiting_time_counts_for_long_jobs(scheduler, runner, monkeypatch):
+    occupy_worker(scheduler, runner)
+    now = time.monotonic()
+    monkeypatch.setattr(job_scheduler.time, "monotonic", lambda: now)
+    scheduler.submit("long", runner, "long", cost=10.0)
+    # Submitted later than the long job's cost, so it goes behind it
+    monkeypatch.setattr(job_scheduler.time, "monotonic", lambda: now + 20.0)
+    scheduler.submit("short", runner, "short", cost=1.0)
+    assert [scheduler.queue_position("long"), scheduler.queue_position("short")] == [1, 2]
+
+
+def test_eta_adds_up_queued_costs(scheduler, runner):
+    occupy_worker(scheduler, runner, cost=10.0)
+    scheduler.submit("next", runner, "next", cost=5.0)
+    assert scheduler.eta("blocker") == pytest.approx(10.0, abs=0.5)
+    assert scheduler.eta("next") == pytest.approx(15.0, abs=0.5)
+    assert scheduler.eta("unknown") is None
+
+
+def test_full_queue_rejects_jobs(scheduler, runner):
+    occupy_worker(scheduler, runner)
+    for i in range(3):
+        scheduler.submit(f"job-{i}", runner, f"job-{i}")
+    with pytest.raises(QueueFull):
+        scheduler.submit("one-too-many", runner, "one-too-many")
+    assert scheduler.counts()["queued"] == 3
+
+
+def test_cancelled_queued_job_runs_cancelled_once(scheduler, runner):
+    occupy_worker(scheduler, runner)
+    scheduler.submit("queued", runner, "queued")
+    assert scheduler.cancel("queued")
+    # Run right away, in the cancelling thread, so it can clean up
+    assert runner.ended == {"queued": "cancelled: Cancelled"}
+    assert scheduler.queue_position("queued") is None
+    assert not scheduler.cancel("queued")
+
+    runner.release["blocker"].set()
+    wait_for(lambda: "blocker" in runner.ended)
+    assert runner.order == ["blocker", "queued"]
+
+
+def test_cancelling_a_running_job_stops_it_at_its_next_check(scheduler, runner):
+    occupy_worker(scheduler, runner)
+    assert scheduler.cancel("blocker")
+    wait_for(lambda: "blocker" in runner.ended)
+    assert runner.ended["blocker"] == "cancelled: Cancelled"
+    wait_for(lambda: scheduler.counts() == {"queued": 0, "running": 0})
+
+
+def test_running_jobs_time_out(runner):
+    scheduler = JobScheduler(workers=1, max_queued=3, timeout=0.2)
+    try:
+        occupy_worker(scheduler, runner)
+        wait_for(lambda: "blocker" in runner.ended)
+        assert runner.ended["blocker"] == "timed out"
+    finally:
+        scheduler.shutdown()
+
+
+def test_shutdown_cancels_running_and_queued_jobs(runner):
+    scheduler = JobScheduler(workers=1, max_queued=3, timeout=0)
+    occupy_worker(scheduler, runner)
+    scheduler.submit("queued", runner, "queued")
+    scheduler.shutdown()
+    assert runner.ended == {
+        "blocker": "cancelled: Server shutting down", "queued": "cancelled: Server shutting down",
+    }
+
+
+def test_wait_returns_the_future_result():
+    ctx = JobContext("job", timeout=0)
+    future = Future()
+    threading.Timer(0.05, future.set_result, args=("poses",)).start()
+    assert ctx.wait(future) == "poses"
+
+
+def test_wait_cancels_the_future_on_timeout():
+    ctx = JobContext("job", timeout=0.1)
+    ctx.start()
+    future = Future()
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        ctx.wait(future)
+    assert future.cancelled()
+    assert time.monotonic() - started < 0.1 + 2 * job_scheduler._POLL_SECONDS
+
+
+def test_wait_cancels_the_future_when_the_job_is_cancelled():
+    ctx = JobContext("job", timeout=0)
+    future = Future()
+    threading.Timer(0.05, ctx.cancel, args=("Stop",)).start()
+    with pytest.raises(JobCancelled, match="Stop"):
+        ctx.wait(future)
+    assert future.cancelled()
+
+
+def slow_extraction(path, *args, cancelled=None, **kwargs):
+    """Stands in for extract_poses in the worker processes: 10 s of 'frames', stopping when cancelled."""
+    open(path + ".started", "w").close()
+    for frame in range(1000):
+        if cancelled is not None and cancelled():
+            with open(path + ".stopped", "w") as f:
+                f.write(str(frame))
+            raise ExtractionCancelled("Extraction cancelled")
+        time.sleep(0.01)
+    frames = np.arange(10)
+    return PoseSequence(np.zeros((10, 33, 4), dtype=np.float32), frames, frames / 30.0), 30.0, {}
+
+
+def test_cancelling_a_job_stops_its_running_extraction(tmp_path, monkeypatch):
+    # The worker processes import this function by reference from the test module
+    monkeypatch.setattr(extraction_pool, "extract_poses", slow_extraction)
+    path = str(tmp_path / "video.mp4")
+    try:
+        future = extraction_pool.submit_extraction(path, use_cache=False, chunk_seconds=0)
+        wait_for(lambda: os.path.exists(path + ".started"), timeout=60)
+        ctx = JobContext("job", timeout=0)
+        threading.Timer(0.1, ctx.cancel).start()
+        with pytest.raises(JobCancelled):
+            ctx.wait(future)
+        wait_for(lambda: os.path.exists(path + ".stopped"))
+        with open(path + ".stopped") as f:
+            assert int(f.read()) < 1000
+        # The shared cancel flag is cleared and its slot handed back
+        wait_for(lambda: len(extraction_pool._free_cancel_slots) == extraction_pool.CANCEL_SLOTS)
+        assert not any(extraction_pool._cancel_flags[:])
+    finally:
+        extraction_pool.shutdown_extraction_pool()
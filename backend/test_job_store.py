@@ -0,0 +1,158 @@
+import sqlite3
+import time
+
+import numpy as np
+import pytest
+
+from job_store import MemoryJobStore, SqliteJobStore, decode_result, encode_result
+from models import ResultSummary, SegmentScore
+
+
+def make_result(frames: int = 5) -> tuple[ResultSummary, dict[str, np.ndarray]]:
+    rng = np.random.default_rng(0)
+    summary = ResultSummary(
+        overall_score=87.5,
+        segment_scores=[
+            SegmentScore(
+                start_time=0.0, end_time=1.0, user_start_time=0.1, user_end_time=1.2, score=87.5,
+                problem_joints=[{"joint": "left_elbow", "mean": 0.4}],
+            )
+        ],
+        ref_fps=30.0,
+        user_fps=25.0,
+        ref_frames=frames,
+        user_frames=frames + 2,
+        path_length=frames,
+        debug={"timings": {"align": 0.25}},
+        worst_moments=[{"time": 0.5, "score": 61.0}],
+        extended_moments=[],
+    )
+    arrays = {
+        "ref_keypoints": rng.random((frames, 33, 3), dtype=np.float32),
+        "user_keypoints": rng.random((frames + 2, 33, 3), dtype=np.float32),
+        "dtw_path": np.array([[i, min(i + 1, frames + 1)] for i in range(frames)]),
+    }
+    return summary, arrays
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobStore(ttl=60)
+    return SqliteJobStore(str(tmp_path / "jobs.sqlite3"), ttl=60)
+
+
+def test_job_lifecycle(store):
+    assert store.get("a") is None
+    store.create("a")
+    job = store.get("a")
+    assert (job["status"], job["message"]) == ("pending", "Queued")
+
+    store.update("a", status="processing", message="Aligning", progress={"done": 3, "total": 10}, timings={"extract": 1.5})
+    job = store.get("a")
+    assert job["status"] == "processing"
+    assert job["progress"] == {"done": 3, "total": 10}
+    assert job["timings"] == {"extract": 1.5}
+    assert store.result("a") is None
+
+    store.delete("a")
+    assert store.get("a") is None
+
+
+def test_result_round_trip(store):
+    summary, arrays = make_result()
+    store.create("a")
+    store.complete("a", summary, arrays)
+    assert store.get("a")["status"] == "complete"
+
+    restored = store.result("a")
+    assert restored.model_dump(exclude={"ref_keypoints", "user_keypoints", "dtw_path"}) == summary.model_dump(
+        exclude={"ref_frames", "user_frames", "path_length"}
+    )
+    np.testing.assert_array_equal(restored.ref_keypoints, arrays["ref_keypoints"])
+    np.testing.assert_array_equal(restored.user_keypoints, arrays["user_keypoints"])
+    assert restored.dtw_path == arrays["dtw_path"].tolist()
+
+    stored = store.result_summary("a")
+    assert stored == summary.model_dump(mode="json")
+
+    stored_arrays = store.result_arrays("a", ["dtw_path"])
+    assert list(stored_arrays) == ["dtw_path"]
+    assert stored_arrays["dtw_path"].dtype == np.int32
+    np.testing.assert_array_equal(stored_arrays["dtw_path"], arrays["dtw_path"])
+
+
+def test_metrics_accumulate(store):
+    store.add_metrics({"jobs": 1, "seconds": 2.5})
+    store.add_metrics({"jobs": 1, "errors": 1})
+    assert store.metrics() == {"jobs": 2, "seconds": 2.5, "errors": 1}
+
+
+def test_finished_jobs_expire(store, monkeypatch):
+    store.create("done")
+    store.update("done", status="complete")
+    store.create("running")
+    store.update("running", status="processing")
+    now = time.time()
+    monkeypatch.setattr("job_store.time.time", lambda: now + 120)
+    assert store.get("done") is None
+    assert store.get("running")["status"] == "processing"
+
+
+def test_finish_time_is_set_once(store, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr("job_store.time.time", lambda: now)
+    store.create("a")
+    store.update("a", status="processing")
+    assert "finished_at" not in store.get("a")
+    store.complete("a", *make_result())
+    assert store.get("a")["finished_at"] == now
+
+    # Timings are stored after the result; they must not restart the TTL
+    monkeypatch.setattr("job_store.time.time", lambda: now + 50)
+    store.update("a", timings={"total_s": 50.0})
+    job = store.get("a")
+    assert (job["finished_at"], job["updated_at"]) == (now, now + 50)
+    monkeypatch.setattr("job_store.time.time", lambda: now + 70)
+    assert store.get("a") is None
+
+
+def test_encoded_result_decodes_only_requested_arrays():
+    summary, arrays = decode_result(encode_result(*make_result()), names=("dtw_path",))
+    assert summary["overall_score"] == 87.5
+    assert set(arrays) == {"dtw_path"}
+
+
+def test_sqlite_store_persists_and_marks_interrupted_jobs(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = SqliteJobStore(path)
+    store.create("finished")
+    store.complete("finished", *make_result())
+    store.create("running")
+    store.update("running", status="processing")
+    store.create("queued")
+
+    kept = SqliteJobStore(path, mark_interrupted=False)
+    assert kept.get("running")["status"] == "processing"
+
+    reopened = SqliteJobStore(path)
+    assert reopened.get("finished")["status"] == "complete"
+    assert reopened.result("finished").overall_score == 87.5
+    for job_id in ("running", "queued"):
+        job = reopened.get(job_id)
+        assert (job["status"], job["message"]) == ("error", "Interrupted by server restart")
+
+
+def test_sqlite_store_adds_columns_to_old_databases(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (job_id TEXT PRIMARY KEY, status TEXT NOT NULL, message TEXT NOT NULL, "
+        "created_at REAL NOT NULL, updated_at REAL NOT NULL, result BLOB)"
+    )
+    conn.commit()
+    conn.close()
+    store = SqliteJobStore(path)
+    store.create("a")
+    store.update("a", progress={"done": 1, "total": 2})
+    assert store.get("a")["progress"] == {"done": 1, "total": 2}
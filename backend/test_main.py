@@ -0,0 +1,124 @@
+import threading
+import uuid
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from benchmark import synthetic_pair
+from comparator import compare_dances
+from job_scheduler import JobScheduler
+from job_store import job_store
+from results_binary import RESULTS_MEDIA_TYPE
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def complete_job():
+    ref, attempt = synthetic_pair(60)
+    job_id = uuid.uuid4().hex
+    job_store.create(job_id)
+    job_store.complete(job_id, *compare_dances(ref, attempt, 30.0, 30.0))
+    yield job_id
+    job_store.delete(job_id)
+
+
+@pytest.mark.parametrize("accept", ["application/json", RESULTS_MEDIA_TYPE])
+def test_result_etag_survives_later_job_writes(client, complete_job, accept):
+    first = client.get(f"/api/results/{complete_job}", headers={"accept": accept})
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    # The job's timings are written after its result
+    job_store.update(complete_job, timings={"total_s": 1.0})
+
+    again = client.get(f"/api/results/{complete_job}", headers={"accept": accept, "if-none-match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+
+
+def test_result_etag_differs_per_part_and_format(client, complete_job):
+    etags = {
+        client.get(f"/api/results/{complete_job}{path}", headers={"accept": accept}).headers["etag"]
+        for path in ("", "/summary", "/dtw_path")
+        for accept in ("application/json", RESULTS_MEDIA_TYPE)
+    }
+    assert len(etags) == 6
+
+
+def write_video(path, frames=30):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30.0, (64, 48))
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), i * 8, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+@pytest.fixture
+def videos(tmp_path):
+    return {
+        "reference": ("ref.avi", write_video(tmp_path / "ref.avi").read_bytes(), "video/x-msvideo"),
+        "attempt": ("att.avi", write_video(tmp_path / "att.avi").read_bytes(), "video/x-msvideo"),
+    }
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    monkeypatch.setattr(main, "UPLOAD_DIR", str(upload_dir))
+    return upload_dir
+
+
+@pytest.fixture
+def busy_scheduler(monkeypatch):
+    """A one-worker scheduler whose worker is held by a job estimated at 30 s."""
+    scheduler = JobScheduler(workers=1, max_queued=4, timeout=0)
+    started, release = threading.Event(), threading.Event()
+
+    def hold(ctx):
+        started.set()
+        while not release.wait(0.01):
+            ctx.check()
+
+    scheduler.submit("blocker", hold, cost=30.0)
+    assert started.wait(5)
+    monkeypatch.setattr(main, "scheduler", scheduler)
+    yield scheduler
+    release.set()
+    scheduler.shutdown()
+
+
+def test_jobs_over_the_time_budget_are_rejected(client, videos, uploads, busy_scheduler, monkeypatch):
+    monkeypatch.setattr(main, "MAX_JOB_SECONDS", 0.01)
+    response = client.post("/api/compare", files=videos)
+    assert response.status_code == 422
+    assert "exceeds the limit of" in response.json()["detail"]
+    # Nothing is left behind: no queued job, no scratch directory
+    assert busy_scheduler.counts() == {"queued": 0, "running": 1}
+    assert list(uploads.iterdir()) == []
+
+
+def test_admitted_job_reports_queue_position_and_eta(client, videos, uploads, busy_scheduler):
+    response = client.post("/api/compare", files=videos)
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+
+    status = client.get(f"/api/status/{job_id}").json()
+    assert status["status"] == "pending"
+    assert status["queue_position"] == 1
+    assert status["message"] == "Queued (position 1)"
+    # Behind the 30 s job, plus its own estimate
+    assert 30.0 < status["eta_seconds"] < 35.0
+
+    cancelled = client.post(f"/api/cancel/{job_id}").json()
+    assert cancelled["status"] == "cancelled"
+    status = client.get(f"/api/status/{job_id}").json()
+    assert (status["queue_position"], status["eta_seconds"]) == (None, None)
+    assert list(uploads.iterdir()) == []
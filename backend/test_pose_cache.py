@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+import pytest
+
+from pose_cache import PoseCache
+from pose_sequence import PoseSequence
+
+
+def make_poses(frames: int, seed: int = 0) -> PoseSequence:
+    rng = np.random.default_rng(seed)
+    frame_nums = np.arange(frames) * 2
+    return PoseSequence(rng.random((frames, 33, 4), dtype=np.float32), frame_nums, frame_nums / 30.0)
+
+
+def entry_size(tmp_path) -> int:
+    probe = PoseCache(str(tmp_path / "probe"), max_bytes=1 << 30)
+    probe.put("probe", make_poses(20), 15.0)
+    return os.path.getsize(probe._path("probe"))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PoseCache(str(tmp_path / "poses"), max_bytes=1 << 30)
+
+
+def test_round_trip(cache):
+    poses = make_poses(20)
+    assert cache.get("a") is None
+    cache.put("a", poses, 15.0)
+    cached, fps = cache.get("a")
+    assert fps == 15.0
+    np.testing.assert_array_equal(cached.landmarks, poses.landmarks)
+    np.testing.assert_array_equal(cached.frame_nums, poses.frame_nums)
+    np.testing.assert_array_equal(cached.timestamps, poses.timestamps)
+    assert [name for name in os.listdir(cache.directory) if not name.endswith(".npz")] == []
+
+
+def test_keys_depend_on_video_model_and_settings():
+    key = PoseCache.make_key("video", "model", {"target_fps": 15.0, "max_inference_size": 0})
+    assert key == PoseCache.make_key("video", "model", {"max_inference_size": 0, "target_fps": 15.0})
+    assert len({
+        key,
+        PoseCache.make_key("other", "model", {"target_fps": 15.0, "max_inference_size": 0}),
+        PoseCache.make_key("video", "other", {"target_fps": 15.0, "max_inference_size": 0}),
+        PoseCache.make_key("video", "model", {"target_fps": 30.0, "max_inference_size": 0}),
+    }) == 4
+
+
+@pytest.mark.parametrize("damage", ["truncated", "garbage", "empty", "missing_array"])
+def test_corrupt_entries_are_misses_and_removed(cache, damage):
+    cache.put("a", make_poses(20), 15.0)
+    path = cache._path("a")
+    if damage == "truncated":
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) // 2)
+    elif damage == "garbage":
+        with open(path, "wb") as f:
+            f.write(b"not an npz file" * 10)
+    elif damage == "empty":
+        open(path, "wb").close()
+    else:
+        with open(path, "wb") as f:
+            np.savez(f, landmarks=np.zeros((2, 33, 4), dtype=np.float32))
+
+    assert cache.get("a") is None
+    assert not os.path.exists(path)
+    # The next extraction writes it again
+    cache.put("a", make_poses(20), 15.0)
+    assert cache.get("a") is not None
+
+
+def test_eviction_keeps_the_cache_under_its_limit(tmp_path):
+    size = entry_size(tmp_path)
+    cache = PoseCache(str(tmp_path / "poses"), max_bytes=int(size * 2.5))
+    for i, key in enumerate("abc"):
+        cache.put(key, make_poses(20, seed=i), 15.0)
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+
+    cache.put("d", make_poses(20, seed=3), 15.0)
+
+    assert sorted(os.listdir(cache.directory)) == ["c.npz", "d.npz"]
+    total = sum(os.path.getsize(os.path.join(cache.directory, name)) for name in os.listdir(cache.directory))
+    assert total <= cache.max_bytes
+
+
+def test_hits_refresh_the_lru_clock(tmp_path):
+    size = entry_size(tmp_path)
+    cache = PoseCache(str(tmp_path / "poses"), max_bytes=int(size * 2.5))
+    for i, key in enumerate("ab"):
+        cache.put(key, make_poses(20, seed=i), 15.0)
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+
+    # "a" is the oldest entry until it is read
+    assert cache.get("a") is not None
+    cache.put("c", make_poses(20, seed=2), 15.0)
+
+    assert sorted(os.listdir(cache.directory)) == ["a.npz", "c.npz"]
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = PoseCache(str(tmp_path / "poses"), max_bytes=0)
+    assert not cache.enabled
+    cache.put("a", make_poses(5), 15.0)
+    assert cache.get("a") is None
+    assert not os.path.exists(cache.directory)
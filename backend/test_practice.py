@@ -0,0 +1,119 @@
+import json
+import struct
+import threading
+
+import numpy as np
+import pytest
+
+import practice
+from benchmark import synthetic_pair
+from comparator import build_features
+from practice import PracticeSession, TooManySessions, parse_message
+
+
+class FakeLibrary:
+    """Stands in for reference_library with one ready reference."""
+
+    def __init__(self, poses, fps=30.0):
+        self.entry = (poses, fps, build_features(poses))
+
+    def load(self, reference_id):
+        if reference_id != "ref":
+            raise KeyError(reference_id)
+        return self.entry
+
+
+@pytest.fixture
+def ref_poses():
+    ref, _ = synthetic_pair(240)
+    return ref
+
+
+@pytest.fixture
+def library(ref_poses, monkeypatch):
+    monkeypatch.setattr(practice, "reference_library", FakeLibrary(ref_poses))
+    monkeypatch.setattr(practice, "_session_slots", threading.BoundedSemaphore(2))
+
+
+def text_message(timestamp, landmarks) -> dict:
+    return {"type": "websocket.receive", "text": json.dumps({"timestamp": timestamp, "landmarks": landmarks})}
+
+
+def test_parse_binary_frames():
+    timestamp, image, landmarks = parse_message({"bytes": struct.pack("<d", 1.25) + b"jpeg"})
+    assert (timestamp, image, landmarks) == (1.25, b"jpeg", None)
+    with pytest.raises(ValueError):
+        parse_message({"bytes": struct.pack("<d", 1.25)})
+
+
+def test_parse_landmark_frames():
+    points = np.random.default_rng(0).random((33, 3)).round(3)
+    timestamp, image, landmarks = parse_message(text_message(2.5, points.tolist()))
+    assert (timestamp, image) == (2.5, None)
+    assert landmarks.shape == (33, 4) and landmarks.dtype == np.float32
+    np.testing.assert_allclose(landmarks[:, :3], points, rtol=1e-6)
+    assert (landmarks[:, 3] == 1).all()
+
+    with_visibility = np.hstack([points, np.full((33, 1), 0.5)])
+    _, _, landmarks = parse_message(text_message(2.5, with_visibility.tolist()))
+    np.testing.assert_allclose(landmarks, with_visibility, rtol=1e-6)
+
+    assert parse_message(text_message(3.0, None)) == (3.0, None, None)
+
+
+@pytest.mark.parametrize("text", [
+    "not json",
+    json.dumps({"landmarks": None}),
+    json.dumps({"timestamp": "soon", "landmarks": None}),
+    json.dumps({"timestamp": 1.0, "landmarks": [[0, 0, 0]] * 32}),
+    json.dumps({"timestamp": 1.0, "landmarks": [[0, 0]] * 33}),
+    json.dumps({"timestamp": 1.0, "landmarks": [["x", 0, 0]] * 33}),
+])
+def test_malformed_frames_are_rejected(text):
+    with pytest.raises(ValueError):
+        parse_message({"text": text})
+
+
+def test_session_follows_a_replayed_reference(library, ref_poses):
+    session = PracticeSession("ref")
+    try:
+        for frame, timestamp in enumerate(ref_poses.timestamps):
+            reply = session.process(float(timestamp), landmarks=ref_poses.landmarks[frame])
+            assert reply["detected"]
+            assert abs(reply["ref_frame"] - frame) <= 2
+            assert reply["ref_time"] == round(float(ref_poses.timestamps[reply["ref_frame"]]), 3)
+            if frame > 0:
+                assert reply["score"] > 90
+        assert session.process(99.0) == {"timestamp": 99.0, "detected": False}
+    finally:
+        session.close()
+
+
+def test_session_memory_does_not_grow_with_its_length(library, ref_poses):
+    session = PracticeSession("ref")
+    try:
+        # Loop the reference for a session several times its length
+        for frame in range(5 * len(ref_poses)):
+            session.process(frame / 30.0, landmarks=ref_poses.landmarks[frame % len(ref_poses)])
+        assert len(session._aligner) == 5 * len(ref_poses)
+        assert len(session._aligner._steps) <= 2
+    finally:
+        session.close()
+
+
+def test_session_limit(library):
+    first = PracticeSession("ref")
+    second = PracticeSession("ref")
+    with pytest.raises(TooManySessions):
+        PracticeSession("ref")
+    second.close()
+    # Closing frees the slot for the next session
+    PracticeSession("ref").close()
+    first.close()
+
+
+def test_unknown_reference_frees_its_slot(library):
+    for _ in range(3):
+        with pytest.raises(KeyError):
+            PracticeSession("missing")
+    PracticeSession("ref").close()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from benchmark import synthetic_pair
+from reference_library import ReferenceLibrary
+
+
+@pytest.fixture
+def libraries(tmp_path):
+    """Two libraries on one directory, like the API and a worker process."""
+    return ReferenceLibrary(str(tmp_path)), ReferenceLibrary(str(tmp_path))
+
+
+def register(library: ReferenceLibrary, frames: int = 60, seed: int = 0) -> str:
+    ref_id = library.create("ref", "ref.mp4")["reference_id"]
+    poses, _ = synthetic_pair(frames, seed=seed)
+    library.complete(ref_id, poses, 30.0)
+    return ref_id
+
+
+def test_load_round_trip(libraries):
+    library, _ = libraries
+    poses, _ = synthetic_pair(60)
+    ref_id = library.create("ref", "ref.mp4")["reference_id"]
+    with pytest.raises(KeyError):
+        library.load(ref_id)
+    library.complete(ref_id, poses, 30.0)
+
+    loaded, fps, features = library.load(ref_id)
+    assert fps == 30.0
+    np.testing.assert_array_equal(loaded.landmarks, poses.landmarks)
+    assert len(features.angles) == len(poses)
+    # Repeat loads come from memory
+    assert library.load(ref_id)[0] is loaded
+    assert library.get(ref_id)["status"] == "ready"
+
+
+def test_deleted_elsewhere_is_not_served_from_memory(libraries):
+    api, worker = libraries
+    ref_id = register(api)
+    api.load(ref_id)
+    assert worker.delete(ref_id)
+    with pytest.raises(KeyError):
+        api.load(ref_id)
+    assert ref_id not in api._loaded
+
+
+def test_rewritten_elsewhere_is_reloaded(libraries):
+    api, worker = libraries
+    ref_id = register(api, frames=60)
+    assert len(api.load(ref_id)[0]) == 60
+
+    poses, _ = synthetic_pair(90, seed=1)
+    worker.complete(ref_id, poses, 30.0)
+    loaded, _, _ = api.load(ref_id)
+    np.testing.assert_array_equal(loaded.landmarks, poses.landmarks)
+
+
+def test_malformed_ids_are_unknown(libraries):
+    library, _ = libraries
+    with pytest.raises(KeyError):
+        library.load("../etc")
+    assert library.get("../etc") is None
+    assert not library.delete("../etc")
@@ -0,0 +1,51 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from results_binary import decode_binary, encode_binary
+
+
+def test_round_trip():
+    rng = np.random.default_rng(0)
+    keypoints = rng.uniform(-2, 3, (7, 33, 3)).astype(np.float32)
+    path = np.array([[0, 0], [1, 1], [1, 2], [6, 8]], dtype=np.int32)
+    fields = {"overall_score": 91.5, "segment_scores": [{"score": 90}], "ref_fps": 30.0}
+
+    decoded_fields, arrays = decode_binary(encode_binary(fields, {"ref_keypoints": keypoints, "dtw_path": path}))
+
+    assert decoded_fields == fields
+    assert arrays["ref_keypoints"].shape == keypoints.shape
+    assert arrays["ref_keypoints"].dtype == np.float32
+    assert np.abs(arrays["ref_keypoints"] - keypoints).max() <= np.abs(keypoints).max() / 65534 + 1e-7
+    np.testing.assert_array_equal(arrays["dtw_path"], path)
+
+
+def test_arrays_start_on_8_byte_boundaries():
+    arrays = {"a": np.arange(3, dtype=np.int64), "b": np.ones((5, 3), dtype=np.float32), "c": np.arange(1)}
+    blob = encode_binary({}, arrays)
+    (header_len,) = struct.unpack_from("<I", blob, 4)
+    header = json.loads(blob[8:8 + header_len])
+    base = 8 + header_len + (-(8 + header_len) % 8)
+    for spec in header["arrays"].values():
+        assert (base + spec["offset"]) % 8 == 0
+    assert [spec["dtype"] for spec in header["arrays"].values()] == ["int32", "int16", "int32"]
+    np.testing.assert_array_equal(decode_binary(blob)[1]["c"], [0])
+
+
+def test_empty_and_zero_arrays():
+    arrays = {
+        "empty_keypoints": np.zeros((0, 33, 3), dtype=np.float32),
+        "zeros": np.zeros((2, 3), dtype=np.float32),
+        "empty_path": np.zeros((0, 2), dtype=np.int32),
+    }
+    _, decoded = decode_binary(encode_binary({"n": 0}, arrays))
+    for name, values in arrays.items():
+        assert decoded[name].shape == values.shape
+        np.testing.assert_array_equal(decoded[name], values)
+
+
+def test_rejects_other_payloads():
+    with pytest.raises(ValueError):
+        decode_binary(b"PK\x03\x04 not a results payload")
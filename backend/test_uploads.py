@@ -0,0 +1,87 @@
+import functools
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import uploads
+from pose_cache import file_sha256
+from uploads import UploadTooLarge, save_upload
+
+
+class CountingReader(io.BytesIO):
+    """In-memory upload that records the size of every read."""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.reads: list[int] = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(uploads, "_CHUNK_SIZE", 1000)
+
+
+def test_copies_in_chunks_and_returns_the_sha256(tmp_path, small_chunks):
+    data = os.urandom(4500)
+    src = CountingReader(data)
+    path = str(tmp_path / "video.mp4")
+
+    digest = save_upload(src, path, max_bytes=10_000)
+
+    assert digest == hashlib.sha256(data).hexdigest() == file_sha256(path)
+    with open(path, "rb") as f:
+        assert f.read() == data
+    assert src.reads == [1000] * 6
+
+
+def test_a_file_at_the_limit_is_accepted(tmp_path, small_chunks):
+    data = os.urandom(3000)
+    assert save_upload(io.BytesIO(data), str(tmp_path / "video.mp4"), max_bytes=3000) == hashlib.sha256(data).hexdigest()
+
+
+def test_an_oversized_file_is_refused_and_removed(tmp_path, small_chunks):
+    src = CountingReader(os.urandom(10_000))
+    path = str(tmp_path / "video.mp4")
+
+    with pytest.raises(UploadTooLarge):
+        save_upload(src, path, max_bytes=2500)
+
+    assert not os.path.exists(path)
+    # Stops reading as soon as the limit is passed
+    assert len(src.reads) == 3
+
+
+def test_a_failed_read_removes_the_partial_file(tmp_path, small_chunks):
+    class BrokenReader(io.BytesIO):
+        def read(self, size=-1):
+            if self.tell() >= 2000:
+                raise ConnectionResetError("client went away")
+            return super().read(size)
+
+    path = str(tmp_path / "video.mp4")
+    with pytest.raises(ConnectionResetError):
+        save_upload(BrokenReader(os.urandom(5000)), path, max_bytes=10_000)
+    assert not os.path.exists(path)
+
+
+def test_compare_answers_413_and_leaves_no_partial_upload(tmp_path, monkeypatch):
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    monkeypatch.setattr(main, "UPLOAD_DIR", str(upload_dir))
+    monkeypatch.setattr(main, "save_upload", functools.partial(save_upload, max_bytes=1000))
+
+    response = TestClient(main.app).post(
+        "/api/compare",
+        files={"reference": ("ref.mp4", b"r" * 500), "attempt": ("att.mp4", os.urandom(5000))},
+    )
+
+    assert response.status_code == 413
+    assert list(upload_dir.iterdir()) == []
@@ -0,0 +1,41 @@
+import hashlib
+import os
+from typing import BinaryIO
+
+# Largest accepted video; requests whose Content-Length could only fit
+# larger videos are rejected before their body is read
+MAX_UPLOAD_BYTES = int(float(os.environ.get("DANCE_MAX_UPLOAD_MB", "500")) * 1024 * 1024)
+# Two videos plus form fields
+MAX_REQUEST_BYTES = 2 * MAX_UPLOAD_BYTES + 64 * 1024
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def save_upload(src: BinaryIO, path: str, max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+    """Copy an uploaded file to `path` in chunks and return its hex SHA-256.
+
+    The hash is computed while copying, so callers can use it as the pose
+    cache's video hash without reading the file again. Raises UploadTooLarge
+    (removing the partial file) once more than `max_bytes` have been read.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            for chunk in iter(lambda: src.read(_CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds the limit of {max_bytes // (1024 * 1024)} MB")
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return digest.hexdigest()
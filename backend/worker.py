@@ -0,0 +1,21 @@
+"""Job worker for shared-queue deployments (DANCE_JOB_QUEUE=sqlite).
+
+Run one or more next to the API processes, on the same DANCE_JOB_DB,
+DANCE_UPLOAD_DIR and DANCE_REFERENCE_DIR:
+
+    python worker.py
+"""
+import sys
+
+from extraction_pool import shutdown_extraction_pool, start_extraction_pool
+from job_queue import QueueWorker, SqliteJobQueue
+from job_scheduler import JOB_QUEUE
+
+if __name__ == "__main__":
+    if JOB_QUEUE != "sqlite":
+        sys.exit("worker.py needs DANCE_JOB_QUEUE=sqlite")
+    start_extraction_pool()
+    try:
+        QueueWorker(SqliteJobQueue()).run()
+    finally:
+        shutdown_extraction_pool()
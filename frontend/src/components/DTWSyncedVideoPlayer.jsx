@@ -1,4 +1,5 @@
 import { useRef, useEffect, useState, useCallback } from 'react'
+import { keypointFrame, pathPair, useDtwPath, useKeypoints } from '../results'
 
 // MediaPipe Pose skeleton connections
 const CONNECTIONS = [
@@ -8,16 +9,18 @@ const CONNECTIONS = [
   [15, 17], [15, 19], [15, 21], [16, 18], [16, 20], [16, 22],
 ]
 
-function drawSkeleton(ctx, keypoints, width, height, color) {
-  if (!keypoints || keypoints.length === 0) return
+// `frame` is a flat typed array of `dims` values per landmark
+function drawSkeleton(ctx, frame, dims, width, height, color) {
+  if (!frame || frame.length === 0) return
+  const count = frame.length / dims
 
   const scale = Math.min(width, height) * 1.5
   const cx = width / 2
   const cy = height / 2
 
-  const toPixel = (kp) => ({
-    x: cx + kp[0] * scale,
-    y: cy + kp[1] * scale,
+  const toPixel = (i) => ({
+    x: cx + frame[i * dims] * scale,
+    y: cy + frame[i * dims + 1] * scale,
   })
 
   // Draw connections
@@ -25,9 +28,9 @@ function drawSkeleton(ctx, keypoints, width, height, color) {
   ctx.strokeStyle = color
   ctx.globalAlpha = 0.8
   for (const [a, b] of CONNECTIONS) {
-    if (a >= keypoints.length || b >= keypoints.length) continue
-    const pa = toPixel(keypoints[a])
-    const pb = toPixel(keypoints[b])
+    if (a >= count || b >= count) continue
+    const pa = toPixel(a)
+    const pb = toPixel(b)
     ctx.beginPath()
     ctx.moveTo(pa.x, pa.y)
     ctx.lineTo(pb.x, pb.y)
@@ -36,8 +39,8 @@ function drawSkeleton(ctx, keypoints, width, height, color) {
 
   // Draw joints
   ctx.globalAlpha = 1
-  for (let i = 0; i < keypoints.length; i++) {
-    const p = toPixel(keypoints[i])
+  for (let i = 0; i < count; i++) {
+    const p = toPixel(i)
     ctx.fillStyle = color
     ctx.beginPath()
     ctx.arc(p.x, p.y, 5, 0, Math.PI * 2)
@@ -59,16 +62,22 @@ export default function DTWSyncedVideoPlayer({ results, videos }) {
   const [refUrl, setRefUrl] = useState(null)
   const [attUrl, setAttUrl] = useState(null)
 
+  // The heavy arrays are only fetched once this player is opened
+  const dtwPath = useDtwPath(results?.job_id, true)
+  const refKeypoints = useKeypoints(results?.job_id, 'ref', results?.ref_frames, true)
+  const userKeypoints = useKeypoints(results?.job_id, 'user', results?.user_frames, true)
+
   // Build a map from ref frame index to user frame index
   const dtwMap = useCallback(() => {
     const map = {}
-    if (results?.dtw_path) {
-      for (const [refIdx, userIdx] of results.dtw_path) {
+    if (dtwPath) {
+      for (let i = 0; i < dtwPath.length; i++) {
+        const [refIdx, userIdx] = pathPair(dtwPath, i)
         map[refIdx] = userIdx
       }
     }
     return map
-  }, [results])
+  }, [dtwPath])
 
   useEffect(() => {
     if (videos?.reference) {
@@ -114,39 +123,39 @@ export default function DTWSyncedVideoPlayer({ results, videos }) {
   const renderFrame = useCallback(() => {
     if (!results) return
 
-    const pathLength = results.dtw_path?.length || 0
+    const pathLength = dtwPath?.length || 0
 
     if (pathLength === 0) {
       animFrameRef.current = requestAnimationFrame(renderFrame)
       return
     }
 
-    const [refIdx, userIdx] = results.dtw_path[currentPathIndex] || [0, 0]
+    const [refIdx, userIdx] = currentPathIndex < pathLength ? pathPair(dtwPath, currentPathIndex) : [0, 0]
 
     // Draw reference skeleton
-    if (refCanvasRef.current && results.ref_keypoints.length > 0) {
+    if (refCanvasRef.current && refKeypoints) {
       const canvas = refCanvasRef.current
       const ctx = canvas.getContext('2d')
       ctx.clearRect(0, 0, canvas.width, canvas.height)
 
-      if (refIdx >= 0 && refIdx < results.ref_keypoints.length) {
-        drawSkeleton(ctx, results.ref_keypoints[refIdx], canvas.width, canvas.height, '#60a5fa')
+      if (refIdx >= 0 && refIdx < refKeypoints.loaded) {
+        drawSkeleton(ctx, keypointFrame(refKeypoints, refIdx), refKeypoints.dims, canvas.width, canvas.height, '#60a5fa')
       }
     }
 
     // Draw user skeleton
-    if (attCanvasRef.current && results.user_keypoints.length > 0) {
+    if (attCanvasRef.current && userKeypoints) {
       const canvas = attCanvasRef.current
       const ctx = canvas.getContext('2d')
       ctx.clearRect(0, 0, canvas.width, canvas.height)
 
-      if (userIdx >= 0 && userIdx < results.user_keypoints.length) {
-        drawSkeleton(ctx, results.user_keypoints[userIdx], canvas.width, canvas.height, '#4ade80')
+      if (userIdx >= 0 && userIdx < userKeypoints.loaded) {
+        drawSkeleton(ctx, keypointFrame(userKeypoints, userIdx), userKeypoints.dims, canvas.width, canvas.height, '#4ade80')
       }
     }
 
     animFrameRef.current = requestAnimationFrame(renderFrame)
-  }, [results, currentPathIndex])
+  }, [results, dtwPath, refKeypoints, userKeypoints, currentPathIndex])
 
   useEffect(() => {
     animFrameRef.current = requestAnimationFrame(renderFrame)
@@ -163,9 +172,14 @@ export default function DTWSyncedVideoPlayer({ results, videos }) {
     }
   }
 
+  // The path may arrive after the videos' metadata
+  useEffect(() => {
+    if (dtwPath) setDuration(dtwPath.length)
+  }, [dtwPath])
+
   const handleLoadedMetadata = () => {
-    if (results?.dtw_path) {
-      setDuration(results.dtw_path.length)
+    if (dtwPath) {
+      setDuration(dtwPath.length)
     }
   }
 
@@ -175,12 +189,12 @@ export default function DTWSyncedVideoPlayer({ results, videos }) {
   }
 
   useEffect(() => {
-    if (!playing || !results?.dtw_path) return
+    if (!playing || !dtwPath) return
 
     const interval = setInterval(() => {
       setCurrentPathIndex((prev) => {
         const next = prev + 1
-        if (next >= results.dtw_path.length) {
+        if (next >= dtwPath.length) {
           setPlaying(false)
           return prev
         }
@@ -189,7 +203,7 @@ export default function DTWSyncedVideoPlayer({ results, videos }) {
     }, 33) // ~30fps
 
     return () => clearInterval(interval)
-  }, [playing, results])
+  }, [playing, dtwPath])
 
   const formatFrameCount = (count) => {
     const secs = (count / 30).toFixed(1)
@@ -208,13 +222,13 @@ export default function DTWSyncedVideoPlayer({ results, videos }) {
           <button className="play-btn" onClick={togglePlay}>
             {playing ? 'Pause' : 'Play'}
           </button>
-          {results?.dtw_path && (
+          {dtwPath && (
             <>
               <input
                 className="time-slider"
                 type="range"
                 min={0}
-                max={Math.max(0, results.dtw_path.length - 1)}
+                max={Math.max(0, dtwPath.length - 1)}
                 step={1}
                 value={currentPathIndex}
                 onChange={handleSeek}
@@ -261,7 +275,7 @@ export default function DTWSyncedVideoPlayer({ results, videos }) {
 
       <div className="dtw-info-box">
         <p>
-          <strong>DTW Path:</strong> {results?.dtw_path?.length || 0} alignment pairs
+          <strong>DTW Path:</strong> {dtwPath?.length || 0} alignment pairs
         </p>
         <p>
           <strong>How it works:</strong> Each frame pair represents matched poses between the reference and attempt videos.
@@ -57,6 +57,20 @@ export default function UploadPage({ onResults }) {
   const [progress, setProgress] = useState(0)
   const [error, setError] = useState('')
 
+  const showStatus = (status) => {
+    const msg = status.message || 'Processing...'
+    const eta = status.eta_seconds != null ? ` (about ${Math.ceil(status.eta_seconds)}s left)` : ''
+    setStatusMsg(msg + eta)
+
+    const p = status.progress
+    if (p?.stage === 'extracting' && p.frames_total > 0) {
+      // Extraction is most of the work: 10% -> 85%
+      setProgress(10 + 75 * Math.min(p.frames_done / p.frames_total, 1))
+    } else if (p) {
+      setProgress(90)
+    }
+  }
+
   const handleCompare = async () => {
     if (!reference || !attempt) return
     setLoading(true)
@@ -74,34 +88,37 @@ export default function UploadPage({ onResults }) {
         body: formData,
       })
 
+      if (res.status === 429) throw new Error('Server is busy, please try again shortly')
       if (!res.ok) throw new Error('Upload failed')
       const { job_id } = await res.json()
       setProgress(10)
 
-      // Poll for status
-      while (true) {
-        await new Promise((r) => setTimeout(r, 1000))
-        const statusRes = await fetch(`${API_BASE}/status/${job_id}`)
-        const status = await statusRes.json()
-
-        if (status.status === 'complete') {
-          setStatusMsg('Fetching results...')
-          setProgress(100)
-          const resultsRes = await fetch(`${API_BASE}/results/${job_id}`)
-          const results = await resultsRes.json()
-          onResults(results, { reference, attempt })
-          return
-        } else if (status.status === 'error') {
-          throw new Error(status.message || 'Processing failed')
-        } else {
-          const msg = status.message || ''
-          setStatusMsg(msg || 'Processing...')
-          
-          if (msg.includes('reference')) setProgress(25)
-          else if (msg.includes('attempt')) setProgress(60)
-          else if (msg.includes('Comparing')) setProgress(90)
+      // Progress and the result summary are pushed by the server as they happen;
+      // keypoints and the DTW path are loaded later by the players that need them
+      const results = await new Promise((resolve, reject) => {
+        const events = new EventSource(`${API_BASE}/events/${job_id}`)
+        events.addEventListener('status', (e) => {
+          const status = JSON.parse(e.data)
+          if (status.status === 'error' || status.status === 'cancelled') {
+            events.close()
+            reject(new Error(status.message || 'Processing failed'))
+          } else if (status.status === 'complete') {
+            setStatusMsg('Fetching results...')
+            setProgress(100)
+          } else {
+            showStatus(status)
+          }
+        })
+        events.addEventListener('result', (e) => {
+          events.close()
+          resolve({ ...JSON.parse(e.data), job_id })
+        })
+        // The browser reconnects by itself unless the stream was refused
+        events.onerror = () => {
+          if (events.readyState === EventSource.CLOSED) reject(new Error('Lost connection to the server'))
         }
-      }
+      })
+      onResults(results, { reference, attempt })
     } catch (err) {
       setError(err.message)
     } finally {
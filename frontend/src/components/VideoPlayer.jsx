@@ -1,4 +1,5 @@
 import { useRef, useEffect, useState, useCallback } from 'react'
+import { keypointFrame, useKeypoints } from '../results'
 
 // MediaPipe Pose skeleton connections (starting from shoulders/hips)
 const CONNECTIONS = [
@@ -10,12 +11,14 @@ const CONNECTIONS = [
   [11, 0], [12, 0]
 ]
 
-function drawSkeleton(ctx, keypoints, width, height) {
-  if (!keypoints || keypoints.length === 0) return
+// `frame` is a flat typed array of `dims` values per landmark
+function drawSkeleton(ctx, frame, dims, width, height) {
+  if (!frame || frame.length === 0) return
+  const count = frame.length / dims
 
-  const toPixel = (kp) => ({
-    x: kp[0] * width,
-    y: kp[1] * height,
+  const toPixel = (i) => ({
+    x: frame[i * dims] * width,
+    y: frame[i * dims + 1] * height,
   })
 
   // Draw connections
@@ -23,9 +26,9 @@ function drawSkeleton(ctx, keypoints, width, height) {
   ctx.strokeStyle = '#4ade80' // Bright green
   ctx.globalAlpha = 0.8
   for (const [a, b] of CONNECTIONS) {
-    if (a >= keypoints.length || b >= keypoints.length) continue
-    const pa = toPixel(keypoints[a])
-    const pb = toPixel(keypoints[b])
+    if (a >= count || b >= count) continue
+    const pa = toPixel(a)
+    const pb = toPixel(b)
     ctx.beginPath()
     ctx.moveTo(pa.x, pa.y)
     ctx.lineTo(pb.x, pb.y)
@@ -33,12 +36,12 @@ function drawSkeleton(ctx, keypoints, width, height) {
   }
 
   // Draw joints
-  for (let i = 0; i < keypoints.length; i++) {
+  for (let i = 0; i < count; i++) {
     // Skip detailed facial landmarks (1-10 are eyes/ears/mouth)
     // Keep 0 (Nose) as the head reference
     if (i > 0 && i < 11) continue 
 
-    const p = toPixel(keypoints[i])
+    const p = toPixel(i)
     ctx.fillStyle = '#4ade80' // Bright green
     ctx.globalAlpha = 0.6
     ctx.beginPath()
@@ -60,6 +63,10 @@ export default function VideoPlayer({ results, videos, seekTime }) {
   const [attPlaying, setAttPlaying] = useState(false)
   const [showSkeletons, setShowSkeletons] = useState(true)
 
+  // Skeleton overlays load in pages in the background and draw once their frames arrive
+  const refKeypoints = useKeypoints(results?.job_id, 'ref', results?.ref_frames, showSkeletons)
+  const userKeypoints = useKeypoints(results?.job_id, 'user', results?.user_frames, showSkeletons)
+
   const [refTime, setRefTime] = useState(0)
   const [attTime, setAttTime] = useState(0)
 
@@ -177,15 +184,15 @@ export default function VideoPlayer({ results, videos, seekTime }) {
       const ctx = canvas.getContext('2d')
       ctx.clearRect(0, 0, canvas.width, canvas.height)
 
-      if (showSkeletons && results.ref_keypoints.length > 0) {
+      if (showSkeletons && refKeypoints) {
         const frameIdx = getFrameIndex(
           refVideo.currentTime,
           results.ref_fps,
-          results.ref_keypoints.length
+          refKeypoints.frames
         )
         
-        if (frameIdx >= 0 && frameIdx < results.ref_keypoints.length) {
-          drawSkeleton(ctx, results.ref_keypoints[frameIdx], canvas.width, canvas.height)
+        if (frameIdx >= 0 && frameIdx < refKeypoints.loaded) {
+          drawSkeleton(ctx, keypointFrame(refKeypoints, frameIdx), refKeypoints.dims, canvas.width, canvas.height)
         }
       }
     }
@@ -196,20 +203,20 @@ export default function VideoPlayer({ results, videos, seekTime }) {
       const ctx = canvas.getContext('2d')
       ctx.clearRect(0, 0, canvas.width, canvas.height)
 
-      if (showSkeletons && results.user_keypoints.length > 0) {
+      if (showSkeletons && userKeypoints) {
         const frameIdx = getFrameIndex(
           attVideo.currentTime,
           results.user_fps,
-          results.user_keypoints.length
+          userKeypoints.frames
         )
-        if (frameIdx >= 0 && frameIdx < results.user_keypoints.length) {
-          drawSkeleton(ctx, results.user_keypoints[frameIdx], canvas.width, canvas.height)
+        if (frameIdx >= 0 && frameIdx < userKeypoints.loaded) {
+          drawSkeleton(ctx, keypointFrame(userKeypoints, frameIdx), userKeypoints.dims, canvas.width, canvas.height)
         }
       }
     }
 
     animFrameRef.current = requestAnimationFrame(renderFrame)
-  }, [results, getFrameIndex, playing, segmentEnd, attSegmentEnd, showSkeletons])
+  }, [results, refKeypoints, userKeypoints, getFrameIndex, playing, segmentEnd, attSegmentEnd, showSkeletons])
 
   useEffect(() => {
     animFrameRef.current = requestAnimationFrame(renderFrame)
@@ -0,0 +1,122 @@
+import { useEffect, useState } from 'react'
+
+// Binary format served by the /api/results endpoints (see backend/results_binary.py)
+export const RESULTS_MEDIA_TYPE = 'application/vnd.dancecompare.results'
+
+const API_BASE = '/api'
+const MAGIC = 'DCR1'
+
+// Keypoints are { frames, landmarks, dims, data: Float32Array } and the DTW
+// path is { length, data: Int32Array } of [refIdx, userIdx] pairs, so the
+// players index flat typed arrays instead of nested JSON lists.
+
+async function fetchPart(path) {
+  const res = await fetch(`${API_BASE}/results/${path}`, {
+    headers: { Accept: `${RESULTS_MEDIA_TYPE}, application/json;q=0.5` },
+  })
+  if (!res.ok) throw new Error('Failed to fetch results')
+  if (res.headers.get('Content-Type')?.startsWith(RESULTS_MEDIA_TYPE)) {
+    return decodeBinary(await res.arrayBuffer())
+  }
+  return fromJson(await res.json())
+}
+
+function decodeBinary(buffer) {
+  const view = new DataView(buffer)
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4))
+  if (magic !== MAGIC) throw new Error('Unexpected results format')
+  const headerLen = view.getUint32(4, true)
+  const fields = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLen)))
+  const base = Math.ceil((8 + headerLen) / 8) * 8
+
+  for (const [name, spec] of Object.entries(fields.arrays)) {
+    const count = spec.shape.reduce((a, b) => a * b, 1)
+    const offset = base + spec.offset
+    if (spec.dtype === 'int16') {
+      // Quantized keypoints
+      const raw = new Int16Array(buffer, offset, count)
+      const data = new Float32Array(count)
+      for (let i = 0; i < count; i++) data[i] = raw[i] * spec.scale
+      fields[name] = makeKeypoints(data, spec.shape)
+    } else {
+      fields[name] = { length: spec.shape[0] || 0, data: new Int32Array(buffer, offset, count) }
+    }
+  }
+  delete fields.arrays
+  return fields
+}
+
+function fromJson(fields) {
+  for (const name of ['keypoints', 'ref_keypoints', 'user_keypoints']) {
+    const frames = fields[name]
+    if (!frames) continue
+    const shape = [frames.length, frames[0]?.length || 0, frames[0]?.[0]?.length || 0]
+    fields[name] = makeKeypoints(Float32Array.from(frames.flat(2)), shape)
+  }
+  if (fields.dtw_path) {
+    fields.dtw_path = { length: fields.dtw_path.length, data: Int32Array.from(fields.dtw_path.flat()) }
+  }
+  return fields
+}
+
+function makeKeypoints(data, shape) {
+  const [frames = 0, landmarks = 0, dims = 0] = shape
+  return { frames, landmarks, dims, data }
+}
+
+// Keypoints of one side ('ref' or 'user'), fetched page by page once
+// `enabled`; `loaded` counts the frames available so far
+export function useKeypoints(jobId, side, total, enabled) {
+  const [keypoints, setKeypoints] = useState(null)
+
+  useEffect(() => {
+    if (!enabled || !jobId || !total) return
+    let cancelled = false
+    const load = async () => {
+      let kp = null
+      let start = 0
+      while (start < total && !cancelled) {
+        const page = await fetchPart(`${jobId}/keypoints/${side}?start=${start}`)
+        if (cancelled || page.end <= start) break
+        const chunk = page.keypoints
+        if (!kp) {
+          kp = { ...makeKeypoints(null, [total, chunk.landmarks, chunk.dims]), loaded: 0 }
+          kp.data = new Float32Array(total * chunk.landmarks * chunk.dims)
+        }
+        kp.data.set(chunk.data, start * chunk.landmarks * chunk.dims)
+        kp = { ...kp, loaded: page.end }
+        setKeypoints(kp)
+        start = page.end
+      }
+    }
+    load().catch((err) => console.error(`Failed to load ${side} keypoints:`, err))
+    return () => { cancelled = true }
+  }, [jobId, side, total, enabled])
+
+  return keypoints
+}
+
+export function useDtwPath(jobId, enabled) {
+  const [path, setPath] = useState(null)
+
+  useEffect(() => {
+    if (!enabled || !jobId) return
+    let cancelled = false
+    fetchPart(`${jobId}/dtw_path`)
+      .then((part) => { if (!cancelled) setPath(part.dtw_path) })
+      .catch((err) => console.error('Failed to load DTW path:', err))
+    return () => { cancelled = true }
+  }, [jobId, enabled])
+
+  return path
+}
+
+// Flat [landmark * dims] view of one frame
+export function keypointFrame(keypoints, i) {
+  const stride = keypoints.landmarks * keypoints.dims
+  return keypoints.data.subarray(i * stride, (i + 1) * stride)
+}
+
+export function pathPair(path, i) {
+  return [path.data[2 * i], path.data[2 * i + 1]]
+}